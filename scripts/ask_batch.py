@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Набор вопросов через POST /ask/batch: ночные регрессионные прогоны и обновление FAQ.
+
+Вопросы читаются из файла: текст по одному в строке или JSONL с полями id и text.
+Результаты записываются в JSONL по мере готовности (порядок - порядок завершения,
+поле index - номер вопроса во входном файле). Выводит время пакета и перцентили
+времени вопросов; с --compare-sequential те же вопросы задаются по одному
+через /ask для сравнения.
+
+Пример:
+    python scripts/ask_batch.py --questions regression.jsonl --output answers.jsonl
+    python scripts/ask_batch.py --questions faq.txt --concurrency 2 --compare-sequential
+"""
+
+import sys
+import json
+import time
+import math
+import asyncio
+import argparse
+from typing import Dict, List
+
+import aiohttp
+
+
+def load_questions(path: str) -> List[Dict]:
+    """Вопросы из текстового файла или JSONL"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                questions.append({"id": str(item.get("id", number)), "text": item["text"]})
+            else:
+                questions.append({"id": str(number), "text": line})
+    return questions
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def read_events(response: aiohttp.ClientResponse):
+    """События Server-Sent Events ответа: (имя, данные)"""
+    event = None
+    async for raw in response.content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:") and event:
+            yield event, json.loads(line[len("data:"):].strip())
+            event = None
+
+
+async def run_batch(session: aiohttp.ClientSession, args, questions: List[Dict]) -> int:
+    """Пакет через /ask/batch с записью результатов по мере готовности"""
+    payload = {"questions": questions}
+    if args.concurrency:
+        payload["concurrency"] = args.concurrency
+
+    started = time.perf_counter()
+    results = []
+    summary = None
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        async with session.post(f"{args.url}/ask/batch", json=payload) as response:
+            if response.status != 200:
+                print(f"❌ HTTP {response.status}: {await response.text()}")
+                return 1
+            async for event, data in read_events(response):
+                if event == "item":
+                    results.append(data)
+                    if output:
+                        output.write(json.dumps(data, ensure_ascii=False) + "\n")
+                    mark = "❌" if "error" in data else "✅"
+                    print(f"{mark} [{len(results)}/{len(questions)}] {data['id']}: "
+                          f"{data.get('error') or data['answer'][:80]!r}")
+                elif event == "done":
+                    summary = data
+                elif event == "error":
+                    print(f"❌ Ошибка пакета: {data.get('detail')}")
+                    return 1
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    totals = sorted(item["timings"]["total_ms"] for item in results if "timings" in item)
+    errors = sum("error" in item for item in results)
+    cached = sum(bool(item.get("cached")) for item in results)
+    print(f"\nПакет: {len(results)} из {len(questions)} вопросов за {elapsed:.1f} с, ошибок: {errors}, из кеша: {cached}")
+    if totals:
+        print(f"Готовность вопроса от начала пакета: p50={percentile(totals, 50):.0f} мс "
+              f"p90={percentile(totals, 90):.0f} мс max={totals[-1]:.0f} мс")
+    if summary is None or len(results) != len(questions):
+        print("❌ Пакет завершился не полностью")
+        return 1
+    args.batch_seconds = elapsed
+    return 1 if errors else 0
+
+
+async def run_sequential(session: aiohttp.ClientSession, args, questions: List[Dict]):
+    """Те же вопросы по одному через /ask"""
+    started = time.perf_counter()
+    errors = 0
+    for question in questions:
+        async with session.post(f"{args.url}/ask", json={"text": question["text"]}) as response:
+            await response.read()
+            errors += response.status != 200
+    elapsed = time.perf_counter() - started
+    print(f"Последовательно через /ask: {elapsed:.1f} с, ошибок: {errors}")
+    if getattr(args, "batch_seconds", None):
+        print(f"Ускорение пакета: {elapsed / args.batch_seconds:.1f}x")
+
+
+async def run(args) -> int:
+    questions = load_questions(args.questions)
+    if not questions:
+        print("Нет вопросов")
+        return 1
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        code = await run_batch(session, args, questions)
+        if args.compare_sequential:
+            # Ответы пакета уже в кеше: для честного сравнения его нужно отключить (ANSWER_CACHE_ENABLED=false)
+            await run_sequential(session, args, questions)
+    return code
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Набор вопросов через /ask/batch QA-сервиса")
+    parser.add_argument("--url", default="http://localhost:8000", help="Адрес QA-сервиса")
+    parser.add_argument("--questions", required=True, help="Файл с вопросами (строки или JSONL с id и text)")
+    parser.add_argument("--output", help="JSONL с результатами")
+    parser.add_argument("--concurrency", type=int, help="Одновременных вызовов LLM (по умолчанию BATCH_LLM_CONCURRENCY)")
+    parser.add_argument("--compare-sequential", action="store_true", help="Замерить те же вопросы через /ask")
+    parser.add_argument("--timeout", type=float, default=3600, help="Таймаут пакета, с")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
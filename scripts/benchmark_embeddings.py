@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк реализаций модели эмбеддингов: время загрузки, память, задержка кодирования
+одного вопроса (как в QA-сервисе) и скорость пакетного кодирования чанков (как при индексации).
+
+Каждая реализация замеряется в отдельном процессе, чтобы RSS не включал другие модели.
+Реализация задается как "huggingface", "onnx" или "onnx:<файл модели>".
+
+Пример:
+    python scripts/benchmark_embeddings.py --backends huggingface,onnx
+    python scripts/benchmark_embeddings.py --backends onnx:onnx/model.onnx,onnx --onnx-path ./models/minilm-onnx
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import resource
+import subprocess
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "embedding_parity.json")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса, МБ"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_worker(args) -> dict:
+    """Замеры одной реализации в текущем процессе"""
+    from src.embedding_backends import create_embeddings
+
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    questions = [query["text"] for query in corpus["queries"]]
+    documents = [doc["text"] for doc in corpus["documents"]]
+
+    # Чанки размера CHUNK_SIZE из текстов корпуса
+    chunks = []
+    for i in range(args.texts):
+        text = ""
+        j = i
+        while len(text) < args.chunk_chars:
+            text += documents[j % len(documents)] + " "
+            j += 7
+        chunks.append(f"{i} {text[:args.chunk_chars]}")
+
+    baseline = rss_mb()
+    backend, _, onnx_file = args.worker.partition(":")
+    started = time.perf_counter()
+    embeddings = create_embeddings(
+        backend, args.model, batch_size=args.batch_size, onnx_file=onnx_file or None, onnx_path=args.onnx_path or None
+    )
+    embeddings.embed_query("прогрев")
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    latencies = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        embeddings.embed_query(f"{questions[i % len(questions)]} {i}")
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    started = time.perf_counter()
+    embeddings.embed_documents(chunks)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "backend": args.worker,
+        "load_seconds": round(load_seconds, 2),
+        "model_rss_mb": round(loaded_rss - baseline, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "query_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "query_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "chunks_per_second": round(len(chunks) / batch_seconds, 1)
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Бенчмарк реализаций модели эмбеддингов")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backends", default="huggingface,onnx", help="Реализации через запятую")
+    parser.add_argument("--onnx-path", default=os.getenv("EMBEDDING_ONNX_PATH", ""), help="Каталог модели ONNX")
+    parser.add_argument("--queries", type=int, default=200, help="Число одиночных вопросов")
+    parser.add_argument("--texts", type=int, default=512, help="Число чанков для пакетного кодирования")
+    parser.add_argument("--chunk-chars", type=int, default=800, help="Длина чанка, символов")
+    parser.add_argument("--batch-size", type=int, default=64, help="Размер пакета")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    results = []
+    for spec in args.backends.split(","):
+        command = [sys.executable, os.path.abspath(__file__), "--worker", spec] + [
+            f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+            if name not in ("worker", "backends")
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"❌ {spec}: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'ошибка'}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        sys.exit(1)
+
+    columns = [
+        "backend", "load_seconds", "model_rss_mb", "peak_rss_mb",
+        "query_p50_ms", "query_p95_ms", "query_p99_ms", "chunks_per_second"
+    ]
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Проверка эквивалентности и микро-бенчмарк конвертеров HTML → текст.
+
+Сравнивает soup_html_to_text (BeautifulSoup) и stream_html_to_text (lxml, один проход)
+на корпусе фрагментов storage-формата Confluence, случайно сгенерированных документах
+и, опционально, на выгруженных страницах (*.html в каталоге --dir).
+Завершается с кодом 1, если результаты хотя бы одного документа различаются.
+
+Пример:
+    python scripts/benchmark_html_to_text.py --fuzz 5000 --repeat 20
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import XMLParsedAsHTMLWarning  # noqa: E402
+
+from src.html_to_text import soup_html_to_text, stream_html_to_text  # noqa: E402
+
+warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+
+# Корпус фрагментов storage-формата с пограничными случаями
+CORPUS = [
+    "",
+    "   ",
+    "простой текст без разметки",
+    "<p>Первый абзац</p><p>Второй абзац</p>",
+    "<p>foo <b>bar</b> baz</p>",
+    "<h1>Заголовок</h1><ul><li>пункт 1</li><li>пункт <i>2</i></li></ul>",
+    "<table><tbody><tr><th>Ключ</th><th>Значение</th></tr><tr><td>timeout</td><td>30</td></tr></tbody></table>",
+    '<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">python</ac:parameter>'
+    '<ac:plain-text-body><![CDATA[print(1)\n  x = 2]]></ac:plain-text-body></ac:structured-macro>',
+    '<p>до</p><ac:structured-macro ac:name="plantuml"><ac:plain-text-body><![CDATA[@startuml\nA -> B\n@enduml]]>'
+    "</ac:plain-text-body></ac:structured-macro><p>после</p>",
+    '<ac:structured-macro ac:name="mermaid"><p>graph TD</p><ac:structured-macro ac:name="code"><p>inner</p>'
+    "</ac:structured-macro><p>A--&gt;B</p></ac:structured-macro>",
+    '<ac:structured-macro ac:name="code"><p>x</p><ac:structured-macro ac:name="mermaid"><p>m</p>'
+    "</ac:structured-macro></ac:structured-macro>",
+    '<ac:structured-macro ac:name="code"><p>outer</p><ac:structured-macro ac:name="code"><p>inner</p>'
+    "</ac:structured-macro></ac:structured-macro>",
+    '<p>x<script>var a = 1;</script>y</p><style>.a {}</style><template><p>t</p>'
+    '<ac:structured-macro ac:name="code">c</ac:structured-macro></template>',
+    "<ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>",
+    "<!-- комментарий --><p>a<!-- b -->c</p>",
+    "<!DOCTYPE html><html><body>x</body></html>",
+    "<p>&nbsp;a&amp;b &lt;tag&gt; &#x41;</p>",
+    "<pre>  line1\n\n   line2  </pre>",
+    "\ufeff<p>BOM</p>",
+    '<ac:structured-macro ac:name="info"><ac:rich-text-body><p>примечание</p></ac:rich-text-body></ac:structured-macro>',
+    '<ac:structured-macro AC:NAME="code">upper</ac:structured-macro>',
+    '<ac:structured-macro ac:name="Code">cap</ac:structured-macro>',
+    "<p>незакрытый <b>жирный <i>курсив</p> хвост",
+    '<ac:structured-macro ac:name="code"></ac:structured-macro>',
+    '<ac:structured-macro ac:name="plantuml"/>после',
+    '<?xml version="1.0"?><p>pi</p>',
+    '<ac:link><ri:page ri:content-title="Другая"/><ac:plain-text-link-body><![CDATA[текст ссылки]]>'
+    "</ac:plain-text-link-body></ac:link>",
+    "<p>a\r\nb\tc\x0bd e</p>",
+    "<textarea> t </textarea><p> </p>",
+]
+
+_FUZZ_TAGS = [
+    "p", "b", "i", "div", "span", "script", "style", "template", "rt", "pre", "table", "tr", "td", "br",
+    "h1", "ul", "li", "ac:structured-macro", "ac:plain-text-body", "ac:rich-text-body", "ac:parameter",
+]
+_FUZZ_TEXTS = [
+    "hello", "  ", "\n", " x y ", "&amp;", "&nbsp;", "<![CDATA[cd\nata]]>", "<!-- c -->", "код", "\t", "a\nb",
+]
+_FUZZ_MACROS = ["code", "plantuml", "mermaid", "info", "drawio"]
+
+
+def generate_fuzz(rnd: random.Random, depth: int = 0) -> str:
+    """Случайный документ из тегов, макросов и текстовых фрагментов"""
+    parts = []
+    for _ in range(rnd.randint(0, 4)):
+        if rnd.random() < 0.4 or depth > 5:
+            parts.append(rnd.choice(_FUZZ_TEXTS))
+            continue
+
+        tag = rnd.choice(_FUZZ_TAGS)
+        attrs = f' ac:name="{rnd.choice(_FUZZ_MACROS)}"' if tag == "ac:structured-macro" else ""
+        inner = generate_fuzz(rnd, depth + 1)
+        closing = "" if rnd.random() < 0.1 else f"</{tag}>"
+        parts.append(f"<{tag}{attrs}>{inner}{closing}")
+    return "".join(parts)
+
+
+def generate_page(rnd: random.Random, sections: int) -> str:
+    """Синтетическая страница Confluence заданного размера"""
+    parts = []
+    for i in range(sections):
+        parts.append(f"<h2>Раздел {i}</h2>")
+        parts.append("<p>" + " ".join(f"слово{rnd.randint(0, 999)}" for _ in range(60)) + "</p>")
+        parts.append(
+            "<table><tbody>"
+            + "".join(f"<tr><td>ключ {j}</td><td><code>value_{j}</code></td></tr>" for j in range(5))
+            + "</tbody></table>"
+        )
+        if i % 3 == 0:
+            parts.append(
+                '<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">bash</ac:parameter>'
+                f"<ac:plain-text-body><![CDATA[curl -s http://service/api/v1/items/{i}\necho done]]>"
+                "</ac:plain-text-body></ac:structured-macro>"
+            )
+        if i % 5 == 0:
+            parts.append(
+                '<ac:structured-macro ac:name="plantuml"><ac:plain-text-body>'
+                f"<![CDATA[@startuml\nClient -> Service{i}: request\n@enduml]]></ac:plain-text-body></ac:structured-macro>"
+            )
+    return "".join(parts)
+
+
+def check_equivalence(documents: list) -> int:
+    """Сравнение результатов двух конвертеров, возвращает число расхождений"""
+    mismatches = 0
+    for i, html in enumerate(documents):
+        expected = soup_html_to_text(html)
+        actual = stream_html_to_text(html)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ Расхождение в документе #{i}: {html[:200]!r}")
+                print(f"   bs4:  {expected[:200]!r}")
+                print(f"   lxml: {actual[:200]!r}")
+    return mismatches
+
+
+def benchmark(name: str, converter, documents: list, repeat: int) -> float:
+    """Среднее время конвертации набора документов"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for html in documents:
+            converter(html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Эквивалентность и скорость конвертеров HTML → текст")
+    parser.add_argument("--dir", help="Каталог с выгруженными страницами (*.html, storage-формат)")
+    parser.add_argument("--fuzz", type=int, default=2000, help="Количество случайных документов")
+    parser.add_argument("--pages", type=int, default=50, help="Количество синтетических страниц для бенчмарка")
+    parser.add_argument("--sections", type=int, default=40, help="Разделов на синтетической странице")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера (берется лучший)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    pages = [generate_page(rnd, args.sections) for _ in range(args.pages)]
+    exported = []
+    if args.dir:
+        for path in sorted(glob.glob(os.path.join(args.dir, "*.html"))):
+            with open(path, "r", encoding="utf-8") as f:
+                exported.append(f.read())
+
+    documents = CORPUS + [generate_fuzz(rnd) for _ in range(args.fuzz)] + pages + exported
+    print(f"Проверка эквивалентности на {len(documents)} документах...")
+    mismatches = check_equivalence(documents)
+    if mismatches:
+        print(f"❌ Расхождений: {mismatches}")
+        sys.exit(1)
+    print("✅ Результаты совпадают")
+
+    bench_documents = pages + exported
+    total_mb = sum(len(html.encode("utf-8")) for html in bench_documents) / 1024 / 1024
+    print(f"\nБенчмарк: {len(bench_documents)} страниц, {total_mb:.1f} МБ, лучший из {args.repeat} повторов")
+    soup_time = benchmark("bs4", soup_html_to_text, bench_documents, args.repeat)
+    stream_time = benchmark("lxml", stream_html_to_text, bench_documents, args.repeat)
+    print(f"  bs4:  {soup_time:.3f} с ({total_mb / soup_time:.1f} МБ/с)")
+    print(f"  lxml: {stream_time:.3f} с ({total_mb / stream_time:.1f} МБ/с)")
+    print(f"  Ускорение: x{soup_time / stream_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
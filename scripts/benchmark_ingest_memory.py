@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти индексации: прогон синтетического пространства (по умолчанию 100 000 страниц)
+через ConfluenceIngester с замером RSS процесса по ходу обработки.
+
+Confluence и модель эмбеддингов заменяются генераторами в процессе: страницы создаются
+по мере запроса списка, эмбеддинги - детерминированные векторы малой размерности.
+По умолчанию запись идет в пустое хранилище (--store null), чтобы измерять память самого
+индексатора; --store chroma включает ChromaDB, индекс которой растет с числом чанков.
+
+Пример:
+    python scripts/benchmark_ingest_memory.py --pages 100000
+    python scripts/benchmark_ingest_memory.py --pages 20000 --store chroma INGEST_PIPELINE=false
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import threading
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def current_rss_mb() -> float:
+    """Текущий RSS процесса, МБ"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса, МБ"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class HashEmbeddings(Embeddings):
+    """Детерминированные эмбеддинги по хешу текста"""
+
+    def __init__(self, *args, dim: int = 16, **kwargs):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255 for i in range(self.dim)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class SyntheticConfluence:
+    """Клиент Confluence, генерирующий страницы по запросу без хранения пространства в памяти"""
+
+    def __init__(self, page_count: int, body_chars: int):
+        self.page_count = page_count
+        self.body_chars = body_chars
+
+    def _page(self, index: int, expand: str) -> Dict:
+        page_id = str(1000000 + index)
+        page = {
+            "id": page_id,
+            "type": "page",
+            "title": f"Синтетическая страница {index}",
+            "version": {"number": 1, "when": "2025-01-01T00:00:00.000Z"},
+            "metadata": {"labels": {"results": [{"name": "synthetic"}]}},
+        }
+        if expand and "body.storage" in expand:
+            paragraph = f"<p>Страница {index}: сервис отвечает на запросы к /api/v1/items/{index}. </p>"
+            body = paragraph * max(1, self.body_chars // len(paragraph))
+            page["body"] = {"storage": {"value": body, "representation": "storage"}}
+        return page
+
+    def get_all_pages_from_space(self, space, start=0, limit=50, expand=None, **kwargs):
+        end = min(start + limit, self.page_count)
+        return [self._page(i, expand) for i in range(start, end)]
+
+    def get_page_by_id(self, page_id, expand=None, **kwargs):
+        return self._page(int(page_id) - 1000000, expand)
+
+
+class _NullCollection:
+    def upsert(self, **kwargs):
+        pass
+
+    def count(self) -> int:
+        return 0
+
+
+class NullVectorStore:
+    """Хранилище, которое ничего не сохраняет"""
+
+    def __init__(self):
+        self._collection = _NullCollection()
+
+    def get(self, **kwargs):
+        return {"ids": []}
+
+    def delete(self, ids=None):
+        pass
+
+    def persist(self):
+        pass
+
+
+class RssSampler(threading.Thread):
+    """Фоновый замер RSS вместе с числом обработанных страниц"""
+
+    def __init__(self, progress, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.progress = progress
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append((self.progress(), current_rss_mb()))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Пиковая память индексации синтетического пространства")
+    parser.add_argument("--pages", type=int, default=100000, help="Количество страниц")
+    parser.add_argument("--body-kb", type=float, default=4, help="Размер storage-формата страницы, КБ")
+    parser.add_argument("--store", choices=["null", "chroma"], default="null", help="Векторное хранилище")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временный каталог")
+    parser.add_argument("env", nargs="*", help="Переменные окружения индексатора: NAME=VALUE")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ingest-memory-")
+    os.environ.update({
+        "CF_URL": "http://synthetic",
+        "CF_USER": "benchmark",
+        "CF_TOKEN": "benchmark",
+        "CF_SPACE": "SYN",
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "REPORT_DIR": os.path.join(workdir, "report"),
+        "INGEST_DISCOVERY": "full",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "CF_RATE_LIMIT": "100000",
+        "CF_RATE_LIMIT_MAX": "100000",
+        "LOG_LEVEL": "WARNING",
+    })
+    os.environ.update(dict(item.split("=", 1) for item in args.env))
+
+    from src import embedding_backends, ingest_with_report
+
+    confluence = SyntheticConfluence(args.pages, int(args.body_kb * 1024))
+    embedding_backends.HuggingFaceEmbeddings = HashEmbeddings
+    ingest_with_report.ConfluenceIngester._init_confluence = lambda self: setattr(self, "confluence", confluence)
+
+    baseline = current_rss_mb()
+    ingester = ingest_with_report.ConfluenceIngester()
+    if args.store == "null":
+        ingester.vectorstore = NullVectorStore()
+
+    sampler = RssSampler(lambda: len(ingester.results))
+    print(f"Индексация {args.pages} страниц (~{args.body_kb} КБ), хранилище: {args.store}, каталог: {workdir}")
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        ingester.run()
+    finally:
+        sampler.stop()
+    elapsed = time.perf_counter() - started
+
+    print(f"\nВремя: {elapsed:.1f} с ({args.pages / elapsed:.0f} страниц/с)")
+    print(f"RSS до запуска: {baseline:.0f} МБ, пиковый RSS: {peak_rss_mb():.0f} МБ")
+    print("RSS по ходу обработки:")
+    for fraction in (0.1, 0.25, 0.5, 0.75, 1.0):
+        target = int(args.pages * fraction)
+        rss_values = [rss for done, rss in sampler.samples if done <= target]
+        if rss_values:
+            print(f"  до {target:>7} страниц: максимум {max(rss_values):.0f} МБ")
+
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Нагрузка на пул LLM-бэкендов с настройками QA-сервиса (LLM_BACKENDS, LLM_HEDGE_PERCENTILE, ...):
+перцентили задержки, ошибки, хеджи и переключения, состояние бэкендов.
+
+С --baseline тот же прогон выполняется сначала через первый бэкенд без хеджирования
+и переключения - видно, сколько хвоста задержек и ошибок срезает пул.
+Удобно запускать против scripts/fake_llm_server.py.
+
+Пример:
+    LLM_BACKENDS='[{"name": "a", "model": "fake", "base_url": "http://127.0.0.1:9101/v1"},
+                   {"name": "b", "model": "fake", "base_url": "http://127.0.0.1:9102/v1"}]' \\
+        python scripts/benchmark_llm_pool.py --requests 300 --concurrency 8 --baseline
+"""
+
+import os
+import sys
+import math
+import time
+import asyncio
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.qa_service import QAService  # noqa: E402
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run(model, args, label: str):
+    """Прогон запросов с ограничением одновременных; задержка - полный ответ или первый токен (--stream)"""
+    from langchain_core.messages import HumanMessage
+    from src.llm_pool import LLMPool
+
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        messages = [HumanMessage(content=f"Вопрос {i}: где находится health endpoint?")]
+        async with slots:
+            started = time.perf_counter()
+            try:
+                if args.stream:
+                    first = None
+                    async for _ in model.astream(messages):
+                        first = first or time.perf_counter() - started
+                    latencies.append(first)
+                else:
+                    await model.ainvoke(messages)
+                    latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    metric = "первый токен" if args.stream else "ответ"
+    print(f"\n{label}: {args.requests} запросов за {elapsed:.1f} с, ошибок: {errors}")
+    print(f"  {metric}: p50={percentile(latencies, 50) * 1000:.0f} мс p90={percentile(latencies, 90) * 1000:.0f} мс "
+          f"p99={percentile(latencies, 99) * 1000:.0f} мс max={(latencies[-1] if latencies else 0) * 1000:.0f} мс")
+    if not isinstance(model, LLMPool):
+        return
+    print(f"  хеджей: {model.hedges} (выиграли: {model.hedge_wins}), переключений: {model.failovers}")
+    for backend in model.stats():
+        latency = backend["first_token"] if args.stream else backend["latency"]
+        print(f"  {backend['name']}: {'исправен' if backend['healthy'] else 'исключен'}, "
+              f"EWMA {(latency or 0) * 1000:.0f} мс, ошибки {backend['error_rate']:.2f}, вызовы {backend['calls']}")
+
+
+async def main_async(args) -> int:
+    from langchain_openai import ChatOpenAI
+
+    service = QAService()
+    pool = service._create_llm(ChatOpenAI)
+    if args.baseline:
+        # Модель первого бэкенда напрямую: без хеджирования и переключения
+        await run(pool.backends[0].model, args, f"Только {pool.backends[0].name}")
+    await run(pool, args, f"Пул ({len(pool.backends)} бэкенда, хедж после p{service.llm_hedge_percentile:g})")
+    return 0
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Нагрузка на пул LLM-бэкендов QA-сервиса")
+    parser.add_argument("--requests", type=int, default=200, help="Количество запросов")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов")
+    parser.add_argument("--stream", action="store_true", help="Потоковые ответы (задержка до первого токена)")
+    parser.add_argument("--baseline", action="store_true", help="Сначала прогон через первый бэкенд без пула")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
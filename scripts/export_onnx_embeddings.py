@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Экспорт модели sentence-transformers в ONNX и динамическое int8-квантование
+для EMBEDDING_BACKEND=onnx.
+
+Нужен, если в репозитории модели на Hugging Face нет каталога onnx/ или сервер
+не имеет доступа к Hugging Face. Требует sentence-transformers (PyTorch) и onnx
+(pip install onnx) только на машине, где выполняется экспорт.
+
+Результат - каталог модели sentence-transformers (токенизатор, настройки пулинга)
+с onnx/model.onnx и квантованной onnx/model_quint8_avx2.onnx:
+    EMBEDDING_BACKEND=onnx
+    EMBEDDING_ONNX_PATH=<каталог>
+
+Пример:
+    python scripts/export_onnx_embeddings.py --output ./models/all-MiniLM-L6-v2-onnx
+    python scripts/validate_embeddings.py --onnx-path ./models/all-MiniLM-L6-v2-onnx
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_backends import DEFAULT_ONNX_FILE  # noqa: E402
+
+
+def export(model_name: str, output_dir: str, opset: int) -> str:
+    """Экспорт трансформера модели в ONNX; возвращает путь к model.onnx"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    # Токенизатор и настройки пулинга сохраняются рядом с ONNX в формате sentence-transformers
+    model.save(output_dir)
+
+    transformer = model[0].auto_model.eval()
+    sample = model.tokenizer(["Пример текста для экспорта", "example"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    onnx_path = os.path.join(output_dir, "onnx", "model.onnx")
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            ({name: sample[name] for name in input_names},),
+            onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True
+        )
+    return onnx_path
+
+
+def quantize(onnx_path: str, quantized_path: str):
+    """Динамическое квантование весов в uint8 (активации квантуются во время выполнения)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Экспорт модели эмбеддингов в ONNX с int8-квантованием")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--output", required=True, help="Каталог модели ONNX")
+    parser.add_argument("--opset", type=int, default=14, help="Версия opset ONNX")
+    args = parser.parse_args()
+
+    onnx_path = export(args.model, args.output, args.opset)
+    print(f"ONNX: {onnx_path} ({os.path.getsize(onnx_path) / 1024 / 1024:.1f} МБ)")
+
+    quantized_path = os.path.join(args.output, DEFAULT_ONNX_FILE)
+    quantize(onnx_path, quantized_path)
+    print(f"int8: {quantized_path} ({os.path.getsize(quantized_path) / 1024 / 1024:.1f} МБ)")
+    print(f"\nEMBEDDING_BACKEND=onnx\nEMBEDDING_ONNX_PATH={os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
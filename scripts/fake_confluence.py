@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Локальный фейковый сервер Confluence REST API для проверки индексации
+без доступа к реальному Confluence.
+
+Генерирует пространство из синтетических страниц, умеет добавлять задержку
+и ограничивать частоту запросов ответами 429 с заголовком Retry-After.
+Поддерживает CQL-поиск измененных страниц (/rest/api/search), а также создание,
+изменение и удаление страниц для проверки инкрементальной индексации.
+
+Пример:
+    python scripts/fake_confluence.py --pages 500 --latency-ms 50 --rate-limit 20
+    CF_URL=http://127.0.0.1:8090 CF_USER=u CF_TOKEN=t CF_SPACE=FAKE python -m src.ingest_with_report
+
+    # Изменение и удаление страниц между запусками
+    curl -X PUT http://127.0.0.1:8090/rest/api/content/100005 -d '{"body": {"storage": {"value": "<p>new</p>"}}}'
+    curl -X DELETE http://127.0.0.1:8090/rest/api/content/100006
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# Условия CQL, которые понимает фейковый поиск
+_CQL_SPACE_RE = re.compile(r'space\s*=\s*"?([\w-]+)"?', re.IGNORECASE)
+_CQL_TYPE_RE = re.compile(r'type\s*=\s*"?(\w+)"?', re.IGNORECASE)
+_CQL_MODIFIED_RE = re.compile(r'lastmodified\s*>=\s*"([^"]+)"', re.IGNORECASE)
+
+
+def _now_iso() -> str:
+    """Текущее время в формате version.when"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _parse_when(value: str) -> datetime:
+    """Разбор version.when"""
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+
+
+class FakeSpace:
+    """Синтетическое пространство Confluence"""
+
+    def __init__(self, space_key: str, page_count: int):
+        self.space_key = space_key
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.next_id = 100000 + page_count
+        for i in range(page_count):
+            page_id = str(100000 + i)
+            self.pages[page_id] = self._make_page(page_id, f"Синтетическая страница {i}", self._make_body(i))
+
+    @staticmethod
+    def _make_page(page_id: str, title: str, body: str) -> dict:
+        return {
+            "id": page_id,
+            "type": "page",
+            "title": title,
+            "version": {"number": 1, "when": "2025-01-01T00:00:00.000Z"},
+            "metadata": {"labels": {"results": [{"name": "synthetic"}]}},
+            "body": {"storage": {"value": body, "representation": "storage"}},
+        }
+
+    @staticmethod
+    def _make_body(i: int) -> str:
+        paragraphs = "".join(
+            f"<p>Раздел {j} страницы {i}: эндпоинт /api/v1/resource{j} возвращает статус сервиса.</p>"
+            for j in range(20)
+        )
+        return f"<h1>Страница {i}</h1>{paragraphs}"
+
+    def render(self, page: dict, expand: str) -> dict:
+        """Оставляет в ответе только запрошенные раскрытия, как это делает Confluence"""
+        expanded = {part.strip() for part in expand.split(",") if part.strip()}
+        result = {"id": page["id"], "type": page["type"], "title": page["title"]}
+        if "version" in expanded:
+            result["version"] = page["version"]
+        if "metadata.labels" in expanded:
+            result["metadata"] = page["metadata"]
+        if "body.storage" in expanded:
+            result["body"] = page["body"]
+        return result
+
+    def search(self, cql: str) -> list:
+        """Страницы, подходящие под CQL (space, type, lastmodified >= "yyyy-MM-dd HH:mm")"""
+        space_match = _CQL_SPACE_RE.search(cql)
+        type_match = _CQL_TYPE_RE.search(cql)
+        modified_match = _CQL_MODIFIED_RE.search(cql)
+        if space_match is None:
+            raise ValueError("CQL без условия space не поддерживается")
+
+        since = None
+        if modified_match:
+            since = datetime.strptime(modified_match.group(1), "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+
+        with self.lock:
+            pages = list(self.pages.values())
+        return [
+            page for page in pages
+            if space_match.group(1) == self.space_key
+            and (type_match is None or type_match.group(1) == page["type"])
+            and (since is None or _parse_when(page["version"]["when"]) >= since)
+        ]
+
+    def create(self, title: str, body: str) -> dict:
+        """Создание страницы"""
+        with self.lock:
+            page_id = str(self.next_id)
+            self.next_id += 1
+            page = self._make_page(page_id, title, body)
+            page["version"]["when"] = _now_iso()
+            self.pages[page_id] = page
+        return page
+
+    def update(self, page_id: str, payload: dict) -> dict:
+        """Изменение страницы: новая версия с текущим временем"""
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return None
+            if "title" in payload:
+                page["title"] = payload["title"]
+            body = payload.get("body", {}).get("storage", {}).get("value")
+            if body is not None:
+                page["body"] = {"storage": {"value": body, "representation": "storage"}}
+            page["version"] = {"number": page["version"]["number"] + 1, "when": _now_iso()}
+        return page
+
+    def delete(self, page_id: str) -> bool:
+        """Удаление страницы"""
+        with self.lock:
+            return self.pages.pop(page_id, None) is not None
+
+
+class TokenBucket:
+    """Простое ограничение частоты запросов на стороне сервера"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def make_handler(space: FakeSpace, latency: float, bucket: TokenBucket, retry_after: int):
+    """Создание обработчика запросов с заданными параметрами"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if bucket and not bucket.allow():
+                self._send_json(
+                    429,
+                    {"statusCode": 429, "message": "Rate limit exceeded"},
+                    {"Retry-After": str(retry_after)}
+                )
+                return
+
+            if latency:
+                time.sleep(latency)
+
+            parsed = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+            path = parsed.path.rstrip("/")
+            expand = params.get("expand", "")
+
+            if path.endswith("/rest/api/content"):
+                self._list_content(params, expand)
+            elif path.endswith("/rest/api/search"):
+                self._search(params, expand)
+            elif "/rest/api/content/" in path:
+                page_id = path.rsplit("/", 1)[-1]
+                page = space.pages.get(page_id)
+                if page is None:
+                    self._send_json(404, {"statusCode": 404, "message": "No content found"})
+                else:
+                    self._send_json(200, space.render(page, expand))
+            else:
+                self._send_json(404, {"statusCode": 404, "message": f"Unknown endpoint {path}"})
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_POST(self):
+            if urlparse(self.path).path.rstrip("/").endswith("/rest/api/content"):
+                payload = self._read_json()
+                body = payload.get("body", {}).get("storage", {}).get("value", "")
+                page = space.create(payload.get("title", "Новая страница"), body)
+                self._send_json(200, space.render(page, "version"))
+            else:
+                self._send_json(404, {"statusCode": 404, "message": "Unknown endpoint"})
+
+        def do_PUT(self):
+            page_id = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+            page = space.update(page_id, self._read_json())
+            if page is None:
+                self._send_json(404, {"statusCode": 404, "message": "No content found"})
+            else:
+                self._send_json(200, space.render(page, "version"))
+
+        def do_DELETE(self):
+            page_id = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+            if space.delete(page_id):
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                self._send_json(404, {"statusCode": 404, "message": "No content found"})
+
+        def _search(self, params: dict, expand: str):
+            try:
+                pages = space.search(params.get("cql", ""))
+            except ValueError as e:
+                self._send_json(400, {"statusCode": 400, "message": str(e)})
+                return
+
+            # Раскрытия в поиске задаются относительно content: content.version, content.metadata.labels
+            content_expand = ",".join(
+                part.strip()[len("content."):] for part in expand.split(",") if part.strip().startswith("content.")
+            )
+            start = int(params.get("start", 0))
+            limit = int(params.get("limit", 25))
+            batch = pages[start:start + limit]
+            self._send_json(200, {
+                "results": [
+                    {
+                        "content": space.render(page, content_expand),
+                        "title": page["title"],
+                        "lastModified": page["version"]["when"],
+                    }
+                    for page in batch
+                ],
+                "start": start,
+                "limit": limit,
+                "size": len(batch),
+                "totalSize": len(pages),
+            })
+
+        def _list_content(self, params: dict, expand: str):
+            with space.lock:
+                pages = [page for page in space.pages.values()]
+            if "title" in params:
+                pages = [page for page in pages if page["title"] == params["title"]]
+
+            start = int(params.get("start", 0))
+            limit = int(params.get("limit", 25))
+            batch = pages[start:start + limit]
+            self._send_json(200, {
+                "results": [space.render(page, expand) for page in batch],
+                "start": start,
+                "limit": limit,
+                "size": len(batch),
+            })
+
+    return Handler
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Фейковый сервер Confluence REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--space", default="FAKE", help="Ключ пространства")
+    parser.add_argument("--pages", type=int, default=100, help="Количество синтетических страниц")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Задержка ответа, мс")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Лимит запросов в секунду (0 - без лимита)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Значение Retry-After для ответов 429, с")
+    args = parser.parse_args()
+
+    space = FakeSpace(args.space, args.pages)
+    bucket = TokenBucket(args.rate_limit) if args.rate_limit else None
+    handler = make_handler(space, args.latency_ms / 1000, bucket, args.retry_after)
+
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Фейковый Confluence: http://{args.host}:{args.port} (пространство {args.space}, {args.pages} страниц)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Локальный фейковый OpenAI-совместимый LLM (POST /v1/chat/completions) для проверки
+пула LLM-бэкендов без обращения к провайдерам.
+
+Отвечает фиксированным текстом обычным или потоковым ответом (SSE, с usage при
+stream_options.include_usage). Добавляет задержку до первого токена с разбросом,
+редкие медленные ответы (хвост задержек, который срезает хеджирование) и ошибки
+с заданной вероятностью. Настройки меняются на ходу через POST /config, счетчики
+запросов, ошибок и отмененных клиентом ответов - GET /stats.
+
+Пример:
+    python scripts/fake_llm_server.py --port 9101 --latency-ms 300 --slow-rate 0.05 --slow-ms 5000
+    python scripts/fake_llm_server.py --port 9102 --latency-ms 400 --error-rate 0.1
+    LLM_BACKENDS='[{"name": "a", "model": "fake", "base_url": "http://127.0.0.1:9101/v1"},
+                   {"name": "b", "model": "fake", "base_url": "http://127.0.0.1:9102/v1"}]' \\
+        python scripts/benchmark_llm_pool.py --requests 200
+
+    # Отказ бэкенда во время прогона
+    curl -X POST http://127.0.0.1:9101/config -d '{"error_rate": 1.0}'
+"""
+
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+
+
+class FakeLLM:
+    """Настройки ответов и счетчики"""
+
+    def __init__(self, args):
+        self.config = {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "slow_rate": args.slow_rate,
+            "slow_ms": args.slow_ms,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+            "token_delay_ms": args.token_delay_ms,
+            "answer": args.answer
+        }
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "slow": 0, "completed": 0, "cancelled": 0, "in_flight": 0}
+
+    def first_token_delay(self) -> float:
+        """Задержка до первого токена: базовая с разбросом, иногда - медленный ответ"""
+        delay = self.config["latency_ms"] + random.uniform(0, self.config["jitter_ms"])
+        if random.random() < self.config["slow_rate"]:
+            self.stats["slow"] += 1
+            delay += self.config["slow_ms"]
+        return delay / 1000
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None, usage=None) -> bytes:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    if usage:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    llm: FakeLLM = request.app["llm"]
+    body = await request.json()
+    llm.stats["requests"] += 1
+    llm.stats["in_flight"] += 1
+    try:
+        await asyncio.sleep(llm.first_token_delay())
+        if random.random() < llm.config["error_rate"]:
+            llm.stats["errors"] += 1
+            status = llm.config["error_status"]
+            return web.json_response(
+                {"error": {"message": f"fake error {status}", "type": "server_error", "code": None}},
+                status=status,
+                headers={"Retry-After": "1"} if status == 429 else None
+            )
+
+        model = body.get("model", "fake")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        words = llm.config["answer"].split(" ")
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+
+        if not body.get("stream"):
+            await asyncio.sleep(llm.config["token_delay_ms"] * len(words) / 1000)
+            llm.stats["completed"] += 1
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": llm.config["answer"]},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        llm.stats["streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(llm.config["token_delay_ms"] / 1000)
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+            await response.write(_chunk(completion_id, model, delta))
+        await response.write(_chunk(completion_id, model, {}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(_chunk(completion_id, model, {}, usage=usage))
+        await response.write(b"data: [DONE]\n\n")
+        llm.stats["completed"] += 1
+        return response
+    except (asyncio.CancelledError, ConnectionResetError):
+        # Клиент закрыл соединение: проигравший хедж или отключившийся пользователь
+        llm.stats["cancelled"] += 1
+        raise
+    finally:
+        llm.stats["in_flight"] -= 1
+
+
+async def stats(request: web.Request) -> web.Response:
+    llm: FakeLLM = request.app["llm"]
+    return web.json_response({**llm.stats, "config": llm.config})
+
+
+async def update_config(request: web.Request) -> web.Response:
+    llm: FakeLLM = request.app["llm"]
+    changes = await request.json()
+    unknown = set(changes) - set(llm.config)
+    if unknown:
+        return web.json_response({"error": f"неизвестные настройки: {sorted(unknown)}"}, status=400)
+    llm.config.update(changes)
+    return web.json_response(llm.config)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Фейковый OpenAI-совместимый LLM с задержками и ошибками")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Задержка до первого токена, мс")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Случайная добавка к задержке, мс")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Доля медленных ответов")
+    parser.add_argument("--slow-ms", type=float, default=5000, help="Добавка к задержке медленного ответа, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP-статус ошибки (500, 503, 429)")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="Пауза между фрагментами ответа, мс")
+    parser.add_argument("--answer", default="Ответ фейкового LLM по найденной документации.", help="Текст ответа")
+    args = parser.parse_args()
+
+    app = web.Application()
+    app["llm"] = FakeLLM(args)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", stats)
+    app.router.add_post("/config", update_config)
+    print(f"Фейковый LLM: http://{args.host}:{args.port}/v1")
+    # Отмена обработчика при отключении клиента: счетчик cancelled показывает отмененные хеджи
+    web.run_app(app, host=args.host, port=args.port, print=None, handler_cancellation=True)
+
+
+if __name__ == "__main__":
+    main()
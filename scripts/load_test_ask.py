@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест QA-сервиса: N одновременных клиентов задают вопросы в /ask,
+параллельно раз в --health-interval опрашивается /health.
+
+Выводит пропускную способность и перцентили задержки /ask и /health. Задержка /health
+под нагрузкой показывает, не блокируется ли event loop синхронной работой
+(эмбеддинги, поиск в хранилище).
+По умолчанию к каждому вопросу добавляется номер запроса, чтобы ответы не брались
+из семантического кеша (--allow-cache отключает это).
+
+Пример:
+    python scripts/load_test_ask.py --concurrency 50 --requests 1000
+    python scripts/load_test_ask.py --url http://api:8000 --questions questions.txt --allow-cache
+"""
+
+import sys
+import time
+import math
+import random
+import asyncio
+import argparse
+from typing import Dict, List
+
+import aiohttp
+
+DEFAULT_QUESTIONS = [
+    "Где находится health endpoint?",
+    "Как настроить деплой сервиса?",
+    "Какие есть переменные окружения у API?",
+    "Как откатить релиз?",
+    "Где посмотреть логи приложения?",
+    "Как получить доступ к базе данных?",
+    "Какой таймаут у запросов к API?",
+    "Как добавить новую метрику в мониторинг?",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def describe(name: str, latencies: List[float]) -> str:
+    """Строка с перцентилями задержки в мс"""
+    values = sorted(latencies)
+    if not values:
+        return f"{name}: нет данных"
+    return (
+        f"{name}: n={len(values)} "
+        f"p50={percentile(values, 50) * 1000:.0f} мс "
+        f"p90={percentile(values, 90) * 1000:.0f} мс "
+        f"p99={percentile(values, 99) * 1000:.0f} мс "
+        f"max={values[-1] * 1000:.0f} мс"
+    )
+
+
+async def asker(session: aiohttp.ClientSession, args, questions: List[str], counter: Dict, latencies: List[float]):
+    """Клиент, последовательно задающий вопросы"""
+    while counter["next"] < args.requests:
+        number = counter["next"]
+        counter["next"] += 1
+
+        text = random.choice(questions)
+        if not args.allow_cache:
+            text = f"{text} (#{number})"
+
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{args.url}/ask", json={"text": text}) as response:
+                await response.read()
+                if response.status != 200:
+                    counter["errors"] += 1
+                    continue
+        except aiohttp.ClientError:
+            counter["errors"] += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def health_probe(session: aiohttp.ClientSession, args, latencies: List[float], stop: asyncio.Event):
+    """Периодический опрос /health во время нагрузки"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            async with session.get(f"{args.url}/health") as response:
+                await response.read()
+            latencies.append(time.perf_counter() - started)
+        except aiohttp.ClientError:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), args.health_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args) -> int:
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 1)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # Прогрев: первый запрос загружает модель и открывает хранилище
+        async with session.post(f"{args.url}/ask", json={"text": "прогрев"}) as response:
+            await response.read()
+
+        ask_latencies: List[float] = []
+        health_latencies: List[float] = []
+        counter = {"next": 0, "errors": 0}
+        stop = asyncio.Event()
+
+        started = time.perf_counter()
+        probe = asyncio.create_task(health_probe(session, args, health_latencies, stop))
+        await asyncio.gather(*(
+            asker(session, args, questions, counter, ask_latencies) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    print(f"Запросов: {args.requests}, клиентов: {args.concurrency}, ошибок: {counter['errors']}")
+    print(f"Время: {elapsed:.1f} с, {len(ask_latencies) / elapsed:.1f} запросов/с")
+    print(describe("/ask", ask_latencies))
+    print(describe("/health", health_latencies))
+    return 1 if counter["errors"] else 0
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /ask QA-сервиса")
+    parser.add_argument("--url", default="http://localhost:8000", help="Адрес QA-сервиса")
+    parser.add_argument("--concurrency", type=int, default=50, help="Число одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=500, help="Общее число вопросов")
+    parser.add_argument("--questions", help="Файл с вопросами (по одному в строке)")
+    parser.add_argument("--allow-cache", action="store_true", help="Не делать вопросы уникальными")
+    parser.add_argument("--health-interval", type=float, default=0.1, help="Период опроса /health, с")
+    parser.add_argument("--timeout", type=float, default=120, help="Таймаут запроса, с")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
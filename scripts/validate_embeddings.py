@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Проверка совпадения эмбеддингов реализации-кандидата с эталоном на фиксированном корпусе.
+
+Корпус (scripts/fixtures/embedding_parity.json) кодируется обеими реализациями, сравниваются:
+- косинусная близость векторов одного и того же текста (минимум и среднее);
+- recall@k по размеченным релевантным документам для каждой реализации;
+- пересечение top-k выдач и совпадение первого результата.
+
+Реализация задается как "huggingface", "onnx" или "onnx:<файл модели>".
+Код выхода 1, если близость ниже --min-cosine или recall@k кандидата хуже эталона больше чем на --max-recall-drop.
+Те же пороги для реализаций по умолчанию проверяет tests/test_embedding_parity.py (пропускается без модели ONNX).
+
+Пример:
+    python scripts/validate_embeddings.py --reference huggingface --candidate onnx
+    python scripts/validate_embeddings.py --reference onnx:onnx/model.onnx --candidate onnx:onnx/model_quint8_avx2.onnx \\
+        --onnx-path ./models/all-MiniLM-L6-v2-onnx
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_backends import create_embeddings  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "embedding_parity.json")
+
+
+def load_backend(spec: str, model_name: str, onnx_path: str):
+    """Модель по описанию "backend[:файл ONNX]" """
+    backend, _, onnx_file = spec.partition(":")
+    return create_embeddings(backend, model_name, onnx_file=onnx_file or None, onnx_path=onnx_path or None)
+
+
+def encode(spec: str, args, texts: List[str]) -> Tuple[np.ndarray, float]:
+    """Векторы текстов и время кодирования"""
+    embeddings = load_backend(spec, args.model, args.onnx_path)
+    started = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - started
+
+
+def retrieval_metrics(doc_vectors: np.ndarray, query_vectors: np.ndarray, doc_ids: List[str], relevant: List[List[str]], k: int) -> Dict:
+    """top-k документов для каждого запроса и recall@k"""
+    scores = query_vectors @ doc_vectors.T
+    rankings = np.argsort(-scores, axis=1)[:, :k]
+    top_ids = [[doc_ids[i] for i in row] for row in rankings]
+    hits = [bool(set(ids) & set(rel)) for ids, rel in zip(top_ids, relevant)]
+    return {"top_ids": top_ids, "recall": sum(hits) / len(hits)}
+
+
+def load_corpus(path: str = DEFAULT_CORPUS) -> Dict:
+    """Корпус: идентификаторы и тексты документов, запросы и их релевантные документы"""
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    return {
+        "doc_ids": [doc["id"] for doc in corpus["documents"]],
+        "documents": [doc["text"] for doc in corpus["documents"]],
+        "queries": [query["text"] for query in corpus["queries"]],
+        "relevant": [query["relevant"] for query in corpus["queries"]],
+    }
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, corpus: Dict, k: int) -> Dict:
+    """Сравнение векторов корпуса (документы, затем запросы) двух реализаций"""
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    split = len(corpus["documents"])
+    reference_metrics = retrieval_metrics(reference[:split], reference[split:], corpus["doc_ids"], corpus["relevant"], k)
+    candidate_metrics = retrieval_metrics(candidate[:split], candidate[split:], corpus["doc_ids"], corpus["relevant"], k)
+
+    top_pairs = list(zip(reference_metrics["top_ids"], candidate_metrics["top_ids"]))
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "reference_recall": reference_metrics["recall"],
+        "candidate_recall": candidate_metrics["recall"],
+        "overlap": float(np.mean([len(set(ref) & set(cand)) / k for ref, cand in top_pairs])),
+        "top1": float(np.mean([ref[0] == cand[0] for ref, cand in top_pairs])),
+    }
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Проверка эмбеддингов кандидата по эталону")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--reference", default="huggingface", help="Эталонная реализация")
+    parser.add_argument("--candidate", default="onnx", help="Проверяемая реализация")
+    parser.add_argument("--onnx-path", default=os.getenv("EMBEDDING_ONNX_PATH", ""), help="Каталог модели ONNX")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON с documents и queries")
+    parser.add_argument("--k", type=int, default=3, help="Глубина выдачи для recall@k")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Минимальная близость векторов одного текста")
+    parser.add_argument("--max-recall-drop", type=float, default=0.0, help="Допустимое снижение recall@k")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = corpus["documents"] + corpus["queries"]
+
+    reference, reference_seconds = encode(args.reference, args, texts)
+    candidate, candidate_seconds = encode(args.candidate, args, texts)
+
+    if reference.shape != candidate.shape:
+        print(f"Размерности не совпадают: {reference.shape} и {candidate.shape}")
+        sys.exit(1)
+
+    metrics = compare(reference, candidate, corpus, args.k)
+
+    print(f"Корпус: {len(corpus['documents'])} документов, {len(corpus['queries'])} запросов, размерность {reference.shape[1]}")
+    print(f"Кодирование: эталон {args.reference} {reference_seconds:.2f} с, кандидат {args.candidate} {candidate_seconds:.2f} с")
+    print(f"Косинусная близость векторов: минимум {metrics['min_cosine']:.4f}, среднее {metrics['mean_cosine']:.4f}")
+    print(f"recall@{args.k}: эталон {metrics['reference_recall']:.3f}, кандидат {metrics['candidate_recall']:.3f}")
+    print(f"Пересечение top-{args.k}: {metrics['overlap']:.3f}, совпадение первого результата: {metrics['top1']:.3f}")
+
+    failed = False
+    if metrics["min_cosine"] < args.min_cosine:
+        print(f"❌ Близость векторов ниже {args.min_cosine}")
+        failed = True
+    if metrics["candidate_recall"] < metrics["reference_recall"] - args.max_recall_drop:
+        print(f"❌ recall@{args.k} кандидата ниже эталона")
+        failed = True
+    if not failed:
+        print("✅ Кандидат совпадает с эталоном")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Допуск запросов к LLM: ограничение одновременных вызовов, очередь с приоритетами и сроки запросов.
+
+Одновременно выполняется не больше limit вызовов LLM, остальные ждут в очереди.
+Очередь упорядочена по приоритету (interactive - вопросы из Slack и /ask - раньше batch),
+внутри приоритета - по времени прихода. Перегрузка не копится у провайдера в виде 429
+и таймаутов: при заполненной очереди запрос отклоняется сразу (429), запрос, срок
+которого истечет в очереди (по оценке или фактически), - тоже (503). Клиент получает
+Retry-After - оценку времени, за которое очередь освободится.
+
+Используется из одного event loop, блокировки не нужны.
+"""
+
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+# Приоритеты по убыванию
+LANES = ("interactive", "batch")
+
+# Сглаживание оценки длительности вызова LLM (EWMA)
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к LLM: очередь заполнена (429) или срок запроса не будет выдержан (503)"""
+
+    def __init__(self, reason: str, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMAdmission:
+    """Ограничитель одновременных вызовов LLM с очередью по приоритетам"""
+
+    def __init__(self, limit: int, max_queue: int, expected_llm_seconds: float = 3.0):
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.queued: Dict[str, int] = {lane: 0 for lane in LANES}
+        # Оценка длительности вызова для Retry-After и проверки срока; уточняется по фактическим вызовам
+        self.llm_seconds = expected_llm_seconds
+
+        # (приоритет, порядок прихода, future ожидающего); отказавшиеся удаляются при выдаче слота
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        """Запросов в очереди"""
+        return sum(self.queued.values())
+
+    def expected_wait(self, lane: str) -> float:
+        """Оценка ожидания в очереди для нового запроса: запросы не ниже его приоритета впереди"""
+        if self.active < self.limit:
+            return 0.0
+        ahead = sum(self.queued[other] for other in LANES[:LANES.index(lane) + 1])
+        # limit вызовов выполняются параллельно: слот освобождается в среднем раз в llm_seconds / limit
+        return (ahead + 1) * self.llm_seconds / self.limit
+
+    def retry_after(self) -> int:
+        """Через сколько секунд стоит повторить запрос: оценка освобождения очереди"""
+        return max(1, math.ceil((self.depth + 1) * self.llm_seconds / self.limit))
+
+    def check(self, lane: str = "interactive", bounded: bool = True):
+        """Быстрая проверка до начала обработки: AdmissionRejected, если очередь заполнена"""
+        if bounded and self.active >= self.limit and self.depth >= self.max_queue:
+            raise AdmissionRejected(
+                "queue_full", 429, self.retry_after(),
+                f"Очередь к LLM заполнена ({self.depth} запросов), повторите через {self.retry_after()} с"
+            )
+
+    async def acquire(self, lane: str = "interactive", deadline: Optional[float] = None, bounded: bool = True) -> float:
+        """
+        Ожидание слота для вызова LLM; возвращает время ожидания в секундах.
+        deadline - срок запроса по time.monotonic(), bounded=False - без ограничения размера очереди
+        (очереди пакетов уже ограничены BATCH_LLM_CONCURRENCY).
+        """
+        if lane not in LANES:
+            raise ValueError(f"Неизвестный приоритет: {lane}")
+        started = time.monotonic()
+        # Срок уже истек: вызов LLM не нужен, даже если слот свободен
+        if deadline is not None and deadline <= started:
+            raise self._deadline_rejected("истек до вызова LLM")
+        # В _waiters могут остаться отказавшиеся, очередь - только ожидающие
+        if self.active < self.limit and self.depth == 0:
+            self.active += 1
+            return 0.0
+
+        self.check(lane, bounded)
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - started
+            if timeout <= self.expected_wait(lane):
+                raise self._deadline_rejected("истечет в очереди к LLM")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (LANES.index(lane), next(self._order), future))
+        self.queued[lane] += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise self._deadline_rejected("истек в очереди к LLM") from None
+        except BaseException:
+            # Слот мог быть передан одновременно с отменой: он переходит следующему
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.queued[lane] -= 1
+        return time.monotonic() - started
+
+    def _deadline_rejected(self, when: str) -> AdmissionRejected:
+        """Отказ по сроку запроса (503 с Retry-After)"""
+        return AdmissionRejected(
+            "deadline", 503, self.retry_after(),
+            f"Срок запроса {when}, повторите через {self.retry_after()} с"
+        )
+
+    def release(self, llm_seconds: Optional[float] = None):
+        """Освобождение слота: он переходит первому ожидающему; llm_seconds уточняет оценку вызова"""
+        if llm_seconds is not None:
+            self.llm_seconds += _EWMA_ALPHA * (llm_seconds - self.llm_seconds)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
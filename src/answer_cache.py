@@ -0,0 +1,263 @@
+"""
+Семантический кеш ответов QA-сервиса.
+
+Ключ - эмбеддинг вопроса: ответ отдается из кеша, если косинусная близость вопроса
+к сохраненному не ниже порога, поэтому разные формулировки одного вопроса
+не требуют повторного поиска и вызова LLM. Записи привязаны к версии индекса
+(после переиндексации кеш сбрасывается), имеют TTL и вытесняются по LRU при превышении размера.
+При заданном пути кеш сохраняется в SQLite и переживает перезапуск сервиса.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """Ответ в кеше"""
+    entry_id: int
+    question: str
+    vector: np.ndarray  # нормализованный эмбеддинг вопроса
+    answer: str
+    k: int
+    created_at: float
+    last_used: float
+    llm_seconds: float  # время генерации ответа, которое экономит попадание
+
+
+class SemanticAnswerCache:
+    """Потокобезопасный кеш ответов с поиском по косинусной близости вопросов"""
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: float,
+        max_entries: int,
+        path: Optional[str] = None
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self.index_version: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 1
+
+        # Матрица эмбеддингов для поиска одним умножением; перестраивается после изменений
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "entry_id INTEGER PRIMARY KEY, question TEXT NOT NULL, vector BLOB NOT NULL, "
+                "answer TEXT NOT NULL, k INTEGER NOT NULL, index_version TEXT, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL, llm_seconds REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def load(self, index_version: Optional[str]):
+        """Загрузка сохраненных ответов для версии индекса; ответы других версий удаляются"""
+        with self._lock:
+            self._reset(index_version)
+            if self._conn is None:
+                return
+
+            now = time.time()
+            rows = self._conn.execute(
+                "SELECT entry_id, question, vector, answer, k, created_at, last_used, llm_seconds "
+                "FROM answers WHERE index_version IS ? ORDER BY last_used", (index_version,)
+            ).fetchall()
+            for entry_id, question, blob, answer, k, created_at, last_used, llm_seconds in rows:
+                entry = CachedAnswer(
+                    entry_id=entry_id,
+                    question=question,
+                    vector=np.asarray(array("f", blob), dtype=np.float32),
+                    answer=answer,
+                    k=k,
+                    created_at=created_at,
+                    last_used=last_used,
+                    llm_seconds=llm_seconds
+                )
+                if not self._expired(entry, now):
+                    self._entries[entry_id] = entry
+                self._next_id = max(self._next_id, entry_id + 1)
+
+            self._evict_locked()
+            self._sync_locked()
+
+        logger.info(f"Кеш ответов: {len(self._entries)} записей для версии индекса {index_version or 'без версий'}")
+
+    def _reset(self, index_version: Optional[str]):
+        """Сброс кеша при смене версии индекса (вызывается под блокировкой)"""
+        if self._entries:
+            logger.info(f"Кеш ответов сброшен: версия индекса {self.index_version} → {index_version}")
+        self.index_version = index_version
+        self._entries.clear()
+        self._matrix = None
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM answers WHERE index_version IS NOT ?", (index_version,))
+            self._conn.commit()
+
+    def get(self, vector: List[float], k: int, index_version: Optional[str]) -> Optional[CachedAnswer]:
+        """Ответ на близкий вопрос или None"""
+        query = self._normalize(vector)
+
+        with self._lock:
+            if index_version != self.index_version:
+                self._reset(index_version)
+
+            entry = self._find_locked(query, k)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.saved_seconds += entry.llm_seconds
+            entry.last_used = time.time()
+            self._entries.move_to_end(entry.entry_id)
+            if self._conn is not None:
+                self._conn.execute(
+                    "UPDATE answers SET last_used = ? WHERE entry_id = ?", (entry.last_used, entry.entry_id)
+                )
+                self._conn.commit()
+            return entry
+
+    def _find_locked(self, query: np.ndarray, k: int) -> Optional[CachedAnswer]:
+        """Самая близкая подходящая запись не ниже порога"""
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = np.stack([self._entries[entry_id].vector for entry_id in self._matrix_ids])
+
+        now = time.time()
+        similarities = self._matrix @ query
+        for position in np.argsort(-similarities):
+            if similarities[position] < self.threshold:
+                break
+            entry = self._entries.get(self._matrix_ids[position])
+            if entry is None or entry.k != k:
+                continue
+            if self._expired(entry, now):
+                self._remove_locked(entry.entry_id)
+                continue
+            return entry
+
+        return None
+
+    def put(self, question: str, vector: List[float], answer: str, k: int, index_version: Optional[str], llm_seconds: float):
+        """Сохранение ответа"""
+        now = time.time()
+        with self._lock:
+            # Ответ, полученный по старой версии индекса, не сохраняется
+            if index_version != self.index_version:
+                return
+
+            entry = CachedAnswer(
+                entry_id=self._next_id,
+                question=question,
+                vector=self._normalize(vector),
+                answer=answer,
+                k=k,
+                created_at=now,
+                last_used=now,
+                llm_seconds=llm_seconds
+            )
+            self._next_id += 1
+            self._entries[entry.entry_id] = entry
+            self._matrix = None
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (entry_id, question, vector, answer, k, index_version, "
+                    "created_at, last_used, llm_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.entry_id,
+                        question,
+                        array("f", entry.vector.tolist()).tobytes(),
+                        answer,
+                        k,
+                        index_version,
+                        now,
+                        now,
+                        llm_seconds
+                    )
+                )
+
+            self._evict_locked()
+            self._sync_locked()
+
+    def _remove_locked(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        self._matrix = None
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM answers WHERE entry_id = ?", (entry_id,))
+
+    def _evict_locked(self):
+        """Вытеснение давно не использованных записей сверх лимита"""
+        while len(self._entries) > self.max_entries:
+            entry_id = next(iter(self._entries))
+            self._remove_locked(entry_id)
+
+    def _sync_locked(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def clear(self):
+        """Удаление всех ответов"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Статистика кеша"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "index_version": self.index_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_llm_seconds": round(self.saved_seconds, 3),
+            "persistent": self._conn is not None
+        }
@@ -0,0 +1,177 @@
+"""
+Сборка контекста для LLM из найденных фрагментов с ограничением по числу токенов.
+
+Соседние чанки одной страницы (chunk_index подряд) склеиваются в один фрагмент
+без повторения перекрытия, дубликаты отбрасываются. Фрагменты добавляются в порядке
+релевантности, пока помещаются в бюджет токенов, поэтому размер промпта (а значит,
+задержка и стоимость вызова LLM) не зависит от длины найденных чанков.
+"""
+
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Разделитель фрагментов в контексте
+SEPARATOR = "\n\n---\n\n"
+
+# Оценка без токенизатора: для смеси русского и английского текста ~3 символа на токен
+_CHARS_PER_TOKEN = 3
+
+# Перекрытие короче этого не ищется, чтобы не склеивать случайные совпадения
+_MIN_OVERLAP_CHARS = 8
+
+
+def _load_token_counter(model_name: str) -> Callable[[str], int]:
+    """Счетчик токенов модели (tiktoken) или оценка по числу символов, если словарь недоступен"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.warning(f"Токенизатор недоступен ({type(e).__name__}), размер контекста оценивается по числу символов")
+        return lambda text: math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+@dataclass
+class Passage:
+    """Фрагмент контекста: один чанк или несколько соседних чанков одной страницы"""
+    page_id: str
+    first_index: int
+    last_index: int
+    text: str
+    metadata: Dict
+    score: float  # оценка лучшего из чанков: расстояние или место в выдаче (меньше - релевантнее)
+    chunks: List[int] = field(default_factory=list)
+
+
+@dataclass
+class AssembledContext:
+    """Собранный контекст и его состав"""
+    text: str
+    tokens: int
+    passages: List[Passage]
+    dropped: int  # фрагменты, не поместившиеся в бюджет
+
+
+def merge_overlap(left: str, right: str, max_overlap: int) -> str:
+    """Склейка соседних чанков: начало right, совпадающее с концом left, не повторяется"""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+class ContextAssembler:
+    """Склейка соседних чанков и заполнение бюджета токенов по релевантности"""
+
+    def __init__(self, model_name: str, chunk_overlap: int):
+        self.model_name = model_name
+        # Перекрытие ищется с запасом: сплиттер выравнивает его по границам слов
+        self.max_overlap = max(chunk_overlap * 2, _MIN_OVERLAP_CHARS)
+        self._count_tokens: Optional[Callable[[str], int]] = None
+
+    def count_tokens(self, text: str) -> int:
+        if self._count_tokens is None:
+            self._count_tokens = _load_token_counter(self.model_name)
+        return self._count_tokens(text)
+
+    @staticmethod
+    def _source_header(metadata: Dict) -> str:
+        """Информация об источнике фрагмента"""
+        header = f"[Страница: {metadata.get('title', 'N/A')}]"
+        if metadata.get('url'):
+            header += f" ({metadata['url']})"
+        return header
+
+    def merge(self, hits: List[Tuple[Document, float]]) -> List[Passage]:
+        """Склейка найденных чанков в фрагменты, по возрастанию оценки"""
+        by_page: Dict[str, Dict[int, Tuple[Document, float]]] = {}
+        loose: List[Passage] = []
+        seen_texts = set()
+
+        for doc, score in hits:
+            # Одинаковый текст (повтор чанка или копия страницы) попадает в контекст один раз
+            if doc.page_content in seen_texts:
+                continue
+            seen_texts.add(doc.page_content)
+
+            page_id = doc.metadata.get("page_id")
+            chunk_index = doc.metadata.get("chunk_index")
+            if page_id is None or chunk_index is None:
+                loose.append(Passage(
+                    page_id=str(page_id), first_index=-1, last_index=-1, text=doc.page_content,
+                    metadata=doc.metadata, score=score
+                ))
+                continue
+            by_page.setdefault(page_id, {})[int(chunk_index)] = (doc, score)
+
+        passages = loose
+        for page_id, chunks in by_page.items():
+            current: Optional[Passage] = None
+            for chunk_index in sorted(chunks):
+                doc, score = chunks[chunk_index]
+                if current is not None and chunk_index == current.last_index + 1:
+                    current.text = merge_overlap(current.text, doc.page_content, self.max_overlap)
+                    current.last_index = chunk_index
+                    current.score = min(current.score, score)
+                    current.chunks.append(chunk_index)
+                    continue
+                current = Passage(
+                    page_id=page_id, first_index=chunk_index, last_index=chunk_index, text=doc.page_content,
+                    metadata=doc.metadata, score=score, chunks=[chunk_index]
+                )
+                passages.append(current)
+
+        passages.sort(key=lambda passage: passage.score)
+        return passages
+
+    def assemble(self, hits: List[Tuple[Document, float]], max_tokens: int) -> AssembledContext:
+        """Контекст из найденных чанков в пределах max_tokens (0 - без ограничения)"""
+        passages = self.merge(hits)
+        separator_tokens = self.count_tokens(SEPARATOR)
+
+        selected: List[Tuple[Passage, str]] = []
+        total = 0
+        dropped = 0
+        for passage in passages:
+            block = f"{self._source_header(passage.metadata)}\n{passage.text}"
+            tokens = self.count_tokens(block) + (separator_tokens if selected else 0)
+
+            if max_tokens and total + tokens > max_tokens:
+                if selected:
+                    # Менее релевантный, но более короткий фрагмент еще может поместиться
+                    dropped += 1
+                    continue
+                # Самый релевантный фрагмент не помещается целиком - он обрезается по бюджету
+                block = self._truncate(block, max_tokens)
+                tokens = self.count_tokens(block)
+
+            selected.append((passage, block))
+            total += tokens
+
+        return AssembledContext(
+            text=SEPARATOR.join(block for _, block in selected),
+            tokens=total,
+            passages=[passage for passage, _ in selected],
+            dropped=dropped
+        )
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Обрезка текста до max_tokens"""
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
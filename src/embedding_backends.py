@@ -0,0 +1,181 @@
+"""
+Реализации модели эмбеддингов, общие для индексации и QA-сервиса.
+
+EMBEDDING_BACKEND выбирает реализацию:
+- huggingface - sentence-transformers на PyTorch (эталон);
+- onnx - та же модель в ONNX Runtime, по умолчанию int8-квантованная: быстрее кодирует
+  на CPU, быстрее загружается и занимает меньше памяти, не требует PyTorch.
+
+Модель ONNX берется из каталога EMBEDDING_ONNX_PATH (см. scripts/export_onnx_embeddings.py)
+или скачивается из репозитория EMBEDDING_MODEL на Hugging Face (файл EMBEDDING_ONNX_FILE).
+Совпадение результатов с эталоном проверяет scripts/validate_embeddings.py.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("huggingface", "onnx")
+
+# Квантованный вариант из каталога onnx/ репозиториев sentence-transformers
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+# Файлы модели, нужные для кодирования через ONNX Runtime
+_ONNX_SUPPORT_FILES = [
+    "tokenizer.json",
+    "tokenizer_config.json",
+    "special_tokens_map.json",
+    "sentence_bert_config.json",
+    "1_Pooling/config.json"
+]
+
+
+def _onnx_file(onnx_file: Optional[str]) -> str:
+    return onnx_file or os.getenv("EMBEDDING_ONNX_FILE", DEFAULT_ONNX_FILE)
+
+
+def embedding_identity(backend: str, model_name: str, onnx_file: Optional[str] = None) -> str:
+    """
+    Идентификатор векторов для ключей кеша эмбеддингов и хеша содержимого страниц.
+    Для эталонной реализации совпадает с именем модели, поэтому существующие индексы остаются актуальными.
+    """
+    if backend == "onnx":
+        return f"{model_name}#onnx:{_onnx_file(onnx_file)}"
+    return model_name
+
+
+def create_embeddings(
+    backend: str,
+    model_name: str,
+    batch_size: int = 32,
+    onnx_file: Optional[str] = None,
+    onnx_path: Optional[str] = None
+) -> Embeddings:
+    """Модель эмбеддингов выбранной реализации с нормализацией векторов"""
+    backend = (backend or "huggingface").lower()
+
+    if backend == "huggingface":
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': batch_size}
+        )
+
+    if backend == "onnx":
+        return OnnxEmbeddings(
+            model_name,
+            model_path=onnx_path if onnx_path is not None else os.getenv("EMBEDDING_ONNX_PATH", ""),
+            model_file=_onnx_file(onnx_file),
+            batch_size=batch_size,
+            threads=int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+        )
+
+    raise ValueError(f"Неизвестная реализация эмбеддингов: {backend}. Доступны: {', '.join(EMBEDDING_BACKENDS)}")
+
+
+class OnnxEmbeddings(Embeddings):
+    """Эмбеддинги модели sentence-transformers через ONNX Runtime"""
+
+    def __init__(
+        self,
+        model_name: str,
+        model_path: str = "",
+        model_file: str = DEFAULT_ONNX_FILE,
+        batch_size: int = 32,
+        threads: int = 0
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.model_file = model_file
+        self.batch_size = max(1, batch_size)
+        self.model_dir = model_path or self._download(model_name, model_file)
+
+        config = self._read_json("sentence_bert_config.json")
+        pooling = self._read_json(os.path.join("1_Pooling", "config.json"))
+        self.max_length = int(config.get("max_seq_length", 256))
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        pad_token = self._read_json("tokenizer_config.json").get("pad_token", "[PAD]")
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "[PAD]")
+        pad_id = self.tokenizer.token_to_id(pad_token)
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 0, pad_token=pad_token)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(self.model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+        logger.info(f"Модель эмбеддингов ONNX: {model_name} ({model_file}), пулинг: {self.pooling}")
+
+    @staticmethod
+    def _download(model_name: str, model_file: str) -> str:
+        """Скачивание файла ONNX и токенизатора из репозитория модели"""
+        from huggingface_hub import snapshot_download
+
+        return snapshot_download(model_name, allow_patterns=[model_file] + _ONNX_SUPPORT_FILES)
+
+    def _read_json(self, relative_path: str) -> Dict:
+        path = os.path.join(self.model_dir, relative_path)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Кодирование пакета: токенизация, модель, пулинг и нормализация"""
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        outputs = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})
+
+        if "sentence_embedding" in self.output_names:
+            vectors = outputs[self.output_names.index("sentence_embedding")]
+        elif self.pooling == "cls":
+            vectors = outputs[0][:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            vectors = (outputs[0] * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги документов пакетами по batch_size"""
+        if not texts:
+            return []
+
+        # Тексты похожей длины кодируются вместе, чтобы пакеты меньше дополнялись паддингом
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            encoded = self._encode_batch([texts[i] for i in positions])
+            for position, vector in zip(positions, encoded):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
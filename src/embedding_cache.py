@@ -0,0 +1,204 @@
+"""
+Персистентный кеш эмбеддингов чанков на SQLite.
+Ключ - хеш (имя модели, нормализованный текст чанка), значение - вектор float32.
+Размер ограничен числом записей, при переполнении вытесняются давно не использованные.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Ограничение числа параметров в одном SQL-запросе
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализация текста для ключа кеша: NFC и схлопывание пробельных символов.
+    Токенизатор модели не различает такие варианты, поэтому эмбеддинги у них совпадают.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Потокобезопасный кеш эмбеддингов с LRU-вытеснением по числу записей"""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Кеш эмбеддингов: {path} ({self._size} записей)")
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Ключ кеша для текста чанка"""
+        payload = f"{model_name}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Получение векторов по ключам с отметкой времени использования"""
+        found = {}
+        now = int(time.time())
+
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+                if rows:
+                    hit_keys = [row[0] for row in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys]
+                    )
+            self._conn.commit()
+
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Сохранение векторов с вытеснением старых записей при переполнении"""
+        if not items:
+            return
+
+        now = int(time.time())
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._size += max(cursor.rowcount, 0)
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Вытеснение давно не использованных записей до 90% лимита"""
+        excess = self._size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Кеш эмбеддингов: вытеснено {excess} записей")
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Чтение служебного значения"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        """Запись служебного значения"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+            self._conn.commit()
+
+    def close(self):
+        """Закрытие соединения"""
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Модель эмбеддингов, которая перед кодированием документов обращается к кешу"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+        # Статистика текущего запуска
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+        # Среднее время кодирования чанка из прошлых запусков для оценки экономии
+        saved_avg = cache.get_meta(f"avg_encode_seconds:{model_name}")
+        self._prior_avg_encode_seconds = float(saved_avg) if saved_avg else None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги документов: из кеша, недостающие - моделью одним пакетом"""
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        # Одинаковые чанки внутри пакета кодируются один раз
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            started = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.encode_seconds += time.perf_counter() - started
+
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Запросы не кешируются"""
+        return self.embeddings.embed_query(text)
+
+    @property
+    def avg_encode_seconds(self) -> Optional[float]:
+        """Среднее время кодирования одного чанка"""
+        if self.misses:
+            return self.encode_seconds / self.misses
+        return self._prior_avg_encode_seconds
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика кеша за запуск"""
+        total = self.hits + self.misses
+        avg = self.avg_encode_seconds
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "encode_seconds": self.encode_seconds,
+            "saved_seconds": self.hits * avg if avg else 0.0,
+        }
+
+    def save_stats(self):
+        """Сохранение среднего времени кодирования для следующих запусков"""
+        if self.misses:
+            self.cache.set_meta(f"avg_encode_seconds:{self.model_name}", str(self.encode_seconds / self.misses))
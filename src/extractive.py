@@ -0,0 +1,181 @@
+"""
+Извлекающие ответы без LLM: лучшие из найденных фрагментов с названием и ссылкой на страницу
+и предложением, которое точнее всего отвечает на вопрос.
+
+На вопросы-справки ("где health endpoint", "какой URL у дашборда") отвечает найденный
+фрагмент, и ожидание LLM (секунды) не нужно: ответ строится за время поиска.
+Предложения фрагментов оцениваются локально - долей слов вопроса, которые в них есть,
+с весами IDF лексического индекса (редкие слова вопроса важнее частых, вроде "где" и "как").
+Оценка лучшего предложения - уверенность: по ней сервис решает, достаточно ли извлеченного
+ответа, или нужна LLM. Тот же ответ отдается, когда LLM недоступна.
+
+Уверенность - не оценка поиска (не косинусная близость векторов и не балл RRF), а покрытие
+слов вопроса одним предложением: 1.0 - в нем есть все слова вопроса, 0.5 - слова с половиной
+суммарного веса IDF. Порог EXTRACTIVE_AUTO_CONFIDENCE подбирается в этой шкале.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from .lexical_index import LexicalIndex, tokenize
+
+# context_assembler импортирует langchain, который QA-сервис загружает при инициализации в фоне
+if TYPE_CHECKING:
+    from .context_assembler import Passage
+
+# Режимы ответа: llm - генерация, extractive - найденные фрагменты, auto - фрагменты при высокой уверенности
+ANSWER_MODES = ("llm", "extractive", "auto")
+
+# Граница предложения: конец строки или знак конца предложения перед следующим предложением
+_SENTENCE_END_RE = re.compile(r"\n+|(?<=[.!?…])\s+(?=[\"«(\[0-9A-ZА-ЯЁ])")
+
+# Предложение длиннее (строка таблицы, код) обрезается в подсветке
+_MAX_HIGHLIGHT_CHARS = 400
+
+NOT_FOUND = "В документации не найдено фрагментов по этому вопросу."
+DEGRADED_NOTE = "LLM сейчас недоступна, ниже - найденные фрагменты документации."
+
+
+@dataclass
+class ExtractedPassage:
+    """Фрагмент извлекающего ответа"""
+    title: Optional[str]
+    url: Optional[str]
+    text: str  # отрывок вокруг лучшего предложения
+    highlight: Optional[str]  # лучшее предложение (None - ни одного слова вопроса)
+    score: float  # взвешенная доля слов вопроса в лучшем предложении, 0..1
+
+
+@dataclass
+class ExtractiveAnswer:
+    """Извлекающий ответ: текст для пользователя, фрагменты и уверенность"""
+    text: str
+    confidence: float  # оценка лучшего фрагмента: доля слов вопроса с весами IDF, не оценка поиска
+    passages: List[ExtractedPassage] = field(default_factory=list)
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Границы предложений текста (начало, конец) без пробелов по краям"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    result = []
+    for start, end in spans:
+        sentence = text[start:end]
+        stripped = sentence.strip()
+        if stripped:
+            offset = start + sentence.index(stripped)
+            result.append((offset, offset + len(stripped)))
+    return result
+
+
+class ExtractiveAnswerer:
+    """Выбор фрагментов и предложений по словам вопроса"""
+
+    def __init__(self, max_passages: int = 2, max_chars: int = 600):
+        self.max_passages = max(1, max_passages)
+        self.max_chars = max(1, max_chars)
+
+    def answer(
+        self,
+        question: str,
+        passages: List["Passage"],
+        lexical: Optional[LexicalIndex] = None,
+        degraded: bool = False
+    ) -> ExtractiveAnswer:
+        """
+        Извлекающий ответ по фрагментам контекста (в порядке релевантности поиска).
+        Фрагменты переупорядочиваются по оценке лучшего предложения, при равенстве - по поиску.
+        """
+        weights = self._term_weights(question, lexical)
+        scored = []
+        for position, passage in enumerate(passages):
+            sentence, score = self._best_sentence(passage.text, weights)
+            scored.append((score, position, passage, sentence))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        extracted = [
+            ExtractedPassage(
+                title=passage.metadata.get("title"),
+                url=passage.metadata.get("url"),
+                text=self._excerpt(passage.text, sentence),
+                highlight=self._highlight(passage.text, sentence),
+                score=round(score, 3)
+            )
+            for score, _, passage, sentence in scored[:self.max_passages]
+        ]
+        # Фрагменты без слов вопроса после первого не помогают ответу
+        extracted = extracted[:1] + [passage for passage in extracted[1:] if passage.score > 0]
+
+        blocks = [DEGRADED_NOTE] if degraded else []
+        blocks += [self._format(passage) for passage in extracted] or [NOT_FOUND]
+        return ExtractiveAnswer(
+            text="\n\n".join(blocks),
+            confidence=extracted[0].score if extracted else 0.0,
+            passages=extracted
+        )
+
+    @staticmethod
+    def _term_weights(question: str, lexical: Optional[LexicalIndex]) -> Dict[str, float]:
+        """Веса слов вопроса: IDF по лексическому индексу, без него - одинаковые"""
+        terms = list(dict.fromkeys(tokenize(question)))
+        if lexical is None:
+            return {term: 1.0 for term in terms}
+        return lexical.idf(terms)
+
+    @staticmethod
+    def _best_sentence(text: str, weights: Dict[str, float]) -> Tuple[Optional[Tuple[int, int]], float]:
+        """Предложение с наибольшей взвешенной долей слов вопроса; при равенстве - более короткое"""
+        total = sum(weights.values())
+        if not total:
+            return None, 0.0
+
+        best, best_key = None, (0.0, 0)
+        for start, end in split_sentences(text):
+            words = set(tokenize(text[start:end]))
+            score = sum(weight for term, weight in weights.items() if term in words) / total
+            key = (score, start - end)
+            if score > 0 and key > best_key:
+                best, best_key = (start, end), key
+        return best, min(1.0, best_key[0])
+
+    def _excerpt(self, text: str, sentence: Optional[Tuple[int, int]]) -> str:
+        """Отрывок до max_chars: лучшее предложение, предыдущее и следующие, пока помещаются"""
+        if len(text) <= self.max_chars:
+            return text.strip()
+        spans = split_sentences(text)
+        if not spans:
+            return ""
+        best = spans.index(sentence) if sentence in spans else 0
+
+        first = last = best
+        if best > 0 and spans[best][1] - spans[best - 1][0] <= self.max_chars:
+            first = best - 1
+        while last + 1 < len(spans) and spans[last + 1][1] - spans[first][0] <= self.max_chars:
+            last += 1
+
+        start, end = spans[first][0], min(spans[last][1], spans[first][0] + self.max_chars)
+        excerpt = text[start:end].rstrip()
+        return ("… " if start > 0 else "") + excerpt + (" …" if end < spans[-1][1] else "")
+
+    @staticmethod
+    def _highlight(text: str, sentence: Optional[Tuple[int, int]]) -> Optional[str]:
+        if sentence is None:
+            return None
+        highlight = text[sentence[0]:sentence[1]]
+        if len(highlight) > _MAX_HIGHLIGHT_CHARS:
+            highlight = highlight[:_MAX_HIGHLIGHT_CHARS].rstrip() + " …"
+        return highlight
+
+    @staticmethod
+    def _format(passage: ExtractedPassage) -> str:
+        """Фрагмент в тексте ответа: отрывок и источник"""
+        source = passage.title or "Без названия"
+        if passage.url:
+            source += f" ({passage.url})"
+        return f"{passage.text}\n— {source}"
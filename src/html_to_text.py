@@ -0,0 +1,202 @@
+"""
+Конвертация storage-формата Confluence (XHTML) в текст для индексации.
+
+Две реализации с одинаковым результатом:
+- soup_html_to_text: построение дерева BeautifulSoup и несколько проходов по нему;
+- stream_html_to_text: однопроходный обход событий парсера lxml без построения дерева.
+
+Потоковая версия воспроизводит правила BeautifulSoup: соседние текстовые события
+склеиваются в одну строку, текст внутри script/style/template/rt/rp не попадает
+в результат, блоки кода и диаграммы PlantUML/Mermaid заменяются текстовыми вставками.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+MACRO_TAG = "ac:structured-macro"
+MACRO_NAME_ATTR = "ac:name"
+DIAGRAM_MACROS = ("plantuml", "mermaid")
+
+# Теги, текст внутри которых BeautifulSoup хранит в отдельных типах строк и не включает в get_text()
+EXCLUDED_TEXT_TAGS = frozenset(["script", "style", "template", "rt", "rp"])
+
+
+def _clean_lines(text: str) -> List[str]:
+    """Непустые строки текста без пробелов по краям"""
+    return [line.strip() for line in text.split("\n") if line.strip()]
+
+
+def _code_block(code_text: str) -> str:
+    """Текстовая вставка вместо макроса блока кода"""
+    return f"\n```\n{code_text}\n```\n"
+
+
+def _diagram_block(name: str, diagram_text: str) -> str:
+    """Текстовая вставка вместо макроса диаграммы"""
+    return f"\n[Диаграмма {name}]\n{diagram_text}\n"
+
+
+def soup_html_to_text(html: str) -> str:
+    """Конвертация HTML в текст через дерево BeautifulSoup"""
+    soup = BeautifulSoup(html, "lxml")
+
+    # Удаление скриптов и стилей
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Обработка блоков кода
+    for code in soup.find_all(MACRO_TAG, attrs={MACRO_NAME_ATTR: "code"}):
+        code_text = code.get_text(strip=True)
+        code.replace_with(_code_block(code_text))
+
+    # Обработка PlantUML/Mermaid как текст
+    for macro in soup.find_all(MACRO_TAG, attrs={MACRO_NAME_ATTR: list(DIAGRAM_MACROS)}):
+        macro_text = macro.get_text(strip=True)
+        macro.replace_with(_diagram_block(macro.get(MACRO_NAME_ATTR, "diagram"), macro_text))
+
+    # Извлечение текста
+    text = soup.get_text(separator="\n", strip=True)
+
+    # Очистка лишних переносов строк
+    return "\n".join(_clean_lines(text))
+
+
+class _Capture:
+    """Макрос, текст которого собирается для замены вставкой"""
+
+    __slots__ = ("kind", "name", "depth", "pieces")
+
+    def __init__(self, kind: str, name: str, depth: int):
+        self.kind = kind  # "code" или "diagram"
+        self.name = name
+        self.depth = depth
+        self.pieces: List[str] = []
+
+
+class _StorageTextTarget:
+    """Цель парсера lxml: собирает строки результата по событиям start/end/data"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self._buffer: List[str] = []
+        self._depth = 0
+        # Глубины открытых тегов, исключающих текст (ближайший определяет тип строки)
+        self._excluded: List[int] = []
+        self._captures: List[_Capture] = []
+
+    def _flush(self):
+        """Завершение текущей строки (аналог endData в BeautifulSoup)"""
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+
+        if self._excluded:
+            return
+        self._add_string(text)
+
+    def _add_string(self, text: str):
+        """Добавление строки в собираемый макрос или в результат"""
+        if self._captures:
+            stripped = text.strip()
+            if stripped:
+                self._captures[-1].pieces.append(stripped)
+        else:
+            self.lines.extend(_clean_lines(text))
+
+    def start(self, tag, attrib):
+        self._flush()
+        self._depth += 1
+
+        if tag in EXCLUDED_TEXT_TAGS:
+            self._excluded.append(self._depth)
+            return
+
+        if tag != MACRO_TAG:
+            return
+
+        macro_name = attrib.get(MACRO_NAME_ATTR)
+        if macro_name == "code":
+            kind = "code"
+        elif macro_name in DIAGRAM_MACROS:
+            kind = "diagram"
+        else:
+            return
+
+        # Внутри блока кода вложенные макросы не заменяются: их текст входит в код как есть.
+        # Внутри диаграммы заменяются только блоки кода (их обработка идет раньше диаграмм).
+        if self._captures:
+            outer = self._captures[-1]
+            if outer.kind == "code" or kind == "diagram":
+                return
+
+        self._captures.append(_Capture(kind, macro_name, self._depth))
+
+    def end(self, tag):
+        self._flush()
+
+        if self._excluded and self._excluded[-1] == self._depth:
+            self._excluded.pop()
+
+        if self._captures and self._captures[-1].depth == self._depth:
+            capture = self._captures.pop()
+            text = "".join(capture.pieces)
+            if capture.kind == "code":
+                replacement = _code_block(text)
+            else:
+                replacement = _diagram_block(capture.name, text)
+
+            # Вставка - обычная строка документа, даже внутри исключающих тегов
+            self._add_string(replacement)
+
+        self._depth -= 1
+
+    def data(self, data):
+        self._buffer.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data):
+        self._flush()
+
+    def doctype(self, *args):
+        self._flush()
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self.lines)
+
+
+def stream_html_to_text(html: str) -> str:
+    """Однопроходная конвертация HTML в текст по событиям парсера lxml"""
+    if html and html[0] == "\ufeff":
+        html = html[1:]
+
+    try:
+        parser = etree.HTMLParser(target=_StorageTextTarget(), recover=True)
+        parser.feed(html)
+        return parser.close()
+    except (etree.LxmlError, UnicodeError, LookupError) as e:
+        # Разметку, которую lxml не принял, обрабатываем через BeautifulSoup
+        logger.debug(f"Потоковый парсер не смог разобрать страницу, используется BeautifulSoup: {e}")
+        return soup_html_to_text(html)
+
+
+HTML_CONVERTERS: Dict[str, Callable[[str], str]] = {
+    "bs4": soup_html_to_text,
+    "lxml": stream_html_to_text,
+}
+
+
+def get_html_converter(name: Optional[str]) -> Callable[[str], str]:
+    """Выбор реализации конвертера по имени из конфигурации"""
+    converter = HTML_CONVERTERS.get((name or "lxml").lower())
+    if converter is None:
+        raise ValueError(f"Неизвестный конвертер HTML: {name}. Доступны: {', '.join(HTML_CONVERTERS)}")
+    return converter
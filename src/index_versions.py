@@ -0,0 +1,195 @@
+"""
+Версии векторного индекса для blue/green публикации.
+
+Структура VECTOR_STORE_PATH:
+- versions/<имя>/ - каталог ChromaDB версии вместе с ее манифестом и контрольной точкой;
+- CURRENT - имя опубликованной версии, которую читает QA-сервис;
+- BUILDING - имя версии, которую собирает индексация.
+
+Индексация собирает новую версию в отдельном каталоге (копия текущей для инкрементального
+обновления) и публикует ее атомарной заменой CURRENT. Файлы, которые после записи не изменяются
+(скомпилированные поколения лексического индекса), разделяются с текущей версией жесткими ссылками;
+SQLite и сегменты HNSW ChromaDB изменяются на месте и копируются (copy_file_range: на btrfs/XFS -
+reflink без копирования данных, на ext4 - копирование в ядре). Опубликованные версии не изменяются,
+поэтому QA-сервис читает индекс без конкуренции с записью и переключается на новую
+версию без перезапуска. Каталог без CURRENT читается как индекс прежнего формата.
+"""
+
+import os
+import re
+import shutil
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = "versions"
+CURRENT_POINTER = "CURRENT"
+BUILDING_POINTER = "BUILDING"
+
+# Общие для всех версий файлы корня, которые не копируются в версию
+_SHARED_ENTRIES = {VERSIONS_DIR, CURRENT_POINTER, BUILDING_POINTER, "checkpoint"}
+_SHARED_PREFIXES = ("embedding_cache.sqlite3", ".")
+
+# Каталог скомпилированного поколения лексического индекса: файлы в нем не изменяются после записи
+_IMMUTABLE_DIR_RE = re.compile(r"(^|[\\/])lexical[\\/]g\d+$")
+
+
+def _read_pointer(path: str) -> Optional[str]:
+    """Имя версии из файла-указателя"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def _write_pointer(path: str, name: str):
+    """Атомарная запись файла-указателя"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def resolve_index_path(root: str) -> str:
+    """Каталог опубликованного индекса: текущая версия или сам корень для индекса прежнего формата"""
+    name = _read_pointer(os.path.join(root, CURRENT_POINTER))
+    if name is None:
+        return root
+    return os.path.join(root, VERSIONS_DIR, name)
+
+
+def _copy_file(source: str, target: str) -> str:
+    """Файл новой версии: жесткая ссылка на неизменяемый файл, иначе копия"""
+    if _IMMUTABLE_DIR_RE.search(os.path.dirname(source)):
+        try:
+            os.link(source, target)
+            return target
+        except OSError as e:
+            logger.debug(f"Жесткая ссылка на {source} не создана, файл копируется: {e}")
+
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if not copied:
+                    break
+                remaining -= copied
+        shutil.copystat(source, target)
+    except (AttributeError, OSError):
+        # copy_file_range недоступен (не Linux) или не поддерживается файловой системой
+        shutil.copy2(source, target)
+    return target
+
+
+def current_version(root: str) -> Optional[str]:
+    """Имя опубликованной версии (None - версий еще нет)"""
+    return _read_pointer(os.path.join(root, CURRENT_POINTER))
+
+
+class IndexVersions:
+    """Сборка и публикация версий индекса"""
+
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = max(1, keep)
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+        self.current_path = os.path.join(root, CURRENT_POINTER)
+        self.building_path = os.path.join(root, BUILDING_POINTER)
+
+    def version_path(self, name: str) -> str:
+        return os.path.join(self.versions_dir, name)
+
+    def list_versions(self) -> List[str]:
+        """Имена версий по возрастанию (имена - метки времени сборки)"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if os.path.isdir(self.version_path(name))
+        )
+
+    def prepare_build(self) -> str:
+        """
+        Каталог для сборки новой версии.
+        Незавершенная сборка продолжается (ее манифест и контрольная точка согласованы с индексом),
+        иначе создается копия опубликованной версии, чтобы индексация оставалась инкрементальной.
+        """
+        building = _read_pointer(self.building_path)
+        if building is not None and os.path.isdir(self.version_path(building)):
+            logger.info(f"Продолжение незавершенной сборки версии индекса {building}")
+            return self.version_path(building)
+
+        name = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = 1
+        while os.path.exists(self.version_path(name)):
+            name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+            suffix += 1
+        build_path = self.version_path(name)
+
+        source = self._seed_source()
+        if source is not None:
+            logger.info(f"Сборка версии индекса {name} на основе {source}")
+            shutil.copytree(
+                source,
+                build_path,
+                ignore=self._ignore_shared if source == self.root else None,
+                copy_function=_copy_file
+            )
+        else:
+            logger.info(f"Сборка первой версии индекса {name}")
+            os.makedirs(build_path)
+
+        # Контрольная точка опубликованной версии к новой сборке не относится
+        shutil.rmtree(os.path.join(build_path, "checkpoint"), ignore_errors=True)
+
+        _write_pointer(self.building_path, name)
+        return build_path
+
+    def _seed_source(self) -> Optional[str]:
+        """Исходный индекс для новой версии: опубликованная версия или индекс прежнего формата в корне"""
+        current = _read_pointer(self.current_path)
+        if current is not None and os.path.isdir(self.version_path(current)):
+            return self.version_path(current)
+
+        if os.path.exists(os.path.join(self.root, "chroma.sqlite3")):
+            return self.root
+
+        return None
+
+    @staticmethod
+    def _ignore_shared(directory: str, names: List[str]) -> List[str]:
+        """Файлы корня, общие для всех версий (кеш эмбеддингов, сами версии и указатели)"""
+        return [
+            name for name in names
+            if name in _SHARED_ENTRIES or name.startswith(_SHARED_PREFIXES)
+        ]
+
+    def publish(self, build_path: str):
+        """Публикация собранной версии атомарной заменой CURRENT и удаление старых версий"""
+        name = os.path.basename(build_path.rstrip(os.sep))
+        previous = _read_pointer(self.current_path)
+
+        _write_pointer(self.current_path, name)
+        if os.path.exists(self.building_path):
+            os.remove(self.building_path)
+
+        logger.info(f"🔀 Опубликована версия индекса {name} (предыдущая: {previous or 'нет'})")
+        self.prune()
+
+    def prune(self):
+        """Удаление старых версий; текущая и собираемая версии сохраняются всегда"""
+        protected = {_read_pointer(self.current_path), _read_pointer(self.building_path)}
+        versions = self.list_versions()
+
+        for name in versions[:-self.keep]:
+            if name in protected:
+                continue
+            shutil.rmtree(self.version_path(name), ignore_errors=True)
+            logger.info(f"Удалена старая версия индекса {name}")
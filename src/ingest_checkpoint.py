@@ -0,0 +1,167 @@
+"""
+Контрольные точки запуска индексации.
+
+В каталоге контрольной точки хранятся:
+- state.json - параметры запуска, статус и число зафиксированных страниц;
+- results.jsonl - результаты обработанных страниц в порядке фиксации.
+
+Результаты накапливаются в памяти и дописываются на диск при фиксации, которая
+выполняется после сохранения векторного хранилища и манифеста. Поэтому страницы,
+попавшие в контрольную точку, гарантированно записаны в индекс и при продолжении
+запуска (--resume) повторно не обрабатываются.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class IngestCheckpoint:
+    """Контрольная точка запуска: зафиксированные страницы и их результаты"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.results_path = os.path.join(directory, "results.jsonl")
+
+        self.state: Dict = {}
+        self.completed = 0
+        self._pending: List[Dict] = []
+
+    def _read_state(self) -> Optional[Dict]:
+        """Чтение state.json; None, если контрольной точки нет или она повреждена"""
+        if not os.path.exists(self.state_path):
+            return None
+
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать контрольную точку {self.state_path}: {e}")
+            return None
+
+        if state.get("format") != CHECKPOINT_FORMAT_VERSION:
+            logger.warning(f"Неподдерживаемый формат контрольной точки: {state.get('format')}")
+            return None
+
+        return state
+
+    def _write_state(self):
+        """Атомарная запись state.json"""
+        self.state["completed"] = self.completed
+        self.state["updated_at"] = datetime.now().isoformat()
+
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def was_interrupted(self) -> bool:
+        """Предыдущий запуск не дошел до конца (упал или был остановлен)"""
+        state = self._read_state()
+        return state is not None and state.get("status") == "running"
+
+    def start(self, params: Dict):
+        """Начало нового запуска: прежняя контрольная точка удаляется"""
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.results_path):
+            os.remove(self.results_path)
+
+        self.state = {
+            "format": CHECKPOINT_FORMAT_VERSION,
+            "status": "running",
+            "params": params,
+            "started_at": datetime.now().isoformat(),
+        }
+        self.completed = 0
+        self._pending = []
+        self._write_state()
+
+    def resume(self, params: Dict) -> Dict[str, Dict]:
+        """
+        Продолжение прерванного запуска с теми же параметрами.
+        Возвращает результаты зафиксированных страниц (page_id -> результат);
+        если продолжать нечего, начинается новый запуск и возвращается пустой словарь.
+        """
+        state = self._read_state()
+        if state is None or state.get("status") != "running":
+            logger.info("Прерванный запуск не найден, начинается новый")
+            self.start(params)
+            return {}
+
+        if state.get("params") != params:
+            logger.warning("Параметры контрольной точки не совпадают с текущими, начинается новый запуск")
+            self.start(params)
+            return {}
+
+        # Учитываются только зафиксированные строки: хвост после последней фиксации
+        # мог не попасть в манифест
+        results = {}
+        completed = state.get("completed", 0)
+        if completed and os.path.exists(self.results_path):
+            with open(self.results_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f):
+                    if line_number >= completed:
+                        break
+                    result = json.loads(line)
+                    results[result["page_id"]] = result
+
+        # Незафиксированный хвост обрезается, чтобы новые строки шли сразу за зафиксированными
+        self._truncate_results(completed)
+
+        self.state = state
+        self.completed = completed
+        self._pending = []
+        return results
+
+    def _truncate_results(self, lines: int):
+        """Обрезка results.jsonl до заданного числа строк"""
+        if not os.path.exists(self.results_path):
+            return
+
+        offset = 0
+        with open(self.results_path, "rb") as f:
+            for _ in range(lines):
+                line = f.readline()
+                if not line:
+                    break
+                offset += len(line)
+
+        with open(self.results_path, "r+b") as f:
+            f.truncate(offset)
+
+    def add(self, result: Dict):
+        """Добавление результата страницы (записывается при следующей фиксации)"""
+        self._pending.append(result)
+
+    @property
+    def pending_count(self) -> int:
+        """Число результатов, ожидающих фиксации"""
+        return len(self._pending)
+
+    def flush(self):
+        """Фиксация накопленных результатов на диске"""
+        if self._pending:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                for result in self._pending:
+                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.completed += len(self._pending)
+            self._pending = []
+
+        self._write_state()
+
+    def finish(self):
+        """Завершение запуска: последующий --resume начнет новый запуск"""
+        self.state["status"] = "completed"
+        self.flush()
@@ -0,0 +1,198 @@
+"""
+Персистентный манифест проиндексированных страниц Confluence.
+Хранит для каждой страницы версию, хеш контента и идентификаторы чанков,
+что позволяет пропускать неизмененные страницы и заменять/удалять устаревшие чанки.
+Служебные значения (например, время последнего запуска для поиска изменений) хранятся в meta.
+
+Манифест хранится в SQLite и не загружается в память целиком. Изменения накапливаются
+в открытой транзакции и фиксируются save(), поэтому после сбоя манифест на диске
+соответствует последней фиксации.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FORMAT_VERSION = 2
+
+# Формат JSON-манифеста, который импортируется при первом запуске
+LEGACY_JSON_FORMAT_VERSION = 1
+
+_COLUMNS = "page_id, version, last_modified, content_hash, chunk_ids, status, error_type, error_message"
+
+
+@dataclass
+class ManifestEntry:
+    """Состояние страницы после последней индексации"""
+    page_id: str
+    version: Optional[int]
+    last_modified: str
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+    status: str = "success"  # "success" или "skipped"
+    error_type: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class PageManifest:
+    """Манифест страниц: page_id -> версия, хеш контента, идентификаторы чанков"""
+
+    def __init__(self, path: str):
+        # Путь к JSON-манифесту прежнего формата заменяется на SQLite рядом с ним
+        legacy_path = os.path.splitext(path)[0] + ".json"
+        if path.endswith(".json"):
+            path = os.path.splitext(path)[0] + ".sqlite3"
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "page_id TEXT PRIMARY KEY, version INTEGER, last_modified TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, chunk_ids TEXT NOT NULL, status TEXT NOT NULL, "
+            "error_type TEXT, error_message TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Страницы, полученные в текущем запуске (для удаления отсутствующих)
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (page_id TEXT PRIMARY KEY)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('format', ?)", (str(MANIFEST_FORMAT_VERSION),)
+        )
+        self._conn.commit()
+
+        self.meta: Dict[str, str] = {
+            name: value for name, value in self._conn.execute("SELECT name, value FROM meta") if name != "format"
+        }
+
+        if not len(self) and os.path.exists(legacy_path):
+            self._import_json(legacy_path)
+
+        logger.info(f"Загружен манифест: {self.path} ({len(self)} страниц)")
+
+    def _import_json(self, json_path: str):
+        """Перенос манифеста из JSON-файла прежнего формата"""
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # Поврежденный манифест означает полную переиндексацию, а не падение
+            logger.warning(f"Не удалось прочитать манифест {json_path}: {e}")
+            return
+
+        if data.get("format") != LEGACY_JSON_FORMAT_VERSION:
+            logger.warning(f"Неподдерживаемый формат манифеста: {data.get('format')}")
+            return
+
+        for entry in data.get("pages", {}).values():
+            self.update(ManifestEntry(**entry))
+        self.meta.update(data.get("meta", {}))
+        self.save()
+
+        os.replace(json_path, f"{json_path}.imported")
+        logger.info(f"Манифест {json_path} перенесен в {self.path}")
+
+    @staticmethod
+    def _to_entry(row) -> ManifestEntry:
+        return ManifestEntry(
+            page_id=row[0],
+            version=row[1],
+            last_modified=row[2],
+            content_hash=row[3],
+            chunk_ids=json.loads(row[4]),
+            status=row[5],
+            error_type=row[6],
+            error_message=row[7]
+        )
+
+    def save(self):
+        """Фиксация накопленных изменений на диске"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", list(self.meta.items())
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Закрытие манифеста без фиксации незавершенных изменений"""
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def get(self, page_id: str) -> Optional[ManifestEntry]:
+        """Получить запись о странице"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM pages WHERE page_id = ?", (page_id,)).fetchone()
+        return self._to_entry(row) if row else None
+
+    def update(self, entry: ManifestEntry):
+        """Добавить или заменить запись о странице"""
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO pages ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.page_id,
+                    entry.version,
+                    entry.last_modified,
+                    entry.content_hash,
+                    json.dumps(entry.chunk_ids),
+                    entry.status,
+                    entry.error_type,
+                    entry.error_message
+                )
+            )
+
+    def remove(self, page_id: str) -> Optional[ManifestEntry]:
+        """Удалить запись о странице"""
+        with self._lock:
+            entry = self.get(page_id)
+            if entry is not None:
+                self._conn.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+        return entry
+
+    def page_ids(self) -> Set[str]:
+        """Идентификаторы всех страниц в манифесте"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT page_id FROM pages")}
+
+    def mark_seen(self, page_id: str):
+        """Отметка страницы, полученной в текущем запуске"""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO seen (page_id) VALUES (?)", (page_id,))
+
+    def unseen_page_ids(self) -> List[str]:
+        """Страницы манифеста, не полученные в текущем запуске"""
+        with self._lock:
+            return [
+                row[0] for row in self._conn.execute(
+                    "SELECT page_id FROM pages WHERE page_id NOT IN (SELECT page_id FROM seen)"
+                )
+            ]
+
+    def is_unchanged(self, page_id: str, version: Optional[int], last_modified: str) -> bool:
+        """Проверка, что версия страницы совпадает с проиндексированной"""
+        # Без версии и даты изменения судить о свежести нельзя
+        if version is None and not last_modified:
+            return False
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, last_modified FROM pages WHERE page_id = ?", (page_id,)
+            ).fetchone()
+        if row is None:
+            return False
+
+        return row[0] == version and row[1] == last_modified
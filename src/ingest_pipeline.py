@@ -0,0 +1,173 @@
+"""
+Конвейер индексации страниц Confluence: fetch → parse → chunk → embed → write.
+Стадии связаны ограниченными очередями и имеют собственное число потоков,
+поэтому сетевой ввод-вывод, разбор HTML и инференс модели выполняются одновременно.
+Стадия embed собирает чанки нескольких страниц в один пакет для модели,
+стадия write записывает готовые эмбеддинги в хранилище одной пакетной операцией.
+"""
+
+import heapq
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Маркер завершения потока данных между стадиями
+_STOP = object()
+
+
+class IngestPipeline:
+    """Многопоточный конвейер стадий индексации"""
+
+    def __init__(
+        self,
+        ingester,
+        queue_size: int,
+        fetch_workers: int,
+        parse_workers: int,
+        chunk_workers: int,
+        embed_batch_size: int,
+        embed_max_wait: float
+    ):
+        self.ingester = ingester
+        self.queue_size = queue_size
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.chunk_workers = chunk_workers
+        self.embed_batch_size = embed_batch_size
+        self.embed_max_wait = embed_max_wait
+
+        self._feed_error = None
+
+    def run(self, works: Iterable) -> Iterator:
+        """Прогон страниц через конвейер; результаты отдаются в исходном порядке (по seq)"""
+        fetch_q = queue.Queue(self.queue_size)
+        parse_q = queue.Queue(self.queue_size)
+        chunk_q = queue.Queue(self.queue_size)
+        embed_q = queue.Queue(self.queue_size)
+        write_q = queue.Queue(max(1, self.queue_size // 4))
+        done_q = queue.Queue(self.queue_size)
+
+        ingester = self.ingester
+        threads = [threading.Thread(target=self._feed, args=(works, fetch_q), name="ingest-feed")]
+        threads += self._stage_threads("fetch", ingester._fetch_stage, self.fetch_workers, fetch_q, parse_q)
+        threads += self._stage_threads("parse", ingester._parse_stage, self.parse_workers, parse_q, chunk_q)
+        threads += self._stage_threads("chunk", ingester._chunk_stage, self.chunk_workers, chunk_q, embed_q)
+        threads.append(threading.Thread(target=self._embed_loop, args=(embed_q, write_q), name="ingest-embed"))
+        threads.append(threading.Thread(target=self._write_loop, args=(write_q, done_q), name="ingest-write"))
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Восстановление исходного порядка страниц
+        reorder_buffer = []
+        next_seq = 0
+        while True:
+            work = done_q.get()
+            if work is _STOP:
+                break
+
+            heapq.heappush(reorder_buffer, (work.seq, work))
+            while reorder_buffer and reorder_buffer[0][0] == next_seq:
+                yield heapq.heappop(reorder_buffer)[1]
+                next_seq += 1
+
+        for thread in threads:
+            thread.join()
+
+        if self._feed_error is not None:
+            raise self._feed_error
+
+        # Остаток буфера (при разрывах в нумерации) отдаем по порядку
+        while reorder_buffer:
+            yield heapq.heappop(reorder_buffer)[1]
+
+    def _feed(self, works: Iterable, out_q: queue.Queue):
+        """Подача страниц на вход конвейера"""
+        try:
+            for work in works:
+                out_q.put(work)
+        except Exception as e:
+            logger.error(f"Ошибка получения страниц для конвейера: {e}")
+            self._feed_error = e
+        finally:
+            out_q.put(_STOP)
+
+    def _stage_threads(
+        self,
+        name: str,
+        stage: Callable,
+        workers: int,
+        in_q: queue.Queue,
+        out_q: queue.Queue
+    ) -> List[threading.Thread]:
+        """Создание потоков стадии; последний завершившийся поток передает маркер завершения дальше"""
+        alive = [workers]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                work = in_q.get()
+                if work is _STOP:
+                    # Маркер возвращается в очередь для остальных потоков стадии
+                    in_q.put(_STOP)
+                    with lock:
+                        alive[0] -= 1
+                        last = alive[0] == 0
+                    if last:
+                        out_q.put(_STOP)
+                    return
+
+                self.ingester._run_stage(stage, work)
+                out_q.put(work)
+
+        return [threading.Thread(target=worker, name=f"ingest-{name}-{i}") for i in range(workers)]
+
+    def _embed_loop(self, in_q: queue.Queue, out_q: queue.Queue):
+        """Стадия embed: накопление чанков нескольких страниц до размера пакета"""
+        batch = []
+        chunk_count = 0
+
+        while True:
+            try:
+                work = in_q.get(timeout=self.embed_max_wait)
+            except queue.Empty:
+                work = None
+
+            if work is _STOP:
+                if batch:
+                    self._flush_embed_batch(batch, out_q)
+                out_q.put(_STOP)
+                return
+
+            if work is not None:
+                batch.append(work)
+                if work.result is None:
+                    chunk_count += len(work.chunks)
+
+            # Пакет отправляется, когда набран нужный размер или входная очередь простаивает
+            full = chunk_count >= self.embed_batch_size or len(batch) >= self.embed_batch_size
+            if batch and (full or work is None):
+                self._flush_embed_batch(batch, out_q)
+                batch = []
+                chunk_count = 0
+
+    def _flush_embed_batch(self, batch: List, out_q: queue.Queue):
+        """Вычисление эмбеддингов пакета и передача его на запись"""
+        self.ingester._run_batch_stage(self.ingester._embed_stage, batch)
+        out_q.put(batch)
+
+    def _write_loop(self, in_q: queue.Queue, out_q: queue.Queue):
+        """Стадия write: пакетная запись в векторное хранилище в одном потоке"""
+        while True:
+            batch = in_q.get()
+            if batch is _STOP:
+                out_q.put(_STOP)
+                return
+
+            self.ingester._run_batch_stage(self.ingester._write_stage, batch)
+            for work in batch:
+                out_q.put(work)
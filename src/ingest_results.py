@@ -0,0 +1,58 @@
+"""
+Результаты обработки страниц, сброшенные на диск.
+Запуск индексации большого пространства не держит результаты в памяти:
+они дописываются в JSONL-файл по мере появления и читаются потоком при генерации отчетов.
+"""
+
+import os
+import json
+from collections import Counter
+from dataclasses import asdict
+from typing import Iterator, Type
+
+
+class ResultSpool:
+    """Последовательность результатов на диске с интерфейсом списка: append, итерация, len"""
+
+    def __init__(self, path: str, record_type: Type):
+        self.path = path
+        self.record_type = record_type
+        self.status_counts: Counter = Counter()
+        self.error_counts: Counter = Counter()
+        self._count = 0
+        self._file = None
+
+    def append(self, record):
+        """Добавление результата"""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+
+        self._file.write(json.dumps(asdict(record), ensure_ascii=False) + "\n")
+        self._count += 1
+        self.status_counts[record.status] += 1
+        if record.error_type:
+            self.error_counts[record.error_type] += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator:
+        """Чтение результатов в порядке добавления"""
+        if self._file is None:
+            return
+
+        self._file.flush()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield self.record_type(**json.loads(line))
+
+    def close(self, remove: bool = True):
+        """Закрытие файла (по умолчанию с удалением)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,193 @@
+"""
+Телеметрия индексации: замеры стадий обработки каждой страницы.
+
+Для каждой страницы записывается строка JSONL сразу после ее фиксации (время загрузки,
+ожидания ограничителя частоты, разбора, чанкинга, эмбеддингов и записи, размеры, число повторов),
+поэтому данные прерванного запуска тоже остаются на диске. По итогам запуска формируется
+сводка с пропускной способностью и перцентилями времени стадий, при наличии pyarrow
+JSONL можно дополнительно выгрузить в Parquet.
+"""
+
+import os
+import json
+import math
+import logging
+from array import array
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Замеры, по которым считаются перцентили
+TIMING_FIELDS = (
+    "fetch_seconds",
+    "fetch_wait_seconds",
+    "parse_seconds",
+    "chunk_seconds",
+    "embed_seconds",
+    "write_seconds",
+    "latency_seconds"
+)
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Число строк JSONL в одной группе строк Parquet
+_PARQUET_BATCH_ROWS = 10000
+
+
+@dataclass
+class PageTelemetry:
+    """Замеры обработки страницы; None - стадия для страницы не выполнялась"""
+    page_id: str = ""
+    status: str = ""
+    error_type: Optional[str] = None
+    fetch_seconds: Optional[float] = None  # включая ожидание ограничителя и повторы
+    fetch_wait_seconds: Optional[float] = None  # ожидание ограничителя частоты и пауз после 429/503
+    fetch_retries: int = 0
+    listing_body: bool = False  # содержимое получено вместе со списком страниц
+    parse_seconds: Optional[float] = None
+    chunk_seconds: Optional[float] = None
+    embed_seconds: Optional[float] = None  # доля времени пакета пропорционально числу чанков
+    write_seconds: Optional[float] = None
+    latency_seconds: Optional[float] = None  # от постановки в обработку до фиксации
+    html_bytes: Optional[int] = None
+    text_chars: Optional[int] = None
+    chunks_count: int = 0
+    finished_at: str = ""
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class TelemetryWriter:
+    """Потоковая запись телеметрии страниц в JSONL с накоплением сводки"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages = 0
+        self.status_counts: Counter = Counter()
+        self.chunks = 0
+        self.html_bytes = 0
+        self.fetch_retries = 0
+        self.listing_bodies = 0
+
+        # Значения замеров хранятся компактно (8 байт на страницу) для расчета перцентилей
+        self._timings: Dict[str, array] = {name: array("d") for name in TIMING_FIELDS}
+        self._file = None
+
+    def append(self, telemetry: PageTelemetry):
+        """Запись замеров страницы"""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+
+        self._file.write(json.dumps(asdict(telemetry), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+        self.pages += 1
+        self.status_counts[telemetry.status] += 1
+        self.chunks += telemetry.chunks_count if telemetry.status == "success" else 0
+        self.html_bytes += telemetry.html_bytes or 0
+        self.fetch_retries += telemetry.fetch_retries
+        self.listing_bodies += telemetry.listing_body
+
+        for name in TIMING_FIELDS:
+            value = getattr(telemetry, name)
+            if value is not None:
+                self._timings[name].append(value)
+
+    def close(self):
+        """Закрытие файла телеметрии"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def summary(self, elapsed_seconds: float) -> Dict:
+        """Сводка запуска: пропускная способность и распределение времени стадий"""
+        elapsed = max(elapsed_seconds, 1e-9)
+
+        stages = {}
+        for name, values in self._timings.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            stage = {
+                "count": len(ordered),
+                "total": round(sum(ordered), 3),
+                "mean": round(sum(ordered) / len(ordered), 4),
+                "max": round(ordered[-1], 4)
+            }
+            for q in PERCENTILES:
+                stage[f"p{q}"] = round(percentile(ordered, q), 4)
+            stages[name.replace("_seconds", "")] = stage
+
+        return {
+            "elapsed_seconds": round(elapsed_seconds, 3),
+            "pages": self.pages,
+            "status": dict(self.status_counts),
+            "chunks": self.chunks,
+            "html_bytes": self.html_bytes,
+            "fetch_retries": self.fetch_retries,
+            "listing_bodies": self.listing_bodies,
+            "throughput": {
+                "pages_per_second": round(self.pages / elapsed, 3),
+                "indexed_pages_per_second": round(self.status_counts["success"] / elapsed, 3),
+                "chunks_per_second": round(self.chunks / elapsed, 3),
+                "html_mb_per_second": round(self.html_bytes / 1024 / 1024 / elapsed, 3)
+            },
+            "stages_seconds": stages
+        }
+
+    def export_parquet(self, parquet_path: str) -> bool:
+        """Выгрузка JSONL в Parquet (требуется pyarrow); False, если выгрузка невозможна"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning("pyarrow не установлен, выгрузка телеметрии в Parquet пропущена")
+            return False
+
+        if self._file is not None:
+            self._file.flush()
+        if not os.path.exists(self.path):
+            return False
+
+        schema = pa.schema([
+            ("page_id", pa.string()),
+            ("status", pa.string()),
+            ("error_type", pa.string()),
+            ("fetch_seconds", pa.float64()),
+            ("fetch_wait_seconds", pa.float64()),
+            ("fetch_retries", pa.int32()),
+            ("listing_body", pa.bool_()),
+            ("parse_seconds", pa.float64()),
+            ("chunk_seconds", pa.float64()),
+            ("embed_seconds", pa.float64()),
+            ("write_seconds", pa.float64()),
+            ("latency_seconds", pa.float64()),
+            ("html_bytes", pa.int64()),
+            ("text_chars", pa.int64()),
+            ("chunks_count", pa.int32()),
+            ("finished_at", pa.string())
+        ])
+
+        # Файл читается группами строк, чтобы не загружать телеметрию целиком
+        with open(self.path, "r", encoding="utf-8") as f, pq.ParquetWriter(parquet_path, schema) as writer:
+            rows = []
+            for line in f:
+                rows.append(json.loads(line))
+                if len(rows) >= _PARQUET_BATCH_ROWS:
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                    rows = []
+            if rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+        return True
@@ -1,27 +1,48 @@
 #!/usr/bin/env python3
 """
 Модуль выгрузки и индексации страниц Confluence в векторную БД ChromaDB.
-Генерирует CSV-отчеты о проиндексированных и пропущенных страницах.
+Генерирует CSV-отчеты о проиндексированных и пропущенных страницах,
+телеметрию обработки страниц (JSONL, опционально Parquet) и сводку запуска (JSON).
 """
 
 import os
 import sys
 import csv
+import json
 import time
+import hashlib
+import argparse
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, asdict
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, List, Dict, Optional
+from dataclasses import dataclass, field, asdict
 
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
 from dotenv import load_dotenv
 from atlassian import Confluence
-from bs4 import BeautifulSoup
 import chromadb
 from chromadb.config import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
+from .ingest_manifest import PageManifest, ManifestEntry
+from .ingest_checkpoint import IngestCheckpoint
+from .ingest_results import ResultSpool
+from .ingest_telemetry import PageTelemetry, TelemetryWriter
+from .index_versions import IndexVersions
+from .lexical_index import LexicalIndexWriter
+from .rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from .ingest_pipeline import IngestPipeline
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .embedding_backends import create_embeddings, embedding_identity
+from .html_to_text import get_html_converter
+from .page_processing import PageTask, PreparedPage, chunk_page, page_text, prepare_page
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -42,6 +63,8 @@ class PageInfo:
     space_key: str
     labels: List[str]
     last_modified: str
+    version: Optional[int] = None
+    body: Optional[str] = field(default=None, repr=False)  # storage-формат, если получен вместе со списком
 
 
 @dataclass
@@ -50,12 +73,31 @@ class ProcessingResult:
     page_id: str
     title: str
     url: str
-    status: str  # "success" или "skipped"
+    status: str  # "success", "skipped" или "unchanged"
     error_type: Optional[str] = None
     error_message: Optional[str] = None
     chunks_count: Optional[int] = None
 
 
+@dataclass
+class PageWork:
+    """Состояние страницы при прохождении стадий конвейера индексации"""
+    seq: int
+    page: PageInfo
+    content: Optional[Dict] = None
+    content_hash: Optional[str] = None
+    text: Optional[str] = None
+    chunks: List[str] = field(default_factory=list)
+    metadatas: List[Dict] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    embeddings: Optional[List[List[float]]] = None
+    result: Optional[ProcessingResult] = None
+    deindex: bool = False  # пропуск по содержимому: старые чанки страницы удаляются
+    prepared: Optional[Future] = None  # подготовка страницы в пуле процессов
+    telemetry: PageTelemetry = field(default_factory=PageTelemetry)
+    started_at: float = field(default_factory=time.perf_counter)
+
+
 class ConfluenceIngester:
     """Класс для выгрузки и индексации страниц Confluence"""
     
@@ -71,108 +113,382 @@ class ConfluenceIngester:
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "800"))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "120"))
         
+        # Конвертер HTML в текст: "lxml" (потоковый) или "bs4" (BeautifulSoup), результат одинаков
+        self.html_converter_name = os.getenv("HTML_CONVERTER", "lxml")
+        get_html_converter(self.html_converter_name)  # неизвестное имя - ошибка при запуске
+        
         # Пути
         self.vector_store_path = os.getenv("VECTOR_STORE_PATH", "./vector_store")
         self.report_dir = os.getenv("REPORT_DIR", "./report")
         
+        # Blue/green: запуск собирает новую версию индекса и публикует ее по завершении,
+        # QA-сервис продолжает читать опубликованную версию
+        self.index_versioning = os.getenv("INDEX_VERSIONING", "true").lower() == "true"
+        self.index_versions: Optional[IndexVersions] = None
+        self.index_path = self.vector_store_path
+        if self.index_versioning:
+            self.index_versions = IndexVersions(
+                self.vector_store_path,
+                keep=int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+            )
+            self.index_path = self.index_versions.prepare_build()
+        
         # Модель эмбеддингов
         self.embedding_model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        # Реализация модели: "huggingface" (PyTorch) или "onnx" (ONNX Runtime, int8)
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
+        # Векторы разных реализаций не смешиваются ни в кеше, ни в индексе
+        self.embedding_identity = embedding_identity(self.embedding_backend, self.embedding_model_name)
+        
+        # Параллельная загрузка и ограничение частоты запросов
+        self.fetch_concurrency = max(1, int(os.getenv("INGEST_FETCH_CONCURRENCY", "4")))
+        self.max_retries = int(os.getenv("CF_MAX_RETRIES", "5"))
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=float(os.getenv("CF_RATE_LIMIT", "2")),
+            min_rate=float(os.getenv("CF_RATE_LIMIT_MIN", "0.2")),
+            max_rate=float(os.getenv("CF_RATE_LIMIT_MAX", "10"))
+        )
+        
+        # Инкрементальная индексация
+        self.incremental = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+        # Манифест описывает содержимое конкретного индекса, поэтому хранится в каталоге версии
+        self.manifest_path = os.path.join(self.index_path, "ingest_manifest.sqlite3")
+        if not self.index_versioning:
+            self.manifest_path = os.getenv("INGEST_MANIFEST_PATH", self.manifest_path)
+        elif os.getenv("INGEST_MANIFEST_PATH"):
+            logger.warning("INGEST_MANIFEST_PATH игнорируется при INDEX_VERSIONING=true: манифест хранится в версии индекса")
+        
+        # Поиск страниц: "full" - обход всего пространства, "delta" - только измененные через CQL
+        self.discovery_mode = os.getenv("INGEST_DISCOVERY", "delta").lower()
+        if self.discovery_mode not in ("full", "delta"):
+            raise ValueError(f"Неизвестный режим поиска страниц INGEST_DISCOVERY: {self.discovery_mode}")
+        self.delta_overlap = timedelta(minutes=int(os.getenv("INGEST_DELTA_OVERLAP_MINUTES", "1440")))
+        self.full_reconcile_interval = timedelta(hours=float(os.getenv("INGEST_FULL_RECONCILE_HOURS", "168")))
+        
+        # Содержимое страниц в запросах списка: "auto", "true" или "false"
+        self.listing_bodies = os.getenv("INGEST_LISTING_BODIES", "auto").lower()
+        self.listing_max_body_chars = int(os.getenv("INGEST_LISTING_MAX_BODY_KB", "512")) * 1024
+        
+        # Контрольные точки для продолжения прерванного запуска (--resume)
+        self.checkpoint_dir = os.path.join(self.index_path, "checkpoint")
+        if not self.index_versioning:
+            self.checkpoint_dir = os.getenv("INGEST_CHECKPOINT_DIR", self.checkpoint_dir)
+        self.checkpoint_interval = max(1, int(os.getenv("INGEST_CHECKPOINT_INTERVAL", "200")))
+        
+        # Кеш эмбеддингов чанков
+        self.embedding_cache_enabled = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.embedding_cache_path = os.getenv(
+            "EMBEDDING_CACHE_PATH",
+            os.path.join(self.vector_store_path, "embedding_cache.sqlite3")
+        )
+        self.embedding_cache_max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        
+        # Конвейер индексации: размеры очередей, потоки стадий и размер пакета эмбеддингов
+        self.pipeline_enabled = os.getenv("INGEST_PIPELINE", "true").lower() == "true"
+        self.queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+        self.parse_workers = max(1, int(os.getenv("INGEST_PARSE_WORKERS", "2")))
+        self.chunk_workers = max(1, int(os.getenv("INGEST_CHUNK_WORKERS", "1")))
+        self.embed_batch_size = max(1, int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64")))
+        self.embed_max_wait = float(os.getenv("INGEST_EMBED_MAX_WAIT", "0.5"))
+        
+        # Процессы для разбора HTML и чанкинга (0 - в потоках конвейера под GIL)
+        self.ingest_workers = max(0, int(os.getenv("INGEST_WORKERS", "0")))
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        
+        # Лексический индекс BM25 по тем же чанкам для гибридного поиска в QA-сервисе
+        self.lexical_enabled = os.getenv("INGEST_LEXICAL_INDEX", "true").lower() == "true"
+        
+        # Телеметрия стадий по страницам и сводка запуска в REPORT_DIR
+        self.telemetry_enabled = os.getenv("INGEST_TELEMETRY", "true").lower() == "true"
+        self.telemetry_parquet = os.getenv("INGEST_TELEMETRY_PARQUET", "false").lower() == "true"
+        
+        # Счетчики повторов и ожидания запросов к Confluence в текущем потоке
+        self._call_stats = threading.local()
         
         # Инициализация клиентов
         self._init_confluence()
         self._init_vectorstore()
+        self._init_lexical_index()
+        self.manifest = PageManifest(self.manifest_path)
+        self.checkpoint = IngestCheckpoint(self.checkpoint_dir)
         
-        # Результаты обработки
-        self.results: List[ProcessingResult] = []
+        # Предыдущий запуск прерван: в индексе могут быть чанки, которых нет в манифесте
+        self.recovering = False
+        
+        # Результаты обработки (сбрасываются на диск по мере появления)
+        self.results = ResultSpool(os.path.join(self.report_dir, "results.jsonl.tmp"), ProcessingResult)
+        
+        # Время начала запуска: метка файлов отчетов и телеметрии
+        self.run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.telemetry: Optional[TelemetryWriter] = None
+        if self.telemetry_enabled:
+            self.telemetry = TelemetryWriter(
+                os.path.join(self.report_dir, f"telemetry_{self.run_timestamp}.jsonl")
+            )
+        
+        # Результаты страниц, зафиксированных в контрольной точке прерванного запуска
+        self.restored_results: Dict[str, Dict] = {}
+        
+        # Признак того, что список страниц получен полностью (без ошибок)
+        self.listing_complete = False
+        
+        # Список содержит все страницы (а не только измененные), по нему можно удалять отсутствующие
+        self.full_listing = False
+        self.listing_started_at: Optional[datetime] = None
+        self.listed_count = 0
         
     def _init_confluence(self):
         """Инициализация клиента Confluence"""
         if not all([self.cf_url, self.cf_user, self.cf_token]):
             raise ValueError("Не заданы обязательные параметры Confluence (CF_URL, CF_USER, CF_TOKEN)")
         
+        # Пул keep-alive соединений по числу параллельных загрузок
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.fetch_concurrency)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        
         self.confluence = Confluence(
             url=self.cf_url,
             username=self.cf_user,
             password=self.cf_token,
-            cloud=True
+            cloud=True,
+            session=session
         )
         logger.info(f"Подключен к Confluence: {self.cf_url}")
         
     def _init_vectorstore(self):
         """Инициализация векторного хранилища ChromaDB"""
-        os.makedirs(self.vector_store_path, exist_ok=True)
+        os.makedirs(self.index_path, exist_ok=True)
         
         # Настройки ChromaDB
+        # is_persistent: без него chromadb >= 0.4 держит коллекцию в памяти процесса
         chroma_settings = Settings(
-            persist_directory=self.vector_store_path,
+            persist_directory=self.index_path,
+            is_persistent=True,
             anonymized_telemetry=False
         )
         
         # Инициализация эмбеддингов
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.embedding_model_name,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        self.embeddings = create_embeddings(self.embedding_backend, self.embedding_model_name, self.embed_batch_size)
+        
+        # Кеш эмбеддингов: неизмененные чанки не кодируются повторно
+        if self.embedding_cache_enabled:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                EmbeddingCache(self.embedding_cache_path, self.embedding_cache_max_entries),
+                self.embedding_identity
+            )
         
         # Инициализация векторного хранилища
         self.vectorstore = Chroma(
             collection_name="confluence_docs",
             embedding_function=self.embeddings,
-            persist_directory=self.vector_store_path,
+            persist_directory=self.index_path,
             client_settings=chroma_settings
         )
-        logger.info(f"Инициализировано векторное хранилище: {self.vector_store_path}")
+        logger.info(f"Инициализировано векторное хранилище: {self.index_path}")
         
-    def get_pages(self) -> List[PageInfo]:
-        """Получение списка страниц для обработки"""
-        pages = []
+    def _init_lexical_index(self):
+        """Инициализация лексического индекса в каталоге индекса"""
+        self.lexical: Optional[LexicalIndexWriter] = None
+        if not self.lexical_enabled:
+            return
+            
+        self.lexical = LexicalIndexWriter(self.index_path)
+        # Индекс отсутствовал (индекс прежнего формата, был отключен) или отстал после сбоя -
+        # векторное хранилище остается источником истины
+        if self.lexical.count() != self.vectorstore._collection.count():
+            self.lexical.rebuild(self.vectorstore._collection)
+        
+    def _call_confluence(self, method: Callable, *args, **kwargs):
+        """Вызов API Confluence через rate limiter с повторами при 429/503"""
+        stats = self._call_stats
+        for attempt in range(self.max_retries + 1):
+            wait_started = time.perf_counter()
+            self.rate_limiter.acquire()
+            stats.wait_seconds = getattr(stats, "wait_seconds", 0.0) + time.perf_counter() - wait_started
+            try:
+                result = method(*args, **kwargs)
+            except HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code not in (429, 503) or attempt == self.max_retries:
+                    raise
+                    
+                # Без Retry-After используем экспоненциальную паузу
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = min(2 ** attempt, 60)
+                self.rate_limiter.on_throttle(retry_after)
+                stats.retries = getattr(stats, "retries", 0) + 1
+                continue
+                
+            self.rate_limiter.on_success()
+            return result
+            
+    def iter_pages(self) -> Iterator[PageInfo]:
+        """
+        Получение страниц для обработки потоком: страницы отдаются по мере загрузки списка.
+        listing_complete и listed_count окончательны после исчерпания итератора.
+        """
+        self.listing_complete = True
+        self.full_listing = True
+        self.listing_started_at = datetime.now(timezone.utc)
+        self.listed_count = 0
         
         if self.cf_pages:
             # Загрузка конкретных страниц
-            for page_title in self.cf_pages:
-                try:
-                    page = self.confluence.get_page_by_title(
-                        space=self.cf_space,
-                        title=page_title
-                    )
-                    if page:
-                        pages.append(self._parse_page_info(page))
-                except Exception as e:
-                    logger.error(f"Ошибка получения страницы '{page_title}': {e}")
+            pages = self._iter_titled_pages(self._use_listing_bodies(delta=False))
         else:
-            # Загрузка всех страниц из пространства
             if not self.cf_space:
                 raise ValueError("Не задано пространство Confluence (CF_SPACE)")
+                
+            since = self._delta_since()
+            if since is None:
+                pages = self._iter_space_pages(self._use_listing_bodies(delta=False))
+            else:
+                self.full_listing = False
+                pages = self._iter_changed_pages(since, self._use_listing_bodies(delta=True))
+                
+        return self._track_pages(pages)
+        
+    def _track_pages(self, pages: Iterator[PageInfo]) -> Iterator[PageInfo]:
+        """Учет полученных страниц в манифесте (для удаления отсутствующих)"""
+        for page in pages:
+            self.manifest.mark_seen(page.page_id)
+            self.listed_count += 1
+            yield page
             
-            start = 0
-            limit = 50
-            
-            while True:
-                try:
-                    result = self.confluence.get_all_pages_from_space(
-                        space=self.cf_space,
-                        start=start,
-                        limit=limit,
-                        expand="metadata.labels"
-                    )
-                    
-                    for page in result:
-                        pages.append(self._parse_page_info(page))
-                    
-                    if len(result) < limit:
-                        break
-                        
-                    start += limit
-                    time.sleep(0.5)  # Защита от rate limiting
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка получения страниц из пространства: {e}")
-                    break
-                    
-        logger.info(f"Найдено {len(pages)} страниц для обработки")
-        return pages
+        logger.info(f"Найдено {self.listed_count} страниц для обработки")
+        
+    def _use_listing_bodies(self, delta: bool) -> bool:
+        """Запрашивать ли содержимое страниц вместе со списком"""
+        if self.listing_bodies == "auto":
+            # При полном обходе уже проиндексированного пространства большинство страниц не менялось,
+            # и их содержимое не нужно: выгоднее загрузить отдельно только измененные
+            return delta or not self.incremental or not len(self.manifest)
+        return self.listing_bodies == "true"
         
+    def _iter_titled_pages(self, bodies: bool) -> Iterator[PageInfo]:
+        """Загрузка страниц, заданных заголовками в CF_PAGES"""
+        expand = "body.storage,version,metadata.labels" if bodies else "version,metadata.labels"
+        for page_title in self.cf_pages:
+            try:
+                page = self._call_confluence(
+                    self.confluence.get_page_by_title,
+                    space=self.cf_space,
+                    title=page_title,
+                    expand=expand
+                )
+                if page:
+                    yield self._parse_page_info(page)
+            except Exception as e:
+                logger.error(f"Ошибка получения страницы '{page_title}': {e}")
+                self.listing_complete = False
+                
+    def _iter_space_pages(self, bodies: bool) -> Iterator[PageInfo]:
+        """Загрузка всех страниц из пространства"""
+        def get_batch(start: int, limit: int, expand: str) -> List[Dict]:
+            return self._call_confluence(
+                self.confluence.get_all_pages_from_space,
+                space=self.cf_space,
+                start=start,
+                limit=limit,
+                expand=expand
+            )
+            
+        return self._iter_listing(get_batch, "", bodies)
+        
+    def _iter_listing(
+        self,
+        get_batch: Callable[[int, int, str], List[Dict]],
+        expand_prefix: str,
+        bodies: bool
+    ) -> Iterator[PageInfo]:
+        """
+        Постраничный обход списка. С содержимым страниц пакеты меньше, а сервер может вернуть
+        меньше limit записей, поэтому конец списка определяется пустым ответом.
+        Если пакет с содержимым получить не удалось, он запрашивается без него.
+        """
+        base_expand = f"{expand_prefix}version,{expand_prefix}metadata.labels"
+        body_expand = f"{expand_prefix}body.storage,{base_expand}"
+        limit = 25 if bodies else 50
+        start = 0
+        
+        while True:
+            try:
+                result = None
+                if bodies:
+                    try:
+                        result = get_batch(start, limit, body_expand)
+                    except Exception as e:
+                        logger.warning(f"Не удалось получить пакет страниц с содержимым, загрузка по одной: {e}")
+                if result is None:
+                    result = get_batch(start, limit, base_expand)
+            except Exception as e:
+                logger.error(f"Ошибка получения списка страниц: {e}")
+                self.listing_complete = False
+                return
+                
+            for page in result:
+                yield self._parse_page_info(page)
+                
+            if not result or (not bodies and len(result) < limit):
+                return
+                
+            start += len(result)
+            
+    def _delta_since(self) -> Optional[datetime]:
+        """
+        Момент, начиная с которого запрашиваются измененные страницы.
+        None - нужен полный обход: первый запуск, другое пространство или плановая сверка.
+        """
+        if self.discovery_mode != "delta" or not self.incremental:
+            return None
+            
+        meta = self.manifest.meta
+        if meta.get("space_key") != self.cf_space or not meta.get("last_full_listing_at"):
+            logger.info("Нет данных о прошлом запуске для этого пространства, выполняется полный обход")
+            return None
+            
+        last_full_listing = datetime.fromisoformat(meta["last_full_listing_at"])
+        if self.listing_started_at - last_full_listing >= self.full_reconcile_interval:
+            logger.info(f"Плановая полная сверка (последняя: {meta['last_full_listing_at']})")
+            return None
+            
+        # Запас перекрывает разницу часовых поясов CQL и правки, сохраненные во время прошлого запуска
+        return datetime.fromisoformat(meta["last_run_started_at"]) - self.delta_overlap
+        
+    def _iter_changed_pages(self, since: datetime, bodies: bool) -> Iterator[PageInfo]:
+        """Загрузка страниц пространства, измененных с момента since (CQL-поиск)"""
+        cql = (
+            f'space = "{self.cf_space}" and type = page '
+            f'and lastmodified >= "{since.strftime("%Y-%m-%d %H:%M")}"'
+        )
+        logger.info(f"🔎 Поиск измененных страниц: {cql}")
+        
+        def get_batch(start: int, limit: int, expand: str) -> List[Dict]:
+            response = self._call_confluence(self.confluence.cql, cql, start=start, limit=limit, expand=expand)
+            return [item["content"] for item in response.get("results", []) if item.get("content")]
+            
+        return self._iter_listing(get_batch, "content.", bodies)
+        
+    def _save_discovery_state(self):
+        """Запоминание момента начала успешного запуска для следующего поиска изменений"""
+        if self.cf_pages or not self.listing_complete:
+            return
+            
+        # Страницы с ошибкой обработки не попали в манифест: следующий поиск повторяет то же окно
+        if self.results.error_counts["ProcessingError"]:
+            logger.warning("Есть страницы с ошибками обработки, время прошлого запуска не обновляется")
+            return
+            
+        meta = self.manifest.meta
+        meta["space_key"] = self.cf_space
+        meta["last_run_started_at"] = self.listing_started_at.isoformat()
+        if self.full_listing:
+            meta["last_full_listing_at"] = self.listing_started_at.isoformat()
+            
     def _parse_page_info(self, page_data: Dict) -> PageInfo:
         """Парсинг информации о странице"""
         page_id = page_data.get("id", "")
@@ -186,175 +502,519 @@ class ConfluenceIngester:
         if "metadata" in page_data and "labels" in page_data["metadata"]:
             labels = [label["name"] for label in page_data["metadata"]["labels"]["results"]]
             
-        # Дата последнего изменения
-        last_modified = page_data.get("version", {}).get("when", "")
+        # Версия и дата последнего изменения
+        version_info = page_data.get("version", {})
+        last_modified = version_info.get("when", "")
+        version = version_info.get("number")
         
+        # Содержимое из запроса списка; слишком большие страницы не держим в очередях
+        # обработки, они загружаются отдельным запросом
+        body = page_data.get("body", {}).get("storage", {}).get("value")
+        if body is not None and len(body) > self.listing_max_body_chars:
+            body = None
+            
         return PageInfo(
             page_id=page_id,
             title=title,
             url=url,
             space_key=self.cf_space,
             labels=labels,
-            last_modified=last_modified
+            last_modified=last_modified,
+            version=version,
+            body=body
+        )
+        
+    def _is_unchanged(self, page_info: PageInfo) -> bool:
+        """Страница не менялась с прошлой индексации и не требует загрузки"""
+        return self.incremental and self.manifest.is_unchanged(
+            page_info.page_id, page_info.version, page_info.last_modified
+        )
+        
+    def _fetch_page_content(self, page_info: PageInfo) -> Optional[Dict]:
+        """Загрузка содержимого страницы в формате storage"""
+        # Содержимое уже получено вместе со списком страниц
+        if page_info.body is not None:
+            body, page_info.body = page_info.body, None
+            return {"body": {"storage": {"value": body}}}
+            
+        return self._call_confluence(
+            self.confluence.get_page_by_id,
+            page_info.page_id,
+            expand="body.storage"
+        )
+        
+    def _preset_result(self, page_info: PageInfo) -> Optional[ProcessingResult]:
+        """Результат страницы, которую не нужно обрабатывать: зафиксирована в контрольной точке или не изменилась"""
+        restored = self.restored_results.get(page_info.page_id)
+        if restored is not None:
+            return ProcessingResult(**restored)
+            
+        if self._is_unchanged(page_info):
+            return self._unchanged_result(page_info)
+            
+        return None
+        
+    def _new_work(self, seq: int, page: PageInfo) -> PageWork:
+        """Страница для обработки; неизмененные и уже обработанные получают готовый результат"""
+        work = PageWork(seq=seq, page=page)
+        work.result = self._preset_result(page)
+        if work.result is not None:
+            page.body = None
+        return work
+        
+    def _prefetch_pages(self, pages: Iterable[PageInfo]) -> Iterator[PageWork]:
+        """
+        Параллельная загрузка контента страниц с сохранением порядка.
+        Страницы, которые не нужно обрабатывать, отдаются с готовым результатом без запроса контента.
+        Число загружаемых наперед страниц ограничено, чтобы не держать в памяти всё пространство.
+        """
+        max_pending = self.fetch_concurrency * 2
+        
+        with ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix="cf-fetch") as executor:
+            window = deque()  # (страница, future загрузки или None)
+            pending = 0
+            
+            for seq, page in enumerate(pages):
+                work = self._new_work(seq, page)
+                if work.result is not None or page.body is not None:
+                    # Готовый результат или содержимое получено вместе со списком, запрос не нужен
+                    self._run_stage(self._fetch_stage, work)
+                    window.append((work, None))
+                else:
+                    window.append((work, executor.submit(self._run_stage, self._fetch_stage, work)))
+                    pending += 1
+                    
+                # Отдаем страницы по порядку: готовые сразу, остальные - пока окно загрузок заполнено
+                while window and (pending >= max_pending or len(window) > max_pending or window[0][1] is None):
+                    work_item, fetching = window.popleft()
+                    if fetching is not None:
+                        pending -= 1
+                        fetching.result()
+                    yield work_item
+                    
+            while window:
+                work_item, fetching = window.popleft()
+                if fetching is not None:
+                    fetching.result()
+                yield work_item
+                
+    def _iter_serial(self, pages: Iterable[PageInfo]) -> Iterator[PageWork]:
+        """Последовательная обработка страниц с параллельной предзагрузкой контента"""
+        for work in self._prefetch_pages(pages):
+            self.process_page(work)
+            yield work
+            
+    def _iter_pipeline(self, pages: Iterable[PageInfo]) -> Iterator[PageWork]:
+        """Обработка страниц многопоточным конвейером стадий"""
+        pipeline = IngestPipeline(
+            self,
+            queue_size=self.queue_size,
+            fetch_workers=self.fetch_concurrency,
+            parse_workers=self.parse_workers,
+            chunk_workers=self.chunk_workers,
+            embed_batch_size=self.embed_batch_size,
+            embed_max_wait=self.embed_max_wait
         )
         
-    def process_page(self, page_info: PageInfo) -> ProcessingResult:
-        """Обработка одной страницы"""
+        # Неизмененные и уже обработанные страницы проходят конвейер без загрузки контента
+        works = (self._new_work(seq, page) for seq, page in enumerate(pages))
+        yield from pipeline.run(works)
+            
+    def process_page(self, work: PageWork):
+        """Последовательная обработка загруженной страницы остальными стадиями конвейера"""
+        self._run_stage(self._parse_stage, work)
+        self._run_stage(self._chunk_stage, work)
+        self._run_batch_stage(self._embed_stage, [work])
+        self._run_batch_stage(self._write_stage, [work])
+        
+    def _run_stage(self, stage: Callable[[PageWork], None], work: PageWork):
+        """Выполнение стадии для страницы; ошибка завершает обработку страницы"""
+        if work.result is not None:
+            return
+            
+        try:
+            stage(work)
+        except Exception as e:
+            logger.error(f"Ошибка обработки страницы '{work.page.title}': {e}")
+            work.result = self._error_result(work.page, e)
+            
+    def _run_batch_stage(self, stage: Callable[[List[PageWork]], None], works: List[PageWork]):
+        """Выполнение пакетной стадии; ошибка завершает обработку всех страниц пакета"""
+        try:
+            stage(works)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной обработки {len(works)} страниц: {e}")
+            for work in works:
+                if work.result is None:
+                    work.result = self._error_result(work.page, e)
+                    
+    def _fetch_stage(self, work: PageWork):
+        """Стадия fetch: загрузка контента страницы"""
+        telemetry = work.telemetry
+        telemetry.listing_body = work.page.body is not None
+        
+        stats = self._call_stats
+        stats.retries, stats.wait_seconds = 0, 0.0
+        started = time.perf_counter()
+        try:
+            work.content = self._fetch_page_content(work.page)
+        finally:
+            telemetry.fetch_seconds = time.perf_counter() - started
+            telemetry.fetch_wait_seconds = stats.wait_seconds
+            telemetry.fetch_retries = stats.retries
+        
+    def _parse_stage(self, work: PageWork):
+        """Стадия parse: проверка изменений и конвертация HTML в текст"""
+        started = time.perf_counter()
         try:
-            # Получение содержимого страницы
-            content = self.confluence.get_page_by_id(
-                page_info.page_id,
-                expand="body.storage"
+            self._parse_content(work)
+        finally:
+            work.telemetry.parse_seconds = time.perf_counter() - started
+            
+    def _parse_content(self, work: PageWork):
+        """Разбор контента страницы (в режиме пула процессов - постановка задачи в пул)"""
+        page_info = work.page
+        content = work.content
+        work.content = None
+        
+        if not content or "body" not in content:
+            self._skip_work(work, self._content_hash(page_info, ""), "NoContent", "Страница не содержит контента")
+            return
+            
+        # Извлечение HTML содержимого
+        html_content = content["body"]["storage"]["value"]
+        work.telemetry.html_bytes = len(html_content.encode("utf-8"))
+        
+        # Версия могла смениться без изменения контента (например, правка метаданных)
+        work.content_hash = self._content_hash(page_info, html_content)
+        entry = self.manifest.get(page_info.page_id)
+        if self.incremental and entry and entry.content_hash == work.content_hash:
+            work.result = self._unchanged_result(page_info)
+            return
+            
+        # В режиме пула процессов разбор и чанкинг выполняются в воркере,
+        # стадия chunk дожидается результата
+        if self.process_pool is not None:
+            work.prepared = self.process_pool.submit(
+                prepare_page,
+                self._page_task(work),
+                html_content,
+                self.html_converter_name,
+                self.chunk_size,
+                self.chunk_overlap
             )
+            return
             
-            if not content or "body" not in content:
-                return ProcessingResult(
-                    page_id=page_info.page_id,
-                    title=page_info.title,
-                    url=page_info.url,
-                    status="skipped",
-                    error_type="NoContent",
-                    error_message="Страница не содержит контента"
-                )
-                
-            # Извлечение HTML содержимого
-            html_content = content["body"]["storage"]["value"]
-            
-            # Проверка на неподдерживаемый контент
-            if self._has_unsupported_content(html_content):
-                return ProcessingResult(
-                    page_id=page_info.page_id,
-                    title=page_info.title,
-                    url=page_info.url,
-                    status="skipped",
-                    error_type="UnsupportedContentType",
-                    error_message="Страница содержит неподдерживаемый контент (draw.io, вложения и т.д.)"
-                )
-                
-            # Конвертация HTML в текст
-            text_content = self._html_to_text(html_content)
-            
-            if not text_content.strip():
-                return ProcessingResult(
-                    page_id=page_info.page_id,
-                    title=page_info.title,
-                    url=page_info.url,
-                    status="skipped",
-                    error_type="EmptyContent",
-                    error_message="Страница не содержит текстового контента"
+        # Проверка на неподдерживаемый контент и конвертация HTML в текст
+        work.text, skip_reason = page_text(html_content, self.html_converter_name)
+        if work.text is not None:
+            work.telemetry.text_chars = len(work.text)
+        if skip_reason is not None:
+            self._skip_work(work, work.content_hash, *skip_reason)
+            
+    def _chunk_stage(self, work: PageWork):
+        """Стадия chunk: разбиение текста на чанки с метаданными"""
+        telemetry = work.telemetry
+        if work.prepared is not None:
+            prepared: PreparedPage = work.prepared.result()
+            work.prepared = None
+            # Разбор выполнялся в воркере: учитывается его время, а не ожидание результата
+            telemetry.parse_seconds = (telemetry.parse_seconds or 0.0) + prepared.parse_seconds
+            telemetry.text_chars = prepared.text_chars if prepared.error_type is None else None
+            if prepared.error_type is None:
+                telemetry.chunk_seconds = prepared.chunk_seconds
+        else:
+            started = time.perf_counter()
+            prepared = chunk_page(self._page_task(work), work.text, self.chunk_size, self.chunk_overlap)
+            telemetry.chunk_seconds = time.perf_counter() - started
+            work.text = None
+            
+        if prepared.error_type is not None:
+            self._skip_work(work, work.content_hash, prepared.error_type, prepared.error_message)
+            return
+            
+        work.chunks = prepared.chunks
+        work.metadatas = prepared.metadatas
+        work.chunk_ids = prepared.chunk_ids
+        
+    @staticmethod
+    def _page_task(work: PageWork) -> PageTask:
+        """Данные страницы для построения чанков (передаются в процесс-воркер)"""
+        page_info = work.page
+        return PageTask(
+            page_id=page_info.page_id,
+            title=page_info.title,
+            url=page_info.url,
+            space_key=page_info.space_key,
+            labels=page_info.labels,
+            last_modified=page_info.last_modified,
+            content_hash=work.content_hash
+        )
+        
+    def _embed_stage(self, works: List[PageWork]):
+        """Стадия embed: один вызов модели на чанки всех страниц пакета"""
+        pending = [work for work in works if work.result is None]
+        texts = [chunk for work in pending for chunk in work.chunks]
+        if not texts:
+            return
+            
+        started = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - started
+        
+        offset = 0
+        for work in pending:
+            work.embeddings = vectors[offset:offset + len(work.chunks)]
+            offset += len(work.chunks)
+            # Время пакета делится между страницами пропорционально числу чанков
+            work.telemetry.embed_seconds = elapsed * len(work.chunks) / len(texts)
+            
+    def _write_stage(self, works: List[PageWork]):
+        """Стадия write: пакетная запись готовых эмбеддингов и фиксация изменений в манифесте"""
+        pending = [work for work in works if work.result is None]
+        
+        # Сначала новые чанки, затем удаление старых,
+        # чтобы в индексе не возникало окна, когда страница отсутствует
+        if pending:
+            started = time.perf_counter()
+            self.vectorstore._collection.upsert(
+                ids=[chunk_id for work in pending for chunk_id in work.chunk_ids],
+                embeddings=[vector for work in pending for vector in work.embeddings],
+                documents=[chunk for work in pending for chunk in work.chunks],
+                metadatas=[metadata for work in pending for metadata in work.metadatas]
+            )
+            if self.lexical is not None:
+                self.lexical.upsert(
+                    [chunk_id for work in pending for chunk_id in work.chunk_ids],
+                    [work.page.page_id for work in pending for _ in work.chunk_ids],
+                    [chunk for work in pending for chunk in work.chunks]
                 )
+            elapsed = time.perf_counter() - started
+            total_chunks = sum(len(work.chunks) for work in pending)
+            for work in pending:
+                work.telemetry.write_seconds = elapsed * len(work.chunks) / max(total_chunks, 1)
                 
-            # Добавление метаданных в начало текста
-            metadata_text = f"Страница: {page_info.title}\n"
-            if page_info.labels:
-                metadata_text += f"Метки: {', '.join(page_info.labels)}\n"
-            metadata_text += "\n"
-            
-            full_text = metadata_text + text_content
-            
-            # Разбиение на чанки
-            chunks = self._split_text(full_text)
-            
-            # Создание документов для векторного хранилища
-            documents = []
-            metadatas = []
-            
-            for i, chunk in enumerate(chunks):
-                documents.append(chunk)
-                metadatas.append({
-                    "page_id": page_info.page_id,
-                    "title": page_info.title,
-                    "url": page_info.url,
-                    "space_key": page_info.space_key,
-                    "labels": ", ".join(page_info.labels),
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "last_modified": page_info.last_modified
-                })
-                
-            # Добавление в векторное хранилище
-            self.vectorstore.add_texts(
-                texts=documents,
-                metadatas=metadatas
-            )
+        for work in works:
+            fetched = work.content_hash is not None
+            started = time.perf_counter()
+            self._commit_page(work)
+            if fetched:
+                work.telemetry.write_seconds = (work.telemetry.write_seconds or 0.0) + time.perf_counter() - started
             
-            return ProcessingResult(
+        self._record_progress(works)
+        
+    def _record_progress(self, works: List[PageWork]):
+        """
+        Учет обработанных страниц в контрольной точке с фиксацией раз в INGEST_CHECKPOINT_INTERVAL страниц.
+        Фиксируются только записанные в манифест результаты (успех, без изменений, пропуск по содержимому):
+        страницы с ошибкой (часто временной, перед падением) после --resume обрабатываются заново.
+        """
+        for work in works:
+            if work.page.page_id not in self.restored_results and not self._is_failed(work.result.error_type):
+                self.checkpoint.add(asdict(work.result))
+            
+        if self.checkpoint.pending_count >= self.checkpoint_interval:
+            self._save_checkpoint()
+            
+    def _save_checkpoint(self):
+        """
+        Фиксация прогресса: векторное хранилище, затем манифест, затем контрольная точка.
+        Страницы из контрольной точки всегда есть и в манифесте, и в индексе.
+        """
+        self.vectorstore.persist()
+        if self.lexical is not None:
+            self.lexical.save()
+        self.manifest.save()
+        self.checkpoint.flush()
+        logger.info(f"💾 Контрольная точка: зафиксировано {self.checkpoint.completed} страниц")
+        
+    def _record_telemetry(self, work: PageWork):
+        """Запись замеров страницы после ее фиксации"""
+        if self.telemetry is None:
+            return
+            
+        telemetry = work.telemetry
+        telemetry.page_id = work.page.page_id
+        telemetry.status = work.result.status
+        telemetry.error_type = work.result.error_type
+        telemetry.chunks_count = work.result.chunks_count or 0
+        # Для страниц без загрузки (не изменились, восстановлены из контрольной точки) задержка не считается
+        if telemetry.fetch_seconds is not None:
+            telemetry.latency_seconds = time.perf_counter() - work.started_at
+        telemetry.finished_at = datetime.now().isoformat()
+        self.telemetry.append(telemetry)
+        
+    def _commit_page(self, work: PageWork):
+        """Фиксация результата страницы: удаление устаревших чанков и обновление манифеста"""
+        page_info = work.page
+        
+        if work.result is None:
+            self._delete_stale_chunks(page_info.page_id, keep_ids=work.chunk_ids)
+            self.manifest.update(ManifestEntry(
+                page_id=page_info.page_id,
+                version=page_info.version,
+                last_modified=page_info.last_modified,
+                content_hash=work.content_hash,
+                chunk_ids=work.chunk_ids
+            ))
+            work.result = ProcessingResult(
                 page_id=page_info.page_id,
                 title=page_info.title,
                 url=page_info.url,
                 status="success",
-                chunks_count=len(chunks)
+                chunks_count=len(work.chunks)
             )
             
-        except Exception as e:
-            logger.error(f"Ошибка обработки страницы '{page_info.title}': {e}")
+        elif work.deindex:
+            # Пропуск по содержимому: старые чанки удаляются, причина запоминается в манифесте
+            self._delete_stale_chunks(page_info.page_id, keep_ids=[])
+            self.manifest.update(ManifestEntry(
+                page_id=page_info.page_id,
+                version=page_info.version,
+                last_modified=page_info.last_modified,
+                content_hash=work.content_hash,
+                status="skipped",
+                error_type=work.result.error_type,
+                error_message=work.result.error_message
+            ))
+            
+        elif work.content_hash is not None and work.result.status == "unchanged":
+            # Контент не изменился, запоминаем новую версию
+            entry = self.manifest.get(page_info.page_id)
+            entry.version = page_info.version
+            entry.last_modified = page_info.last_modified
+            self.manifest.update(entry)
+            
+        # Освобождение памяти после записи
+        work.chunks, work.metadatas, work.embeddings = [], [], None
+        
+    def _skip_work(self, work: PageWork, content_hash: str, error_type: str, error_message: str):
+        """Пропуск страницы по содержимому (фиксируется на стадии write)"""
+        work.content_hash = content_hash
+        work.deindex = True
+        work.result = ProcessingResult(
+            page_id=work.page.page_id,
+            title=work.page.title,
+            url=work.page.url,
+            status="skipped",
+            error_type=error_type,
+            error_message=error_message
+        )
+        
+    @staticmethod
+    def _is_failed(error_type: Optional[str]) -> bool:
+        """Результат - ошибка обработки, а не зафиксированный исход страницы"""
+        return error_type == "ProcessingError"
+        
+    @staticmethod
+    def _error_result(page_info: PageInfo, error: Exception) -> ProcessingResult:
+        """Результат для страницы, обработка которой завершилась ошибкой"""
+        return ProcessingResult(
+            page_id=page_info.page_id,
+            title=page_info.title,
+            url=page_info.url,
+            status="skipped",
+            error_type="ProcessingError",
+            error_message=str(error)[:120]
+        )
+        
+    def _unchanged_result(self, page_info: PageInfo) -> ProcessingResult:
+        """Результат для страницы, не изменившейся с прошлой индексации"""
+        entry = self.manifest.get(page_info.page_id)
+        
+        # Ранее пропущенная страница остается пропущенной по той же причине
+        if entry.status == "skipped":
             return ProcessingResult(
                 page_id=page_info.page_id,
                 title=page_info.title,
                 url=page_info.url,
                 status="skipped",
-                error_type="ProcessingError",
-                error_message=str(e)[:120]
+                error_type=entry.error_type,
+                error_message=entry.error_message
             )
             
-    def _has_unsupported_content(self, html: str) -> bool:
-        """Проверка на наличие неподдерживаемого контента"""
-        unsupported_patterns = [
-            "ac:name=\"drawio\"",
-            "ac:name=\"gliffy\"",
-            "ri:attachment",
-            "ac:structured-macro",
-            "ac:name=\"excel\"",
-            "ac:name=\"pdf\"",
-            "ac:name=\"viewpdf\""
-        ]
+        return ProcessingResult(
+            page_id=page_info.page_id,
+            title=page_info.title,
+            url=page_info.url,
+            status="unchanged",
+            chunks_count=len(entry.chunk_ids)
+        )
         
-        html_lower = html.lower()
-        return any(pattern in html_lower for pattern in unsupported_patterns)
+    def _content_hash(self, page_info: PageInfo, html: str) -> str:
+        """Хеш всего, что влияет на чанки страницы: заголовок, метки, контент и параметры индексации"""
+        parts = [
+            page_info.title,
+            ",".join(page_info.labels),
+            str(self.chunk_size),
+            str(self.chunk_overlap),
+            self.embedding_identity,
+            html
+        ]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
         
-    def _html_to_text(self, html: str) -> str:
-        """Конвертация HTML в текст"""
-        soup = BeautifulSoup(html, "lxml")
+    def _delete_stale_chunks(self, page_id: str, keep_ids: List[str]):
+        """Удаление чанков страницы, не входящих в актуальный набор"""
+        entry = self.manifest.get(page_id)
+        old_ids = list(entry.chunk_ids) if entry is not None else []
         
-        # Удаление скриптов и стилей
-        for script in soup(["script", "style"]):
-            script.decompose()
+        # Страница проиндексирована до появления манифеста или записана прерванным запуском
+        # после последней контрольной точки: ищем чанки по метаданным
+        if entry is None or self.recovering:
+            old_ids += self.vectorstore.get(where={"page_id": page_id}, include=[])["ids"]
             
-        # Обработка блоков кода
-        for code in soup.find_all("ac:structured-macro", attrs={"ac:name": "code"}):
-            code_text = code.get_text(strip=True)
-            code.replace_with(f"\n```\n{code_text}\n```\n")
+        keep = set(keep_ids)
+        stale_ids = [chunk_id for chunk_id in dict.fromkeys(old_ids) if chunk_id not in keep]
+        if stale_ids:
+            self.vectorstore.delete(ids=stale_ids)
+        if self.lexical is not None:
+            self.lexical.remove_page(page_id, keep_ids)
             
-        # Обработка PlantUML/Mermaid как текст
-        for macro in soup.find_all("ac:structured-macro", attrs={"ac:name": ["plantuml", "mermaid"]}):
-            macro_text = macro.get_text(strip=True)
-            macro.replace_with(f"\n[Диаграмма {macro.get('ac:name', 'diagram')}]\n{macro_text}\n")
+    def _remove_deleted_pages(self) -> int:
+        """Удаление из индекса страниц, которых больше нет в Confluence"""
+        removed = 0
+        for page_id in self.manifest.unseen_page_ids():
+            entry = self.manifest.remove(page_id)
+            if entry.chunk_ids:
+                self.vectorstore.delete(ids=entry.chunk_ids)
+            if self.lexical is not None:
+                self.lexical.remove_page(page_id)
+            removed += 1
+            logger.info(f"🗑️ Удалена из индекса страница {page_id}")
             
-        # Извлечение текста
-        text = soup.get_text(separator="\n", strip=True)
-        
-        # Очистка лишних переносов строк
-        lines = [line.strip() for line in text.split("\n") if line.strip()]
-        text = "\n".join(lines)
-        
-        return text
-        
-    def _split_text(self, text: str) -> List[str]:
-        """Разбиение текста на чанки"""
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""],
-            length_function=len
+        return removed
+            
+    def _start_process_pool(self):
+        """Запуск пула процессов для CPU-стадий, если он включен"""
+        if self.ingest_workers < 1:
+            return
+            
+        # spawn: к моменту запуска пула в процессе уже работают потоки (загрузка, модель),
+        # fork их состояние не копирует и может унаследовать захваченные блокировки
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=self.ingest_workers,
+            mp_context=multiprocessing.get_context("spawn")
         )
+        logger.info(f"Разбор HTML и чанкинг выполняются в {self.ingest_workers} процессах")
         
-        return splitter.split_text(text)
+    def _stop_process_pool(self):
+        """Остановка пула процессов"""
+        if self.process_pool is not None:
+            self.process_pool.shutdown(cancel_futures=True)
+            self.process_pool = None
+            
+    def _link_latest(self, path: str, link_name: str):
+        """Символическая ссылка на последний отчет"""
+        link_path = os.path.join(self.report_dir, link_name)
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(os.path.basename(path), link_path)
         
     def generate_reports(self):
         """Генерация CSV-отчетов"""
         os.makedirs(self.report_dir, exist_ok=True)
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = self.run_timestamp
         
         # Отчет об успешно проиндексированных страницах
         ingested_path = os.path.join(self.report_dir, f"ingested_{timestamp}.csv")
@@ -389,72 +1049,182 @@ class ConfluenceIngester:
                     })
                     
         # Создание символических ссылок на последние отчеты
-        latest_ingested = os.path.join(self.report_dir, "ingested.csv")
-        latest_skipped = os.path.join(self.report_dir, "skipped.csv")
+        self._link_latest(ingested_path, "ingested.csv")
+        self._link_latest(skipped_path, "skipped.csv")
+        
+        logger.info(f"Отчеты сохранены: {ingested_path}, {skipped_path}")
         
-        if os.path.exists(latest_ingested):
-            os.remove(latest_ingested)
-        if os.path.exists(latest_skipped):
-            os.remove(latest_skipped)
+    def generate_telemetry_reports(self, elapsed_seconds: float, deleted_count: int):
+        """Сводка запуска (JSON) и выгрузка телеметрии в Parquet"""
+        if self.telemetry is None:
+            return
             
-        os.symlink(os.path.basename(ingested_path), latest_ingested)
-        os.symlink(os.path.basename(skipped_path), latest_skipped)
+        summary = {
+            "run": self.run_timestamp,
+            "index_version": os.path.basename(self.index_path) if self.index_versioning else None,
+            "discovery": "full" if self.full_listing else "delta",
+            "listed_pages": self.listed_count,
+            "deleted_pages": deleted_count,
+            "throttled_requests": self.rate_limiter.throttled_count,
+            "final_rate": round(self.rate_limiter.rate, 3),
+            "pipeline": self.pipeline_enabled,
+            "ingest_workers": self.ingest_workers
+        }
+        summary.update(self.telemetry.summary(elapsed_seconds))
+        if isinstance(self.embeddings, CachedEmbeddings):
+            summary["embedding_cache"] = self.embeddings.stats()
+            
+        summary_path = os.path.join(self.report_dir, f"summary_{self.run_timestamp}.json")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+            
+        self._link_latest(self.telemetry.path, "telemetry.jsonl")
+        self._link_latest(summary_path, "summary.json")
         
-        logger.info(f"Отчеты сохранены: {ingested_path}, {skipped_path}")
+        if self.telemetry_parquet:
+            parquet_path = os.path.join(self.report_dir, f"telemetry_{self.run_timestamp}.parquet")
+            if self.telemetry.export_parquet(parquet_path):
+                self._link_latest(parquet_path, "telemetry.parquet")
+                
+        throughput = summary["throughput"]
+        logger.info(
+            f"📊 Телеметрия: {throughput['pages_per_second']:.1f} страниц/с, "
+            f"{throughput['chunks_per_second']:.1f} чанков/с, сводка: {summary_path}"
+        )
         
-    def run(self):
+    def run(self, resume: bool = False):
         """Основной процесс выгрузки и индексации"""
         logger.info("Начало процесса индексации Confluence")
+        run_started = time.perf_counter()
         
         try:
-            # Получение списка страниц
-            pages = self.get_pages()
+            # Список страниц запрашивается потоком, обработка начинается с первых страниц
+            pages = self.iter_pages()
             
-            if not pages:
-                logger.warning("Не найдено страниц для обработки")
-                return
+            # Контрольная точка: при продолжении зафиксированные страницы не обрабатываются повторно
+            self.recovering = self.checkpoint.was_interrupted()
+            checkpoint_params = {"space": self.cf_space, "pages": self.cf_pages}
+            if resume:
+                # Ошибки (из контрольных точек прежних версий) не окончательны: такие страницы обрабатываются заново
+                self.restored_results = {
+                    page_id: result for page_id, result in self.checkpoint.resume(checkpoint_params).items()
+                    if not self._is_failed(result.get("error_type"))
+                }
+            else:
+                self.restored_results = {}
+                self.checkpoint.start(checkpoint_params)
                 
-            # Обработка страниц
-            success_count = 0
-            for i, page in enumerate(pages, 1):
-                logger.info(f"Обработка [{i}/{len(pages)}]: {page.title}")
+            if self.restored_results:
+                logger.info(f"♻️ Продолжение прерванного запуска: {len(self.restored_results)} страниц уже обработано")
+            elif self.recovering:
+                logger.warning("Предыдущий запуск был прерван, устаревшие чанки будут найдены по метаданным")
                 
-                result = self.process_page(page)
+            self._start_process_pool()
+            
+            # Обработка страниц конвейером или последовательно; результаты идут в порядке списка
+            if self.pipeline_enabled:
+                works = self._iter_pipeline(pages)
+            else:
+                works = self._iter_serial(pages)
+                
+            total_count = 0
+            success_count = 0
+            unchanged_count = 0
+            for i, work in enumerate(works, 1):
+                result = work.result
                 self.results.append(result)
+                self._record_telemetry(work)
+                total_count = i
                 
                 if result.status == "success":
                     success_count += 1
-                    logger.info(f"✅ Проиндексировано: {page.title} ({result.chunks_count} чанков)")
+                    logger.info(f"✅ [{i}] Проиндексировано: {result.title} ({result.chunks_count} чанков)")
+                elif result.status == "unchanged":
+                    unchanged_count += 1
+                    logger.debug(f"[{i}] Без изменений: {result.title}")
                 else:
-                    logger.warning(f"⚠️ Пропущено: {page.title} - {result.error_type}")
+                    logger.warning(f"⚠️ [{i}] Пропущено: {result.title} - {result.error_type}")
                     
-                # Защита от rate limiting
-                if i % 10 == 0:
-                    time.sleep(1)
+            if not total_count:
+                if not self.full_listing and self.listing_complete:
+                    logger.info("Изменений с прошлого запуска нет")
+                else:
+                    logger.warning("Не найдено страниц для обработки")
                     
-            # Сохранение векторного хранилища
+            # Удаление страниц, которых больше нет в Confluence
+            deleted_count = 0
+            if not self.full_listing:
+                logger.info("Получены только измененные страницы, удаление отсутствующих - при полной сверке")
+            elif self.listing_complete and self.listed_count:
+                deleted_count = self._remove_deleted_pages()
+            else:
+                logger.warning("Список страниц получен не полностью, удаление отсутствующих страниц пропущено")
+                
+            self._save_discovery_state()
+                
+            # Сохранение векторного хранилища и манифеста, завершение контрольной точки
             self.vectorstore.persist()
+            if self.lexical is not None:
+                self.lexical.compile()
+            self.manifest.save()
+            self.checkpoint.finish()
             
+            # Публикация собранной версии: QA-сервис переключится на нее без перезапуска
+            if self.index_versions is not None:
+                self.index_versions.publish(self.index_path)
+                
             # Генерация отчетов
             self.generate_reports()
+            self.generate_telemetry_reports(time.perf_counter() - run_started, deleted_count)
             
             # Итоговая статистика
             logger.info(f"\n{'='*50}")
             logger.info(f"Обработка завершена!")
-            logger.info(f"Всего страниц: {len(pages)}")
+            logger.info(f"Всего страниц: {total_count}")
             logger.info(f"Успешно проиндексировано: {success_count}")
-            logger.info(f"Пропущено: {len(pages) - success_count}")
+            logger.info(f"Без изменений: {unchanged_count}")
+            logger.info(f"Пропущено: {total_count - success_count - unchanged_count}")
+            logger.info(f"Удалено из индекса: {deleted_count}")
+            logger.info(
+                f"Запросов с ограничением частоты (429/503): {self.rate_limiter.throttled_count}, "
+                f"итоговая скорость: {self.rate_limiter.rate:.2f} req/s"
+            )
+            if isinstance(self.embeddings, CachedEmbeddings):
+                cache_stats = self.embeddings.stats()
+                self.embeddings.save_stats()
+                logger.info(
+                    f"Кеш эмбеддингов: попаданий {cache_stats['hits']} из "
+                    f"{cache_stats['hits'] + cache_stats['misses']} ({cache_stats['hit_rate']:.1%}), "
+                    f"кодирование {cache_stats['encode_seconds']:.1f} с, "
+                    f"сэкономлено ~{cache_stats['saved_seconds']:.1f} с"
+                )
             logger.info(f"{'='*50}\n")
             
         except Exception as e:
             logger.error(f"Критическая ошибка: {e}")
             sys.exit(1)
+            
+        finally:
+            self._stop_process_pool()
+            self.results.close()
+            if self.lexical is not None:
+                self.lexical.close()
+            if self.telemetry is not None:
+                self.telemetry.close()
 
 
 def main():
     """Точка входа"""
+    parser = argparse.ArgumentParser(description="Выгрузка и индексация страниц Confluence")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить прерванный запуск с последней контрольной точки"
+    )
+    args = parser.parse_args()
+    
     ingester = ConfluenceIngester()
-    ingester.run()
+    ingester.run(resume=args.resume)
 
 
 if __name__ == "__main__":
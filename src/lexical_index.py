@@ -0,0 +1,343 @@
+"""
+Лексический индекс BM25 по чанкам векторного хранилища.
+
+Эмбеддинги плохо находят точные идентификаторы (пути эндпоинтов, ключи конфигурации,
+коды ошибок), поэтому QA-сервис дополняет векторный поиск поиском по словам.
+
+Структура каталога lexical/ в каталоге индекса:
+- chunks.sqlite3 - частоты слов каждого чанка; обновляется индексацией инкрементально
+  вместе с векторным хранилищем и копируется в новую версию индекса вместе с ним;
+- g<N>/ - скомпилированный индекс поколения N: словарь и идентификаторы чанков в SQLite,
+  постинги и длины чанков в массивах .npy, которые QA-сервис открывает через mmap;
+- CURRENT - номер актуального поколения.
+
+Поколение компилируется в конце индексации и не изменяется после публикации,
+поэтому читатель всегда видит согласованные словарь и постинги.
+"""
+
+import os
+import re
+import json
+import math
+import zlib
+import shutil
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_DIR = "lexical"
+_CHUNKS_DB = "chunks.sqlite3"
+_CURRENT = "CURRENT"
+
+# Слово с внутренними разделителями: api/v1/users, max_retries, err-1234, app.config.timeout
+_TOKEN_RE = re.compile(r"\w(?:[\w./:-]*\w)?")
+# Части составного слова
+_PART_RE = re.compile(r"[^\W_]+")
+# Более длинные последовательности (base64, хеши) в индекс не попадают
+_MAX_TOKEN_CHARS = 64
+
+# Чанков в одной выборке из векторного хранилища при перестроении
+_BACKFILL_BATCH = 1000
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста: составные идентификаторы целиком и их части"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if len(token) > _MAX_TOKEN_CHARS:
+            continue
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _encode_terms(terms: Counter) -> bytes:
+    return zlib.compress(json.dumps(terms, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode_terms(blob: bytes) -> Dict[str, int]:
+    return json.loads(zlib.decompress(blob))
+
+
+def _read_generation(lexical_dir: str) -> Optional[int]:
+    try:
+        with open(os.path.join(lexical_dir, _CURRENT), "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class LexicalIndexWriter:
+    """Инкрементальное обновление частот слов чанков и компиляция индекса"""
+
+    def __init__(self, index_path: str):
+        self.lexical_dir = os.path.join(index_path, LEXICAL_DIR)
+        os.makedirs(self.lexical_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(self.lexical_dir, _CHUNKS_DB), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id TEXT PRIMARY KEY, page_id TEXT NOT NULL, length INTEGER NOT NULL, terms BLOB NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_page_id ON chunks (page_id)")
+        self.conn.commit()
+
+        # Изменения с последней компиляции
+        self.dirty = False
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, chunk_ids: List[str], page_ids: List[str], texts: List[str]):
+        """Запись частот слов чанков"""
+        rows = []
+        for chunk_id, page_id, text in zip(chunk_ids, page_ids, texts):
+            terms = Counter(tokenize(text))
+            rows.append((chunk_id, page_id, sum(terms.values()), _encode_terms(terms)))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (chunk_id, page_id, length, terms) VALUES (?, ?, ?, ?)", rows
+        )
+        self.dirty = True
+
+    def remove_page(self, page_id: str, keep_ids: Iterable[str] = ()):
+        """Удаление чанков страницы, не входящих в keep_ids"""
+        keep = set(keep_ids)
+        stale = [
+            (chunk_id,) for (chunk_id,) in self.conn.execute(
+                "SELECT chunk_id FROM chunks WHERE page_id = ?", (page_id,)
+            )
+            if chunk_id not in keep
+        ]
+        if stale:
+            self.conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", stale)
+            self.dirty = True
+
+    def save(self):
+        """Фиксация изменений (вместе с контрольной точкой индексации)"""
+        self.conn.commit()
+
+    def rebuild(self, collection):
+        """Перестроение по содержимому коллекции ChromaDB (индекс отсутствовал или рассинхронизирован)"""
+        logger.info("Перестроение лексического индекса по векторному хранилищу...")
+        self.conn.execute("DELETE FROM chunks")
+        offset = 0
+        while True:
+            batch = collection.get(limit=_BACKFILL_BATCH, offset=offset, include=["documents", "metadatas"])
+            if not batch["ids"]:
+                break
+            self.upsert(
+                batch["ids"],
+                [str((metadata or {}).get("page_id", "")) for metadata in batch["metadatas"]],
+                batch["documents"]
+            )
+            offset += len(batch["ids"])
+        self.conn.commit()
+        self.dirty = True
+        logger.info(f"Лексический индекс перестроен: {offset} чанков")
+
+    def compile(self) -> Optional[int]:
+        """
+        Компиляция нового поколения индекса: постинги отсортированы по словам,
+        для каждого слова - номера чанков и частоты. Возвращает номер поколения.
+        """
+        self.conn.commit()
+        current = _read_generation(self.lexical_dir)
+        if not self.dirty and current is not None:
+            return current
+
+        generation = (current or 0) + 1
+        generation_dir = os.path.join(self.lexical_dir, f"g{generation}")
+        shutil.rmtree(generation_dir, ignore_errors=True)
+        os.makedirs(generation_dir)
+
+        # Первый проход: документная частота слов и размеры массивов
+        document_frequency: Counter = Counter()
+        doc_count = 0
+        total_length = 0
+        for length, blob in self.conn.execute("SELECT length, terms FROM chunks"):
+            document_frequency.update(_decode_terms(blob).keys())
+            doc_count += 1
+            total_length += length
+
+        vocabulary = sorted(document_frequency)
+        term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([document_frequency[term] for term in vocabulary])
+        postings_count = int(offsets[-1])
+
+        # Массивы пишутся сразу в файлы, без сборки постингов в памяти
+        postings_docs = np.lib.format.open_memmap(
+            os.path.join(generation_dir, "postings_docs.npy"), mode="w+", dtype=np.int32, shape=(postings_count,)
+        )
+        postings_tf = np.lib.format.open_memmap(
+            os.path.join(generation_dir, "postings_tf.npy"), mode="w+", dtype=np.uint16, shape=(postings_count,)
+        )
+        doc_lengths = np.lib.format.open_memmap(
+            os.path.join(generation_dir, "doc_lengths.npy"), mode="w+", dtype=np.float32, shape=(doc_count,)
+        )
+
+        vocab_conn = sqlite3.connect(os.path.join(generation_dir, "vocab.sqlite3"))
+        vocab_conn.execute("CREATE TABLE terms (term TEXT PRIMARY KEY, start INTEGER, df INTEGER) WITHOUT ROWID")
+        vocab_conn.execute("CREATE TABLE docs (ordinal INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL)")
+        vocab_conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        # Второй проход: заполнение постингов (номера чанков внутри слова возрастают)
+        cursor = offsets[:-1].copy()
+        docs_rows = []
+        rows = self.conn.execute("SELECT chunk_id, length, terms FROM chunks ORDER BY chunk_id")
+        for ordinal, (chunk_id, length, blob) in enumerate(rows):
+            doc_lengths[ordinal] = length
+            docs_rows.append((ordinal, chunk_id))
+            terms = _decode_terms(blob)
+            if terms:
+                ids = np.fromiter(map(term_ids.__getitem__, terms), dtype=np.int64, count=len(terms))
+                positions = cursor[ids]
+                postings_docs[positions] = ordinal
+                postings_tf[positions] = np.minimum(np.fromiter(terms.values(), dtype=np.int64), 65535)
+                cursor[ids] += 1
+            if len(docs_rows) >= 10000:
+                vocab_conn.executemany("INSERT INTO docs VALUES (?, ?)", docs_rows)
+                docs_rows = []
+        if docs_rows:
+            vocab_conn.executemany("INSERT INTO docs VALUES (?, ?)", docs_rows)
+
+        vocab_conn.executemany(
+            "INSERT INTO terms VALUES (?, ?, ?)",
+            ((term, int(offsets[term_id]), document_frequency[term]) for term_id, term in enumerate(vocabulary))
+        )
+        vocab_conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("doc_count", str(doc_count)),
+            ("avg_length", str(total_length / doc_count if doc_count else 0.0))
+        ])
+        vocab_conn.commit()
+        vocab_conn.close()
+
+        postings_docs.flush()
+        postings_tf.flush()
+        doc_lengths.flush()
+        del postings_docs, postings_tf, doc_lengths
+
+        # Атомарная смена поколения; открытые читателями файлы старых поколений остаются доступны
+        pointer_path = os.path.join(self.lexical_dir, _CURRENT)
+        with open(f"{pointer_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(f"{generation}\n")
+        os.replace(f"{pointer_path}.tmp", pointer_path)
+        for name in os.listdir(self.lexical_dir):
+            if name.startswith("g") and name != f"g{generation}":
+                shutil.rmtree(os.path.join(self.lexical_dir, name), ignore_errors=True)
+
+        self.dirty = False
+        logger.info(
+            f"🔤 Лексический индекс: поколение {generation}, чанков {doc_count}, "
+            f"слов {len(vocabulary)}, постингов {postings_count}"
+        )
+        return generation
+
+    def close(self):
+        self.conn.close()
+
+
+class LexicalIndex:
+    """Поиск BM25 по скомпилированному поколению индекса"""
+
+    def __init__(self, generation_dir: str, k1: float = 1.2, b: float = 0.75):
+        self.generation_dir = generation_dir
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            f"file:{os.path.join(generation_dir, 'vocab.sqlite3')}?mode=ro", uri=True, check_same_thread=False
+        )
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self.doc_count = int(meta["doc_count"])
+        self.avg_length = float(meta["avg_length"]) or 1.0
+
+        self.postings_docs = np.load(os.path.join(generation_dir, "postings_docs.npy"), mmap_mode="r")
+        self.postings_tf = np.load(os.path.join(generation_dir, "postings_tf.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(generation_dir, "doc_lengths.npy"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, index_path: str) -> Optional["LexicalIndex"]:
+        """Актуальное поколение индекса версии или None, если индекс не скомпилирован"""
+        lexical_dir = os.path.join(index_path, LEXICAL_DIR)
+        generation = _read_generation(lexical_dir)
+        if generation is None:
+            return None
+        try:
+            return cls(os.path.join(lexical_dir, f"g{generation}"))
+        except (OSError, sqlite3.Error, KeyError) as e:
+            logger.warning(f"Не удалось открыть лексический индекс {lexical_dir}: {e}")
+            return None
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Чанки с наибольшей оценкой BM25: (id чанка, оценка) по убыванию оценки"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or self.doc_count == 0:
+            return []
+
+        with self._lock:
+            placeholders = ",".join("?" * len(terms))
+            postings = self._conn.execute(
+                f"SELECT start, df FROM terms WHERE term IN ({placeholders})", terms
+            ).fetchall()
+        if not postings:
+            return []
+
+        # Оценки накапливаются только по чанкам из постингов слов запроса, а не по всему индексу
+        matched_docs = []
+        matched_scores = []
+        for start, df in postings:
+            docs = self.postings_docs[start:start + df]
+            tf = self.postings_tf[start:start + df].astype(np.float32)
+            idf = self._idf(df)
+            length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+            matched_docs.append(docs)
+            matched_scores.append(idf * tf * (self.k1 + 1) / (tf + length_norm))
+
+        if len(matched_docs) == 1:
+            candidates, scores = matched_docs[0], matched_scores[0]
+        else:
+            candidates, inverse = np.unique(np.concatenate(matched_docs), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+
+        top = np.arange(len(candidates))
+        if len(top) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        ordinals = [int(candidates[position]) for position in top]
+        with self._lock:
+            placeholders = ",".join("?" * len(ordinals))
+            chunk_ids = dict(self._conn.execute(
+                f"SELECT ordinal, chunk_id FROM docs WHERE ordinal IN ({placeholders})", ordinals
+            ).fetchall())
+        return [(chunk_ids[ordinal], float(scores[position])) for ordinal, position in zip(ordinals, top)]
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def idf(self, terms: Iterable[str]) -> Dict[str, float]:
+        """IDF слов по словарю поколения (слово вне словаря - как не встречающееся ни в одном чанке)"""
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return {}
+        with self._lock:
+            placeholders = ",".join("?" * len(terms))
+            found = dict(self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms
+            ).fetchall())
+        return {term: self._idf(found.get(term, 0)) for term in terms}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,370 @@
+"""
+Пул LLM-бэкендов (провайдеры, модели или эндпоинты) с хеджированием и переключением при ошибках.
+
+Вызов уходит в лучший бэкенд: исправные раньше, среди них - с меньшей задержкой (EWMA).
+Если ответ не пришел за время, которое бэкенд укладывается в LLM_HEDGE_PERCENTILE
+последних вызовов, тот же запрос отправляется следующему бэкенду (хедж); используется
+первый ответ, второй вызов отменяется. Хвост задержек одного провайдера не становится
+p99 сервиса, а лишних вызовов примерно 100 - LLM_HEDGE_PERCENTILE процентов.
+Ошибка бэкенда переключает вызов на следующий; после нескольких ошибок подряд бэкенд
+считается неисправным и на время исключается из выбора.
+
+В потоковом режиме хеджирование и переключение работают до первого фрагмента ответа
+(время до первого токена); после него поток продолжается из выбранного бэкенда.
+
+Пул - Runnable LangChain и подставляется в цепочку вместо одной модели.
+"""
+
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+logger = logging.getLogger(__name__)
+
+# Сглаживание задержки и доли ошибок (EWMA)
+_EWMA_ALPHA = 0.2
+# Ошибки запроса, которые повторятся в любом бэкенде (неверный запрос, слишком длинный контекст)
+_NOT_RETRYABLE_STATUS = (400, 422)
+
+
+@dataclass
+class BackendSpec:
+    """Настройки бэкенда из LLM_BACKENDS"""
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key_env: str = "OPENAI_API_KEY"
+    timeout: Optional[float] = None
+
+
+def parse_backends(raw: str) -> List[BackendSpec]:
+    """
+    Бэкенды из JSON-списка LLM_BACKENDS, например:
+    [{"name": "openai", "model": "gpt-4o-mini"},
+     {"name": "local", "model": "qwen2.5-7b", "base_url": "http://vllm:8000/v1", "api_key_env": "VLLM_API_KEY"}]
+    """
+    specs = []
+    for item in json.loads(raw):
+        if "model" not in item:
+            raise ValueError(f"LLM_BACKENDS: не задана модель бэкенда {item}")
+        specs.append(BackendSpec(
+            name=item.get("name") or item["model"],
+            model=item["model"],
+            base_url=item.get("base_url"),
+            api_key_env=item.get("api_key_env", "OPENAI_API_KEY"),
+            timeout=item.get("timeout")
+        ))
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"LLM_BACKENDS: имена бэкендов повторяются: {names}")
+    return specs
+
+
+class LatencyStats:
+    """Задержка бэкенда: EWMA для выбора и окно последних значений для перцентиля хеджирования"""
+
+    def __init__(self, window: int):
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.ewma = seconds if self.ewma is None else self.ewma + _EWMA_ALPHA * (seconds - self.ewma)
+        self.samples.append(seconds)
+
+
+def _percentile(samples, q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class LLMBackend:
+    """Бэкенд пула: модель, задержки, доля ошибок и исправность"""
+
+    def __init__(self, name: str, model: Runnable, window: int = 200):
+        self.name = name
+        self.model = model
+        self.latency = LatencyStats(window)  # полный ответ (ainvoke)
+        self.first_token = LatencyStats(window)  # первый фрагмент (astream)
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.unhealthy_until = 0.0
+        self.in_flight = 0
+        # Вызовы по результату: ok, error, cancelled (проигравший хедж или отключившийся клиент)
+        self.calls: Dict[str, int] = {"ok": 0, "error": 0, "cancelled": 0}
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_success(self, stats: Optional[LatencyStats] = None, seconds: float = 0.0):
+        if stats is not None:
+            stats.observe(seconds)
+        self.error_rate -= _EWMA_ALPHA * self.error_rate
+        self.consecutive_errors = 0
+        self.calls["ok"] += 1
+
+    def record_error(self, failure_threshold: int, cooldown: float):
+        self.error_rate += _EWMA_ALPHA * (1.0 - self.error_rate)
+        self.consecutive_errors += 1
+        self.calls["error"] += 1
+        if self.consecutive_errors >= failure_threshold:
+            self.unhealthy_until = time.monotonic() + cooldown
+            logger.warning(
+                f"LLM-бэкенд {self.name} исключен на {cooldown:.0f} с после {self.consecutive_errors} ошибок подряд"
+            )
+
+    def record_cancelled(self, stats: LatencyStats, seconds: float):
+        # Вызов был медленнее победителя: время до отмены - нижняя оценка его задержки
+        if stats.ewma is not None and seconds > stats.ewma:
+            stats.ewma += _EWMA_ALPHA * (seconds - stats.ewma)
+        self.calls["cancelled"] += 1
+
+    def score(self, stats: LatencyStats) -> float:
+        """Оценка для выбора: задержка с поправкой на долю ошибок; без замеров - 0 (бэкенд стоит попробовать)"""
+        return (stats.ewma or 0.0) * (1.0 + 2.0 * self.error_rate)
+
+
+def _retryable(error: BaseException) -> bool:
+    status_code = getattr(error, "status_code", None)
+    return status_code not in _NOT_RETRYABLE_STATUS
+
+
+class LLMPool(Runnable):
+    """Пул LLM-бэкендов с хеджированием запросов и переключением при ошибках"""
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0
+    ):
+        if not backends:
+            raise ValueError("Пул LLM без бэкендов")
+        self.backends = backends
+        # 0 - без хеджирования, только переключение при ошибках
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = max(1, hedge_min_samples)
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def _attempts(self, kind: str) -> List[LLMBackend]:
+        """Порядок бэкендов для вызова: исправные, затем по оценке задержки и порядку в настройках"""
+        ranked = sorted(
+            enumerate(self.backends),
+            key=lambda item: (not item[1].healthy, item[1].score(getattr(item[1], kind)), item[0])
+        )
+        attempts = [backend for _, backend in ranked]
+        # С одним бэкендом хедж - повторный запрос к нему же (по другому соединению)
+        return attempts if len(attempts) > 1 else attempts * 2
+
+    def _hedge_delay(self, backend: LLMBackend, kind: str) -> Optional[float]:
+        """Через сколько секунд отправлять хедж; None - без хеджирования (выключено или мало замеров)"""
+        if self.hedge_percentile <= 0:
+            return None
+        samples = getattr(backend, kind).samples
+        if len(samples) < self.hedge_min_samples:
+            # Бэкенд только стал лучшим и мало замерен: перцентиль по замерам всех бэкендов
+            samples = [seconds for other in self.backends for seconds in getattr(other, kind).samples]
+            if len(samples) < self.hedge_min_samples:
+                return None
+        return _percentile(samples, self.hedge_percentile)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """Синхронный вызов: переключение при ошибках, без хеджирования"""
+        error: Optional[BaseException] = None
+        for backend in self._attempts("latency")[:len(self.backends)]:
+            started = time.monotonic()
+            try:
+                result = backend.model.invoke(input, config, **kwargs)
+            except Exception as e:
+                backend.record_error(self.failure_threshold, self.cooldown)
+                if not _retryable(e):
+                    raise
+                error = e
+                continue
+            backend.record_success(backend.latency, time.monotonic() - started)
+            return result
+        raise error
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """Ответ первого успешного бэкенда; медленный вызов хеджируется, ошибка переключает на следующий"""
+        attempts = self._attempts("latency")
+        started = time.monotonic()
+        calls: Dict[asyncio.Task, Tuple[LLMBackend, float]] = {}
+        hedge: Optional[asyncio.Task] = None
+        error: Optional[BaseException] = None
+        hedge_delay = self._hedge_delay(attempts[0], "latency")
+
+        def launch() -> asyncio.Task:
+            backend = attempts.pop(0)
+            task = asyncio.ensure_future(self._call(backend, input, config, **kwargs))
+            calls[task] = (backend, time.monotonic())
+            return task
+
+        launch()
+        try:
+            while calls:
+                timeout = None
+                if hedge is None and hedge_delay is not None and attempts:
+                    timeout = max(0.0, started + hedge_delay - time.monotonic())
+                done, _ = await asyncio.wait(calls, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    logger.info(f"Хедж LLM: {attempts[0].name}, нет ответа за {hedge_delay:.2f} с")
+                    hedge = launch()
+                    continue
+
+                for task in done:
+                    backend, _ = calls.pop(task)
+                    if task.exception() is None:
+                        self.hedge_wins += task is hedge
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"Ошибка LLM-бэкенда {backend.name}: {error}")
+                    if not _retryable(error):
+                        raise error
+                if not calls and attempts:
+                    self.failovers += 1
+                    launch()
+            raise error
+        finally:
+            # Проигравший хедж отменяется: соединение закрывается, провайдер прекращает генерацию
+            for task, (backend, call_started) in calls.items():
+                task.cancel()
+                backend.record_cancelled(backend.latency, time.monotonic() - call_started)
+            # Ожидание отмены: к возврату вызова in_flight бэкендов уже учитывает ее
+            if calls:
+                await asyncio.wait(calls)
+
+    async def _call(self, backend: LLMBackend, input: Any, config: Optional[RunnableConfig], **kwargs: Any) -> Any:
+        started = time.monotonic()
+        backend.in_flight += 1
+        try:
+            result = await backend.model.ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            backend.record_error(self.failure_threshold, self.cooldown)
+            raise
+        finally:
+            backend.in_flight -= 1
+        backend.record_success(backend.latency, time.monotonic() - started)
+        return result
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        """Поток первого бэкенда, приславшего фрагмент; хедж и переключение - до первого фрагмента"""
+        attempts = self._attempts("first_token")
+        started = time.monotonic()
+        # Задача получения первого фрагмента -> (бэкенд, поток, время запуска)
+        streams: Dict[asyncio.Task, Tuple[LLMBackend, AsyncIterator, float]] = {}
+        hedge: Optional[asyncio.Task] = None
+        error: Optional[BaseException] = None
+        hedge_delay = self._hedge_delay(attempts[0], "first_token")
+
+        def launch() -> asyncio.Task:
+            backend = attempts.pop(0)
+            stream = backend.model.astream(input, config, **kwargs).__aiter__()
+            task = asyncio.ensure_future(stream.__anext__())
+            backend.in_flight += 1
+            streams[task] = (backend, stream, time.monotonic())
+            return task
+
+        winner: Optional[Tuple[LLMBackend, AsyncIterator, Any]] = None
+        launch()
+        try:
+            while streams and winner is None:
+                timeout = None
+                if hedge is None and hedge_delay is not None and attempts:
+                    timeout = max(0.0, started + hedge_delay - time.monotonic())
+                done, _ = await asyncio.wait(streams, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    logger.info(f"Хедж LLM (поток): {attempts[0].name}, нет первого токена за {hedge_delay:.2f} с")
+                    hedge = launch()
+                    continue
+
+                for task in done:
+                    backend, stream, call_started = streams.pop(task)
+                    failure = task.exception()
+                    if failure is None or isinstance(failure, StopAsyncIteration):
+                        backend.first_token.observe(time.monotonic() - call_started)
+                        self.hedge_wins += task is hedge
+                        winner = (backend, stream, None if failure else task.result())
+                        break
+                    backend.in_flight -= 1
+                    backend.record_error(self.failure_threshold, self.cooldown)
+                    error = failure
+                    logger.warning(f"Ошибка LLM-бэкенда {backend.name}: {error}")
+                    if not _retryable(error):
+                        raise error
+                if winner is None and not streams and attempts:
+                    self.failovers += 1
+                    launch()
+        finally:
+            await self._cancel_streams(streams)
+
+        if winner is None:
+            raise error
+        backend, stream, first = winner
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Клиент отключился до конца ответа
+            backend.calls["cancelled"] += 1
+            raise
+        except Exception:
+            backend.record_error(self.failure_threshold, self.cooldown)
+            raise
+        else:
+            backend.record_success()
+        finally:
+            backend.in_flight -= 1
+            await stream.aclose()
+
+    @staticmethod
+    async def _cancel_streams(streams: Dict[asyncio.Task, Tuple[LLMBackend, AsyncIterator, float]]):
+        """Отмена потоков, проигравших хедж: задача первого фрагмента, затем закрытие потока"""
+        for task, (backend, _, call_started) in streams.items():
+            task.cancel()
+            backend.in_flight -= 1
+            backend.record_cancelled(backend.first_token, time.monotonic() - call_started)
+        if streams:
+            await asyncio.wait(streams)
+        for _, stream, _ in streams.values():
+            try:
+                await stream.aclose()
+            except Exception as e:
+                logger.debug(f"Ошибка закрытия отмененного потока LLM: {e}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние бэкендов для метрик"""
+        return [
+            {
+                "name": backend.name,
+                "healthy": backend.healthy,
+                "latency": backend.latency.ewma,
+                "first_token": backend.first_token.ewma,
+                "error_rate": backend.error_rate,
+                "in_flight": backend.in_flight,
+                "calls": dict(backend.calls)
+            }
+            for backend in self.backends
+        ]
@@ -0,0 +1,151 @@
+"""
+Подготовка страницы Confluence к индексации: проверка контента, конвертация HTML
+в текст и разбиение на чанки с метаданными.
+
+Функции модуля не зависят от состояния индексатора и принимают только простые
+данные, поэтому одинаково выполняются в потоках конвейера и в пуле процессов
+(INGEST_WORKERS): результат, порядок чанков и их идентификаторы совпадают.
+"""
+
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .html_to_text import get_html_converter
+
+# Признаки неподдерживаемого контента (ищутся в HTML без учета регистра)
+UNSUPPORTED_PATTERNS = (
+    "ac:name=\"drawio\"",
+    "ac:name=\"gliffy\"",
+    "ri:attachment",
+    "ac:structured-macro",
+    "ac:name=\"excel\"",
+    "ac:name=\"pdf\"",
+    "ac:name=\"viewpdf\""
+)
+
+# Причины пропуска страницы по содержимому: (тип, сообщение)
+UNSUPPORTED_CONTENT = (
+    "UnsupportedContentType",
+    "Страница содержит неподдерживаемый контент (draw.io, вложения и т.д.)"
+)
+EMPTY_CONTENT = ("EmptyContent", "Страница не содержит текстового контента")
+
+
+@dataclass
+class PageTask:
+    """Данные страницы, которые нужны для построения чанков"""
+    page_id: str
+    title: str
+    url: str
+    space_key: str
+    labels: List[str]
+    last_modified: str
+    content_hash: str
+
+
+@dataclass
+class PreparedPage:
+    """Результат подготовки страницы: чанки с метаданными или причина пропуска"""
+    chunks: List[str] = field(default_factory=list)
+    metadatas: List[Dict] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    error_type: Optional[str] = None
+    error_message: Optional[str] = None
+    text_chars: int = 0
+    # Время разбора и чанкинга в процессе-воркере (для телеметрии)
+    parse_seconds: float = 0.0
+    chunk_seconds: float = 0.0
+
+
+def has_unsupported_content(html: str) -> bool:
+    """Проверка на наличие неподдерживаемого контента"""
+    html_lower = html.lower()
+    return any(pattern in html_lower for pattern in UNSUPPORTED_PATTERNS)
+
+
+def chunk_id(page_id: str, content_hash: str, index: int) -> str:
+    """Детерминированный идентификатор чанка"""
+    return f"{page_id}:{content_hash[:16]}:{index}"
+
+
+@lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Сплиттер создается один раз на процесс для каждого набора параметров"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+        length_function=len
+    )
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Разбиение текста на чанки"""
+    return _get_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def page_text(html: str, converter_name: str) -> Tuple[Optional[str], Optional[Tuple[str, str]]]:
+    """Текст страницы или причина ее пропуска"""
+    if has_unsupported_content(html):
+        return None, UNSUPPORTED_CONTENT
+
+    text = get_html_converter(converter_name)(html)
+    if not text.strip():
+        return None, EMPTY_CONTENT
+
+    return text, None
+
+
+def chunk_page(task: PageTask, text: str, chunk_size: int, chunk_overlap: int) -> PreparedPage:
+    """Разбиение текста страницы на чанки с метаданными и идентификаторами"""
+    # Добавление метаданных в начало текста
+    metadata_text = f"Страница: {task.title}\n"
+    if task.labels:
+        metadata_text += f"Метки: {', '.join(task.labels)}\n"
+    metadata_text += "\n"
+
+    prepared = PreparedPage(chunks=split_text(metadata_text + text, chunk_size, chunk_overlap))
+
+    for i in range(len(prepared.chunks)):
+        prepared.metadatas.append({
+            "page_id": task.page_id,
+            "title": task.title,
+            "url": task.url,
+            "space_key": task.space_key,
+            "labels": ", ".join(task.labels),
+            "chunk_index": i,
+            "total_chunks": len(prepared.chunks),
+            "last_modified": task.last_modified
+        })
+        prepared.chunk_ids.append(chunk_id(task.page_id, task.content_hash, i))
+
+    return prepared
+
+
+def prepare_page(
+    task: PageTask,
+    html: str,
+    converter_name: str,
+    chunk_size: int,
+    chunk_overlap: int
+) -> PreparedPage:
+    """Полная подготовка страницы из storage-формата (выполняется в процессе-воркере)"""
+    started = time.perf_counter()
+    text, skip_reason = page_text(html, converter_name)
+    parsed = time.perf_counter()
+    if skip_reason is not None:
+        return PreparedPage(
+            error_type=skip_reason[0],
+            error_message=skip_reason[1],
+            parse_seconds=parsed - started
+        )
+
+    prepared = chunk_page(task, text, chunk_size, chunk_overlap)
+    prepared.text_chars = len(text)
+    prepared.parse_seconds = parsed - started
+    prepared.chunk_seconds = time.perf_counter() - parsed
+    return prepared
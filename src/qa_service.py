@@ -5,23 +5,39 @@ QA-сервис для ответов на вопросы по документ
 """
 
 import os
+import json
+import time
+import asyncio
 import logging
-from typing import Optional, List, Dict
-from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Literal, Optional, List, Dict, Tuple
+from contextlib import aclosing, asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-import chromadb
-from chromadb.config import Settings
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import Document
-from langchain.schema.runnable import RunnablePassthrough
+from .admission import LANES, AdmissionRejected, LLMAdmission
+from .answer_cache import SemanticAnswerCache
+from .extractive import ANSWER_MODES, ExtractiveAnswer, ExtractiveAnswerer, ExtractedPassage
+from .index_versions import current_version, resolve_index_path
+from .lexical_index import LexicalIndex
+from .retrieval_batcher import RetrievalBatcher
+from .service_metrics import CONTENT_TYPE, CollectedMetric, QAMetrics, error_type
+from .single_flight import SingleFlight, normalize_question
+
+# chromadb, langchain и модель эмбеддингов импортируются при инициализации в фоне,
+# чтобы сервис начинал отвечать на liveness сразу после запуска процесса
+if TYPE_CHECKING:
+    from langchain.schema import Document
+    from langchain_community.vectorstores import Chroma
+    from .context_assembler import AssembledContext, ContextAssembler
+    from .llm_pool import LLMPool
+
+# Отсчет времени запуска: от загрузки модуля до готовности принимать вопросы
+_STARTED_AT = time.perf_counter()
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -38,12 +54,42 @@ logger = logging.getLogger(__name__)
 class AskRequest(BaseModel):
     """Запрос на получение ответа"""
     text: str = Field(..., description="Вопрос пользователя")
-    k: Optional[int] = Field(None, description="Количество релевантных фрагментов для поиска")
+    k: Optional[int] = Field(None, ge=1, description="Количество релевантных фрагментов для поиска")
+    max_context_tokens: Optional[int] = Field(None, ge=1, description="Бюджет токенов контекста для LLM")
+    answer_mode: Optional[Literal["llm", "extractive", "auto"]] = Field(
+        None,
+        description="llm - ответ LLM, extractive - найденные фрагменты без LLM, auto - фрагменты при высокой "
+                    "уверенности поиска (по умолчанию ANSWER_MODE)"
+    )
+
+
+class BatchQuestion(AskRequest):
+    """Вопрос пакета"""
+    id: Optional[str] = Field(None, description="Идентификатор вопроса, возвращается в результате")
+
+
+class AskBatchRequest(BaseModel):
+    """Пакет вопросов"""
+    questions: List[BatchQuestion] = Field(..., min_length=1, description="Вопросы")
+    concurrency: Optional[int] = Field(None, ge=1, description="Одновременных вызовов LLM (не больше BATCH_LLM_CONCURRENCY)")
+
+
+class SourcePassage(BaseModel):
+    """Фрагмент документации в извлекающем ответе"""
+    title: Optional[str] = Field(None, description="Название страницы")
+    url: Optional[str] = Field(None, description="Ссылка на страницу")
+    text: str = Field(..., description="Отрывок фрагмента")
+    highlight: Optional[str] = Field(None, description="Предложение, лучше всего совпадающее с вопросом")
+    score: float = Field(..., description="Взвешенная доля слов вопроса в предложении, 0..1")
 
 
 class AskResponse(BaseModel):
     """Ответ на вопрос"""
     answer: str = Field(..., description="Сгенерированный ответ")
+    answer_mode: str = Field("llm", description="llm - ответ LLM, extractive - найденные фрагменты")
+    degraded: bool = Field(False, description="LLM недоступна, вместо ответа - найденные фрагменты")
+    confidence: Optional[float] = Field(None, description="Уверенность извлекающего ответа, 0..1")
+    passages: List[SourcePassage] = Field(default_factory=list, description="Фрагменты извлекающего ответа")
 
 
 class HealthResponse(BaseModel):
@@ -51,6 +97,56 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="Статус сервиса")
     vector_store_ready: bool = Field(..., description="Готовность векторного хранилища")
     llm_ready: bool = Field(..., description="Готовность LLM")
+    index_version: Optional[str] = Field(None, description="Опубликованная версия индекса")
+    documents: int = Field(0, description="Документов в хранилище (по последней фоновой проверке)")
+    embeddings_warm: bool = Field(False, description="Модель эмбеддингов прогрета")
+    startup_seconds: Optional[float] = Field(None, description="Время от запуска процесса до готовности, с")
+    startup_stages: Dict[str, float] = Field(default_factory=dict, description="Длительность этапов инициализации, с")
+    error: Optional[str] = Field(None, description="Ошибка инициализации или проверки хранилища")
+
+
+@dataclass
+class PreparedQuestion:
+    """Вопрос после поиска: найденные фрагменты или ответ из кеша"""
+    question: str
+    k: int
+    vector: Optional[List[float]]  # None - эмбеддинг не считался (только лексический поиск)
+    index_version: Optional[str]
+    max_context_tokens: int
+    cacheable: bool
+    hits: List[Tuple["Document", float]] = field(default_factory=list)
+    context: Optional["AssembledContext"] = None
+    cached_answer: Optional[str] = None
+    retrieval_mode: str = "vector"
+    retrieval_seconds: float = 0.0
+    # Допуск к LLM: приоритет, срок по time.monotonic(), ограничен ли размер очереди и время ожидания в ней
+    priority: str = "interactive"
+    deadline: Optional[float] = None
+    queue_bounded: bool = True
+    queue_seconds: float = 0.0
+    answer_mode: str = "llm"
+
+
+@dataclass
+class Answer:
+    """Ответ на вопрос: сгенерированный LLM (или из кеша) либо извлеченный из найденных фрагментов"""
+    text: str
+    mode: str = "llm"
+    cached: bool = False
+    degraded: bool = False  # извлеченный ответ вместо недоступной LLM
+    confidence: Optional[float] = None
+    passages: List[ExtractedPassage] = field(default_factory=list)
+    
+    def details(self) -> Dict[str, Any]:
+        """Поля ответа для событий и результатов пакета (фрагменты - только у извлекающего ответа)"""
+        if self.mode != "extractive":
+            return {"answer_mode": self.mode}
+        return {
+            "answer_mode": self.mode,
+            "degraded": self.degraded,
+            "confidence": self.confidence,
+            "passages": [asdict(passage) for passage in self.passages]
+        }
 
 
 class QAService:
@@ -60,68 +156,399 @@ class QAService:
         # Конфигурация
         self.vector_store_path = os.getenv("VECTOR_STORE_PATH", "./vector_store")
         self.embedding_model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        # Реализация модели: "huggingface" (PyTorch) или "onnx" (ONNX Runtime, int8)
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
         self.retriever_k = int(os.getenv("RETRIEVER_K", "4"))
+        # Верхняя граница k в запросе: большие значения замедляют поиск и раздувают промпт
+        self.retriever_max_k = int(os.getenv("RETRIEVER_MAX_K", "20"))
+        
+        # Бюджет токенов контекста: соседние чанки склеиваются, фрагменты добавляются по релевантности
+        self.context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+        self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "120"))
+        
+        # Режим поиска: "hybrid" - векторный и BM25 параллельно со слиянием RRF, "vector", "lexical"
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+        if self.retrieval_mode not in ("hybrid", "vector", "lexical"):
+            raise ValueError(f"Неизвестный режим поиска RETRIEVAL_MODE: {self.retrieval_mode}")
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        # Кандидатов из каждого вида поиска на один итоговый фрагмент
+        self.hybrid_candidates = max(1, int(os.getenv("HYBRID_CANDIDATES", "2")))
+        
+        # Переключение на новую версию индекса без перезапуска
+        self.index_refresh_interval = float(os.getenv("INDEX_REFRESH_INTERVAL", "30"))
+        # Старая версия закрывается с задержкой, чтобы завершились запросы, начатые до переключения
+        self.index_release_delay = float(os.getenv("INDEX_RELEASE_DELAY", "120"))
+        
+        # Готовность кешируется: число документов в хранилище перепроверяется в фоне, а не в каждом запросе
+        self.readiness_refresh_interval = float(os.getenv("READINESS_REFRESH_INTERVAL", "15"))
+        
+        # Семантический кеш ответов: близкие по смыслу вопросы получают сохраненный ответ
+        self.answer_cache_enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.answer_cache_threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+        self.answer_cache_ttl = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+        self.answer_cache_max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+        self.answer_cache_path = os.getenv("ANSWER_CACHE_PATH", "")
+        
+        # Эмбеддинги вопросов пакетами и поиск в пуле потоков (вне event loop)
+        self.retrieval_batch_size = int(os.getenv("RETRIEVAL_BATCH_SIZE", "32"))
+        self.retrieval_batch_wait_ms = float(os.getenv("RETRIEVAL_BATCH_WAIT_MS", "5"))
+        self.retrieval_search_workers = int(os.getenv("RETRIEVAL_SEARCH_WORKERS", "4"))
+        
+        # Пакетные вопросы (/ask/batch): размер пакета и число одновременных вызовов LLM на все пакеты
+        self.batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+        self.batch_llm_concurrency = max(1, int(os.getenv("BATCH_LLM_CONCURRENCY", "4")))
+        self._batch_llm_slots = asyncio.Semaphore(self.batch_llm_concurrency)
+        
+        # Допуск к LLM: одновременных вызовов на весь сервис, очередь сверх них (переполнение - 429)
+        # и срок запроса по умолчанию (клиент может сократить его заголовком X-Request-Timeout)
+        self.llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.llm_queue_size = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+        self.request_timeout = float(os.getenv("REQUEST_TIMEOUT", "60"))
+        self.admission = LLMAdmission(self.llm_max_concurrency, self.llm_queue_size)
+        
+        # Одновременные одинаковые вопросы (те же k, бюджет и версия индекса) делят один поиск и вызов LLM
+        self.coalesce_requests = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+        self._flights = SingleFlight()
+        
+        # Извлекающие ответы без LLM: режим по умолчанию, порог уверенности для auto,
+        # ответ фрагментами при ошибке LLM и объем ответа.
+        # Уверенность - доля слов вопроса (с весами IDF) в лучшем предложении, а не оценка векторного поиска или RRF
+        self.answer_mode = os.getenv("ANSWER_MODE", "llm").lower()
+        if self.answer_mode not in ANSWER_MODES:
+            raise ValueError(f"Неизвестный режим ответа ANSWER_MODE: {self.answer_mode}")
+        self.extractive_auto_confidence = float(os.getenv("EXTRACTIVE_AUTO_CONFIDENCE", "0.9"))
+        self.extractive_fallback = os.getenv("EXTRACTIVE_FALLBACK", "true").lower() == "true"
+        self.extractor = ExtractiveAnswerer(
+            max_passages=int(os.getenv("EXTRACTIVE_MAX_PASSAGES", "2")),
+            max_chars=int(os.getenv("EXTRACTIVE_MAX_CHARS", "600"))
+        )
         
         # OpenAI конфигурация
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         
+        # Пул LLM-бэкендов (JSON-список, пусто - один бэкенд OpenAI из OPENAI_API_KEY и OPENAI_MODEL):
+        # хедж медленного вызова после перцентиля задержки (0 - без хеджирования), исключение бэкенда после ошибок
+        self.llm_backends = os.getenv("LLM_BACKENDS", "").strip()
+        self.llm_hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.llm_hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.llm_backend_failures = int(os.getenv("LLM_BACKEND_FAILURES", "3"))
+        self.llm_backend_cooldown = float(os.getenv("LLM_BACKEND_COOLDOWN", "30"))
+        
         # Инициализация компонентов
+        self.embeddings = None
         self.vectorstore = None
-        self.llm = None
+        self.lexical: Optional[LexicalIndex] = None
+        self.llm: Optional["LLMPool"] = None
         self.qa_chain = None
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        self.retrieval: Optional[RetrievalBatcher] = None
+        self.index_version: Optional[str] = None
+        self.context_assembler: Optional["ContextAssembler"] = None
+        
+        # Состояние запуска и закешированная проверка хранилища
+        self.initialized = False
+        self.startup_error: Optional[str] = None
+        self.startup_seconds: Optional[float] = None
+        self.startup_stages: Dict[str, float] = {}
+        self.doc_count = 0
+        self.vector_store_error: Optional[str] = None
+        self._background: List["asyncio.Task"] = []
+        
+        # Метрики для /metrics: этапы запроса, токены LLM, ошибки
+        self.metrics = QAMetrics()
+        self.metrics.registry.add_collector(self._collect_metrics)
+        
+        # Замененные хранилища, ожидающие закрытия: (время закрытия, хранилище, лексический индекс)
+        self._retired: List[Tuple[float, "Chroma", Optional[LexicalIndex]]] = []
         
     def initialize(self):
-        """Инициализация компонентов сервиса"""
+        """Инициализация компонентов сервиса (блокирующая, при запуске выполняется в фоновом потоке)"""
         try:
-            # Инициализация эмбеддингов
-            embeddings = HuggingFaceEmbeddings(
-                model_name=self.embedding_model_name,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
+            stage = time.perf_counter()
+            from langchain_openai import ChatOpenAI
+            from .context_assembler import ContextAssembler
+            from .embedding_backends import create_embeddings
+            self.startup_stages["imports"] = time.perf_counter() - stage
             
-            # Инициализация векторного хранилища
-            chroma_settings = Settings(
-                persist_directory=self.vector_store_path,
-                anonymized_telemetry=False
+            # Инициализация эмбеддингов (модель загружается один раз и используется всеми версиями индекса)
+            stage = time.perf_counter()
+            self.embeddings = create_embeddings(
+                self.embedding_backend,
+                self.embedding_model_name,
+                batch_size=self.retrieval_batch_size
             )
             
-            self.vectorstore = Chroma(
-                collection_name="confluence_docs",
-                embedding_function=embeddings,
-                persist_directory=self.vector_store_path,
-                client_settings=chroma_settings
+            # embed_query обеих реализаций кодирует вопрос так же, как embed_documents,
+            # поэтому одновременные вопросы можно кодировать одним пакетом
+            self.retrieval = RetrievalBatcher(
+                self.embeddings.embed_documents,
+                max_batch_size=self.retrieval_batch_size,
+                max_wait_ms=self.retrieval_batch_wait_ms,
+                search_workers=self.retrieval_search_workers
             )
+            self.context_assembler = ContextAssembler(self.openai_model, self.chunk_overlap)
+            self.startup_stages["embeddings"] = time.perf_counter() - stage
+            
+            # Инициализация векторного хранилища опубликованной версии индекса
+            stage = time.perf_counter()
+            self.index_version = current_version(self.vector_store_path)
+            index_path = resolve_index_path(self.vector_store_path)
+            self.vectorstore = self._open_vectorstore(index_path)
+            self.lexical = self._open_lexical(index_path)
             
             # Проверка наличия документов
-            collection = self.vectorstore._collection
-            doc_count = collection.count()
-            logger.info(f"Векторное хранилище инициализировано. Документов: {doc_count}")
+            self.check_vector_store()
+            logger.info(
+                f"Векторное хранилище инициализировано. Документов: {self.doc_count}, "
+                f"версия индекса: {self.index_version or 'без версий'}"
+            )
             
-            if doc_count == 0:
+            if self.doc_count == 0:
                 logger.warning("Векторное хранилище пусто. Необходимо запустить индексацию.")
+            self.startup_stages["vector_store"] = time.perf_counter() - stage
             
             # Инициализация LLM
-            if self.openai_api_key:
-                self.llm = ChatOpenAI(
-                    api_key=self.openai_api_key,
-                    model=self.openai_model,
-                    temperature=0.3,
-                    max_tokens=1000
-                )
-                logger.info(f"LLM инициализирован: {self.openai_model}")
-            else:
-                logger.error("OpenAI API ключ не найден. Установите OPENAI_API_KEY.")
-                raise ValueError("OpenAI API key not found")
+            stage = time.perf_counter()
+            self.llm = self._create_llm(ChatOpenAI)
             
             # Создание QA цепочки
             self._create_qa_chain()
+            # Словарь токенизатора загружается здесь, а не в первом запросе
+            self.context_assembler.count_tokens("прогрев")
+            self.startup_stages["llm"] = time.perf_counter() - stage
+            
+            # Кеш ответов для опубликованной версии индекса
+            if self.answer_cache_enabled:
+                self.answer_cache = SemanticAnswerCache(
+                    threshold=self.answer_cache_threshold,
+                    ttl_seconds=self.answer_cache_ttl,
+                    max_entries=self.answer_cache_max_entries,
+                    path=self.answer_cache_path or None
+                )
+                self.answer_cache.load(self.index_version)
+            
+            self.initialized = True
             
         except Exception as e:
             logger.error(f"Ошибка инициализации сервиса: {e}")
             raise
     
+    async def start(self):
+        """
+        Фоновый запуск: инициализация вне event loop, прогрев модели эмбеддингов,
+        затем периодические проверки индекса и готовности.
+        До завершения инициализации сервис жив (liveness), но не готов (readiness).
+        """
+        try:
+            await asyncio.to_thread(self.initialize)
+        except Exception as e:
+            self.startup_error = str(e)
+            return
+        
+        if self.index_refresh_interval > 0:
+            self._background.append(asyncio.create_task(self.watch_index()))
+        if self.readiness_refresh_interval > 0:
+            self._background.append(asyncio.create_task(self.watch_readiness()))
+        
+        # С лексическим индексом вопросы обслуживаются и во время прогрева
+        if self.ready:
+            self._record_startup()
+        await self.warm_up()
+        if self.startup_seconds is None and self.ready:
+            self._record_startup()
+    
+    def _record_startup(self):
+        self.startup_seconds = time.perf_counter() - _STARTED_AT
+        stages = ", ".join(f"{name} {seconds:.1f} с" for name, seconds in self.startup_stages.items())
+        logger.info(f"🚀 Сервис готов через {self.startup_seconds:.1f} с после запуска ({stages})")
+    
+    async def stop(self):
+        """Остановка фоновых задач и пула поиска"""
+        for task in self._background:
+            task.cancel()
+        self._background = []
+        if self.retrieval is not None:
+            await self.retrieval.close()
+    
+    def _open_vectorstore(self, path: str) -> "Chroma":
+        """Открытие векторного хранилища в каталоге версии индекса"""
+        from chromadb.config import Settings
+        from langchain_community.vectorstores import Chroma
+        
+        # is_persistent: без него chromadb >= 0.4 держит коллекцию в памяти процесса
+        chroma_settings = Settings(
+            persist_directory=path,
+            is_persistent=True,
+            anonymized_telemetry=False
+        )
+        
+        return Chroma(
+            collection_name="confluence_docs",
+            embedding_function=self.embeddings,
+            persist_directory=path,
+            client_settings=chroma_settings
+        )
+    
+    def _open_lexical(self, path: str) -> Optional[LexicalIndex]:
+        """Лексический индекс версии (None - не нужен режиму поиска или еще не построен)"""
+        if self.retrieval_mode == "vector":
+            return None
+        lexical = LexicalIndex.open(path)
+        if lexical is None:
+            logger.warning(f"Лексический индекс в {path} не найден, используется только векторный поиск")
+        else:
+            logger.info(f"Лексический индекс: {lexical.doc_count} чанков")
+        return lexical
+    
+    def refresh_index(self) -> bool:
+        """
+        Переключение на новую опубликованную версию индекса.
+        Новое хранилище открывается заранее и подменяется одной операцией:
+        запросы, начатые до переключения, дорабатывают со старым хранилищем.
+        Кеш ответов сбрасывается при первом обращении с новой версией.
+        """
+        version = current_version(self.vector_store_path)
+        if version is None or version == self.index_version:
+            return False
+        
+        index_path = resolve_index_path(self.vector_store_path)
+        vectorstore = self._open_vectorstore(index_path)
+        doc_count = vectorstore._collection.count()
+        if doc_count == 0:
+            logger.warning(f"Версия индекса {version} пуста, переключение пропущено")
+            self._release_vectorstore(vectorstore)
+            return False
+        lexical = self._open_lexical(index_path)
+        
+        previous_store, previous_lexical, previous_version = self.vectorstore, self.lexical, self.index_version
+        self.vectorstore, self.lexical, self.index_version = vectorstore, lexical, version
+        self.doc_count, self.vector_store_error = doc_count, None
+        
+        if previous_store is not None:
+            self._retired.append((time.monotonic() + self.index_release_delay, previous_store, previous_lexical))
+        
+        logger.info(f"🔀 Переключение на версию индекса {version} (была {previous_version or 'без версий'}), документов: {doc_count}")
+        return True
+    
+    def release_retired(self):
+        """Закрытие замененных хранилищ, срок ожидания которых истек"""
+        now = time.monotonic()
+        due = [(store, lexical) for release_at, store, lexical in self._retired if release_at <= now]
+        self._retired = [retired for retired in self._retired if retired[0] > now]
+        for store, lexical in due:
+            self._release_vectorstore(store)
+            if lexical is not None:
+                lexical.close()
+    
+    @staticmethod
+    def _release_vectorstore(store: "Chroma"):
+        """Освобождение файлов и памяти хранилища старой версии"""
+        # chromadb кеширует систему клиента по каталогу; без удаления из кеша она живет до конца процесса
+        try:
+            from chromadb.api.client import SharedSystemClient
+            
+            system = SharedSystemClient._identifier_to_system.pop(store._client._identifier, None)
+            if system is not None:
+                system.stop()
+        except Exception as e:
+            logger.warning(f"Не удалось закрыть хранилище старой версии индекса: {e}")
+    
+    async def warm_up(self):
+        """Прогрев модели эмбеддингов; до его завершения вопросы обслуживает лексический поиск"""
+        started = time.perf_counter()
+        try:
+            await self.retrieval.embed("прогрев модели")
+            self.startup_stages["warm_up"] = time.perf_counter() - started
+            logger.info(f"Модель эмбеддингов прогрета за {time.perf_counter() - started:.1f} с")
+        except Exception as e:
+            logger.error(f"Ошибка прогрева модели эмбеддингов: {e}")
+    
+    async def watch_index(self):
+        """Фоновая проверка появления новой версии индекса"""
+        while True:
+            await asyncio.sleep(self.index_refresh_interval)
+            try:
+                # Открытие хранилища - блокирующая операция, выполняется вне event loop
+                await asyncio.to_thread(self.refresh_index)
+                self.release_retired()
+            except Exception as e:
+                logger.error(f"Ошибка переключения версии индекса: {e}")
+    
+    def check_vector_store(self):
+        """Проверка векторного хранилища; результат кешируется и используется проверкой готовности"""
+        try:
+            self.doc_count = self.vectorstore._collection.count()
+            self.vector_store_error = None
+        except Exception as e:
+            logger.error(f"Ошибка проверки векторного хранилища: {e}")
+            self.vector_store_error = str(e)
+    
+    async def watch_readiness(self):
+        """Фоновое обновление закешированного состояния хранилища"""
+        while True:
+            await asyncio.sleep(self.readiness_refresh_interval)
+            # count() обращается к SQLite chromadb, выполняется вне event loop
+            await asyncio.to_thread(self.check_vector_store)
+    
+    @property
+    def ready(self) -> bool:
+        """
+        Готовность принимать вопросы по закешированному состоянию, без обращения к хранилищу.
+        Без лексического индекса требуется прогретая модель эмбеддингов.
+        Пустой индекс (новое развертывание до первой индексации) готовности не отменяет:
+        вопросы получают 503 "индекс пуст", а зависящие от сервиса контейнеры запускаются.
+        """
+        return (
+            self.initialized
+            and self.vector_store_error is None
+            and self.llm is not None
+            and (self.retrieval.warm or self.lexical is not None)
+        )
+    
+    def _create_llm(self, chat_model: type) -> "LLMPool":
+        """Пул LLM-бэкендов из LLM_BACKENDS или один бэкенд OpenAI"""
+        from .llm_pool import BackendSpec, LLMBackend, LLMPool, parse_backends
+        
+        if self.llm_backends:
+            specs = parse_backends(self.llm_backends)
+        elif self.openai_api_key:
+            specs = [BackendSpec(name="openai", model=self.openai_model)]
+        else:
+            logger.error("OpenAI API ключ не найден. Установите OPENAI_API_KEY.")
+            raise ValueError("OpenAI API key not found")
+        
+        backends = []
+        for spec in specs:
+            api_key = os.getenv(spec.api_key_env)
+            if not api_key and not spec.base_url:
+                logger.error(f"LLM-бэкенд {spec.name}: не задан {spec.api_key_env}, бэкенд пропущен")
+                continue
+            backends.append(LLMBackend(spec.name, chat_model(
+                # Локальные OpenAI-совместимые серверы ключ не проверяют
+                api_key=api_key or "not-needed",
+                base_url=spec.base_url,
+                model=spec.model,
+                temperature=0.3,
+                max_tokens=1000,
+                timeout=spec.timeout,
+                # Повторы внутри одного бэкенда задерживают переключение на другой
+                max_retries=0 if len(specs) > 1 else 2,
+                # Число токенов приходит и в потоковом ответе (для метрик)
+                stream_usage=True
+            )))
+            logger.info(f"LLM-бэкенд {spec.name}: {spec.model}" + (f" ({spec.base_url})" if spec.base_url else ""))
+        if not backends:
+            raise ValueError("Нет доступных LLM-бэкендов")
+        
+        return LLMPool(
+            backends,
+            hedge_percentile=self.llm_hedge_percentile,
+            hedge_min_samples=self.llm_hedge_min_samples,
+            failure_threshold=self.llm_backend_failures,
+            cooldown=self.llm_backend_cooldown
+        )
+    
     def _create_qa_chain(self):
         """Создание цепочки для ответов на вопросы"""
         # Промпт для генерации ответов
@@ -135,95 +562,739 @@ class QAService:
 
 Ответ:"""
         
+        from langchain.prompts import ChatPromptTemplate
+        
         prompt = ChatPromptTemplate.from_template(prompt_template)
         
-        # Создание ретривера
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": self.retriever_k}
-        )
+        # Поиск фрагментов выполняется в ask() по уже вычисленному эмбеддингу вопроса,
+        # цепочка получает готовый контекст
+        self.qa_chain = prompt | self.llm
         
-        # Функция для форматирования документов
-        def format_docs(docs: List[Document]) -> str:
-            formatted = []
-            for doc in docs:
-                metadata = doc.metadata
-                content = doc.page_content
-                
-                # Добавление информации о источнике
-                source_info = f"[Страница: {metadata.get('title', 'N/A')}]"
-                if metadata.get('url'):
-                    source_info += f" ({metadata['url']})"
-                
-                formatted.append(f"{source_info}\n{content}")
-            
-            return "\n\n---\n\n".join(formatted)
+        logger.info("QA цепочка создана успешно")
+    
+    async def _prepare(
+        self,
+        question: str,
+        k: Optional[int],
+        max_context_tokens: Optional[int] = None,
+        priority: str = "interactive",
+        deadline: Optional[float] = None,
+        answer_mode: str = "llm"
+    ) -> PreparedQuestion:
+        """Эмбеддинг вопроса, проверка кеша ответов, поиск релевантных фрагментов и сборка контекста"""
+        started = time.perf_counter()
+        
+        # Хранилище, лексический индекс и версия фиксируются на весь запрос
+        # (могут смениться при переключении индекса)
+        vectorstore, lexical, index_version = self.vectorstore, self.lexical, self.index_version
+        prepared = self._new_question(question, k, max_context_tokens, index_version)
+        prepared.priority, prepared.deadline = priority, deadline
+        self._set_answer_mode(prepared, answer_mode)
+        k = prepared.k
         
-        # Создание цепочки
-        self.qa_chain = (
-            {"context": retriever | format_docs, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
+        # Лексический поиск не зависит от эмбеддинга и запускается сразу, параллельно с ним
+        lexical_task = self._start_lexical(vectorstore, lexical, prepared)
+        
+        # Пока модель эмбеддингов прогревается, ответ строится только по лексическому поиску
+        if lexical_task is not None and (self.retrieval_mode == "lexical" or not self.retrieval.warm):
+            prepared.retrieval_mode = "lexical"
+            prepared.cacheable = False
+            prepared.hits = (await lexical_task)[:k]
+        else:
+            try:
+                prepared.hits = await self._vector_hits(prepared, vectorstore, lexical_task)
+            finally:
+                if lexical_task is not None and not lexical_task.done():
+                    lexical_task.cancel()
+            if prepared.cached_answer is not None:
+                prepared.retrieval_seconds = time.perf_counter() - started
+                return prepared
+        
+        self._assemble(prepared)
+        prepared.retrieval_seconds = time.perf_counter() - started
+        return prepared
+    
+    def _new_question(
+        self,
+        question: str,
+        k: Optional[int],
+        max_context_tokens: Optional[int],
+        index_version: Optional[str]
+    ) -> PreparedQuestion:
+        """Вопрос с проверенным k и бюджетом контекста"""
+        k = k or self.retriever_k
+        if k > self.retriever_max_k:
+            logger.warning(f"k={k} больше RETRIEVER_MAX_K, используется {self.retriever_max_k}")
+            k = self.retriever_max_k
+        
+        return PreparedQuestion(
+            question=question,
+            k=k,
+            vector=None,
+            index_version=index_version,
+            max_context_tokens=max_context_tokens or self.context_max_tokens,
+            # Кеш хранит ответы, собранные с бюджетом контекста по умолчанию
+            cacheable=max_context_tokens in (None, self.context_max_tokens)
+        )
+    
+    @staticmethod
+    def _set_answer_mode(prepared: PreparedQuestion, answer_mode: str):
+        """Режим ответа вопроса: запрошенные фрагменты не подменяются ответом LLM из кеша"""
+        prepared.answer_mode = answer_mode
+        if answer_mode == "extractive":
+            prepared.cacheable = False
+    
+    def _start_lexical(
+        self,
+        vectorstore: "Chroma",
+        lexical: Optional[LexicalIndex],
+        prepared: PreparedQuestion
+    ) -> Optional["asyncio.Future"]:
+        """Запуск лексического поиска в пуле потоков (None - лексического индекса нет)"""
+        if lexical is None:
+            return None
+        return asyncio.ensure_future(self.metrics.lexical_search.timed(self.retrieval.search(
+            self._lexical_search, vectorstore, lexical, prepared.question, prepared.k * self.hybrid_candidates
+        )))
+    
+    def _check_cache(self, prepared: PreparedQuestion) -> bool:
+        """Поиск ответа на близкий вопрос в кеше по эмбеддингу вопроса"""
+        if self.answer_cache is None or not prepared.cacheable:
+            return False
+        cached = self.answer_cache.get(prepared.vector, prepared.k, prepared.index_version)
+        if cached is None:
+            return False
+        logger.info(f"Вопрос: {prepared.question[:50]}... | Ответ из кеша (вопрос: {cached.question[:50]}...)")
+        prepared.cached_answer = cached.answer
+        return True
+    
+    def _assemble(self, prepared: PreparedQuestion):
+        """Сборка контекста из найденных фрагментов в пределах бюджета токенов"""
+        started = time.perf_counter()
+        prepared.context = self.context_assembler.assemble(prepared.hits, prepared.max_context_tokens)
+        self.metrics.context.observe(time.perf_counter() - started)
+        self.metrics.retrieved_chunks.labels(prepared.retrieval_mode).observe(len(prepared.hits))
+        self.metrics.context_tokens.observe(prepared.context.tokens)
+        logger.debug(
+            f"Контекст: {len(prepared.hits)} чанков → {len(prepared.context.passages)} фрагментов, "
+            f"{prepared.context.tokens} токенов, не поместилось: {prepared.context.dropped}"
         )
+    
+    async def _vector_hits(
+        self,
+        prepared: PreparedQuestion,
+        vectorstore: "Chroma",
+        lexical_task: Optional["asyncio.Future"]
+    ) -> List[Tuple["Document", float]]:
+        """Векторный поиск (после проверки кеша ответов) и слияние с лексическим, если он запущен"""
+        # Эмбеддинг вопроса считается один раз: для кеша ответов и для поиска фрагментов
+        prepared.vector = await self.metrics.embed.timed(self.retrieval.embed(prepared.question))
         
-        logger.info("QA цепочка создана успешно")
+        if self._check_cache(prepared):
+            return []
+        
+        candidates = prepared.k * self.hybrid_candidates if lexical_task is not None else prepared.k
+        vector_hits = await self.metrics.vector_search.timed(self.retrieval.search(
+            vectorstore.similarity_search_by_vector_with_relevance_scores, prepared.vector, candidates
+        ))
+        if lexical_task is None:
+            return vector_hits
+        
+        prepared.retrieval_mode = "hybrid"
+        return self._fuse([vector_hits, await lexical_task], self.hybrid_rrf_k)[:prepared.k]
+    
+    @staticmethod
+    def _lexical_search(
+        vectorstore: "Chroma",
+        lexical: LexicalIndex,
+        question: str,
+        k: int
+    ) -> List[Tuple["Document", float]]:
+        """Поиск BM25 и загрузка найденных чанков из хранилища (оценка - место в выдаче)"""
+        from langchain.schema import Document
+        
+        ranked = lexical.search(question, k)
+        if not ranked:
+            return []
+        
+        chunk_ids = [chunk_id for chunk_id, _ in ranked]
+        found = vectorstore.get(ids=chunk_ids, include=["documents", "metadatas"])
+        documents = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [
+            (documents[chunk_id], float(rank)) for rank, chunk_id in enumerate(chunk_ids) if chunk_id in documents
+        ]
     
-    async def ask(self, question: str, k: Optional[int] = None) -> str:
-        """Получить ответ на вопрос"""
+    @staticmethod
+    def _fuse(rankings: List[List[Tuple["Document", float]]], rrf_k: int) -> List[Tuple["Document", float]]:
+        """
+        Слияние выдач reciprocal rank fusion: оценка чанка - сумма 1 / (rrf_k + место) по выдачам.
+        Возвращает чанки по убыванию оценки, в качестве оценки - итоговое место.
+        """
+        scores: Dict[Tuple, float] = {}
+        documents: Dict[Tuple, "Document"] = {}
+        for ranking in rankings:
+            for rank, (doc, _) in enumerate(ranking, 1):
+                key = (doc.metadata.get("page_id"), doc.metadata.get("chunk_index"), doc.page_content[:64])
+                scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+                documents.setdefault(key, doc)
+        
+        ordered = sorted(scores, key=scores.get, reverse=True)
+        return [(documents[key], float(rank)) for rank, key in enumerate(ordered)]
+    
+    def _remember(
+        self,
+        prepared: PreparedQuestion,
+        answer: str,
+        llm_seconds: float,
+        usage: Optional[Dict[str, int]] = None
+    ):
+        """Сохранение сгенерированного ответа в кеше и учет времени и токенов LLM"""
+        self.metrics.llm_total.observe(llm_seconds)
+        if usage:
+            self.metrics.prompt_tokens.inc(usage.get("input_tokens", 0))
+            self.metrics.completion_tokens.inc(usage.get("output_tokens", 0))
+        else:
+            # API не вернул usage: оценка по контексту и ответу (без текста шаблона промпта)
+            self.metrics.prompt_tokens.inc(
+                prepared.context.tokens + self.context_assembler.count_tokens(prepared.question)
+            )
+            self.metrics.completion_tokens.inc(self.context_assembler.count_tokens(answer))
+        
+        if self.answer_cache is not None and prepared.cacheable:
+            self.answer_cache.put(
+                prepared.question, prepared.vector, answer, prepared.k, prepared.index_version, llm_seconds
+            )
+        logger.info(f"Вопрос: {prepared.question[:50]}... | Ответ: {answer[:50]}...")
+    
+    def _flight_key(
+        self,
+        endpoint: str,
+        question: str,
+        k: Optional[int],
+        max_context_tokens: Optional[int],
+        answer_mode: str,
+        priority: str
+    ) -> Optional[Tuple]:
+        """
+        Ключ объединения одинаковых вопросов; None - объединение выключено.
+        Приоритет входит в ключ: вопрос из Slack не ждет в очереди пакетов, пакет не занимает место интерактивного.
+        """
+        if not self.coalesce_requests:
+            return None
+        return (
+            endpoint,
+            normalize_question(question),
+            min(k or self.retriever_k, self.retriever_max_k),
+            max_context_tokens or self.context_max_tokens,
+            answer_mode,
+            priority,
+            self.index_version
+        )
+    
+    @staticmethod
+    def _foreign_deadline(error: AdmissionRejected, joined: bool, deadline: Optional[float]) -> bool:
+        """
+        Отказ по сроку первого запроса, а не присоединившегося: объединенная работа допускается
+        к LLM со сроком первого запроса, у присоединившегося срок может быть позже или не задан
+        """
+        return joined and error.reason == "deadline" and (deadline is None or deadline > time.monotonic())
+    
+    def resolve_answer_mode(self, answer_mode: Optional[str]) -> str:
+        """Режим ответа запроса или ANSWER_MODE"""
+        answer_mode = (answer_mode or self.answer_mode).lower()
+        if answer_mode not in ANSWER_MODES:
+            raise ValueError(f"Неизвестный режим ответа: {answer_mode}")
+        return answer_mode
+    
+    async def ask(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        priority: str = "interactive",
+        deadline: Optional[float] = None,
+        answer_mode: Optional[str] = None
+    ) -> Answer:
+        """
+        Получить ответ на вопрос (одновременные одинаковые вопросы получают один ответ).
+        priority и deadline (срок по time.monotonic()) определяют место в очереди к LLM,
+        answer_mode - llm, extractive или auto (по умолчанию ANSWER_MODE).
+        """
+        answer_mode = self.resolve_answer_mode(answer_mode)
+        key = self._flight_key("ask", question, k, max_context_tokens, answer_mode, priority)
+        if key is None:
+            return await self._ask(question, k, max_context_tokens, priority, deadline, answer_mode)
+        joined = key in self._flights
+        if joined:
+            self.metrics.coalesced.labels("ask").inc()
         try:
-            # Использовать переданное k или значение по умолчанию
-            if k and k != self.retriever_k:
-                # Временно изменить количество возвращаемых документов
-                retriever = self.vectorstore.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": k}
-                )
-                # Пересоздать цепочку с новым ретривером
-                # (для упрощения используем текущий retriever_k)
-            
-            # Получение ответа
-            response = await self.qa_chain.ainvoke(question)
-            
-            # Извлечение текста из ответа
-            if hasattr(response, 'content'):
-                answer = response.content
-            else:
-                answer = str(response)
+            return await self._flights.run(
+                key, lambda: self._ask(question, k, max_context_tokens, priority, deadline, answer_mode)
+            )
+        except AdmissionRejected as e:
+            if not self._foreign_deadline(e, joined, deadline):
+                raise
+            # Чужой срок не переносится на этот запрос: вопрос задается заново со своим сроком
+            return await self._ask(question, k, max_context_tokens, priority, deadline, answer_mode)
+    
+    async def _ask(
+        self,
+        question: str,
+        k: Optional[int],
+        max_context_tokens: Optional[int],
+        priority: str,
+        deadline: Optional[float],
+        answer_mode: str
+    ) -> Answer:
+        """Ответ на вопрос: поиск, кеш ответов, извлечение фрагментов или LLM"""
+        try:
+            prepared = await self._prepare(question, k, max_context_tokens, priority, deadline, answer_mode)
+            if prepared.cached_answer is not None:
+                return Answer(prepared.cached_answer, cached=True)
             
-            logger.info(f"Вопрос: {question[:50]}... | Ответ: {answer[:50]}...")
+            answer = await self._extractive_first(prepared)
+            if answer is not None:
+                return answer
             
-            return answer
+            try:
+                return Answer(await self._generate(prepared))
+            except Exception as e:
+                return await self._fallback(prepared, e)
             
+        except AdmissionRejected:
+            # Отказ по перегрузке уже записан в _llm_slot
+            raise
         except Exception as e:
             logger.error(f"Ошибка при генерации ответа: {e}")
             raise
     
-    def health_check(self) -> Dict[str, any]:
-        """Проверка здоровья сервиса"""
-        health = {
-            "status": "unhealthy",
-            "vector_store_ready": False,
-            "llm_ready": False
+    async def _extract(self, prepared: PreparedQuestion, degraded: bool = False) -> ExtractiveAnswer:
+        """Извлекающий ответ по собранному контексту (в пуле поиска: веса слов читаются из словаря индекса)"""
+        started = time.perf_counter()
+        extracted = await self.retrieval.search(
+            self.extractor.answer, prepared.question, prepared.context.passages, self.lexical, degraded
+        )
+        self.metrics.extract.observe(time.perf_counter() - started)
+        return extracted
+    
+    async def _extractive_first(self, prepared: PreparedQuestion) -> Optional[Answer]:
+        """
+        Извлекающий ответ, если он запрошен или в режиме auto уверенность не ниже порога; None - нужна LLM.
+        Уверенность - покрытие слов вопроса (с весами IDF) лучшим предложением фрагментов,
+        а не близость векторов или балл RRF: поиск находит фрагменты, а ответ ли это - решает покрытие.
+        """
+        if prepared.answer_mode == "llm":
+            return None
+        extracted = await self._extract(prepared)
+        if prepared.answer_mode == "extractive":
+            return self._extractive_answer(prepared, extracted, "requested")
+        if extracted.confidence >= self.extractive_auto_confidence:
+            return self._extractive_answer(prepared, extracted, "auto")
+        return None
+    
+    def _extractive_answer(self, prepared: PreparedQuestion, extracted: ExtractiveAnswer, reason: str) -> Answer:
+        """Ответ найденными фрагментами и учет причины"""
+        self.metrics.extractive_answers.labels(reason).inc()
+        logger.info(
+            f"Вопрос: {prepared.question[:50]}... | Извлеченный ответ ({reason}, "
+            f"уверенность {extracted.confidence:.2f}, фрагментов: {len(extracted.passages)})"
+        )
+        return Answer(
+            extracted.text,
+            mode="extractive",
+            degraded=reason == "fallback",
+            confidence=extracted.confidence,
+            passages=extracted.passages
+        )
+    
+    async def _fallback(self, prepared: PreparedQuestion, error: Exception) -> Answer:
+        """
+        Ответ найденными фрагментами вместо ответа LLM, завершившегося ошибкой (все бэкенды недоступны).
+        Отказ по перегрузке и ошибка при выключенном EXTRACTIVE_FALLBACK передаются дальше.
+        """
+        if not self.extractive_fallback or isinstance(error, AdmissionRejected):
+            raise error
+        logger.warning(f"LLM недоступна ({type(error).__name__}: {error}), ответ найденными фрагментами")
+        return self._extractive_answer(prepared, await self._extract(prepared, degraded=True), "fallback")
+    
+    @asynccontextmanager
+    async def _llm_slot(self, prepared: PreparedQuestion) -> AsyncIterator[None]:
+        """Слот вызова LLM: ожидание в очереди по приоритету и сроку вопроса"""
+        try:
+            prepared.queue_seconds = await self.admission.acquire(
+                prepared.priority, prepared.deadline, prepared.queue_bounded
+            )
+        except AdmissionRejected as e:
+            self.metrics.llm_rejected.labels(prepared.priority, e.reason).inc()
+            logger.warning(f"Вопрос не допущен к LLM ({e.reason}): {prepared.question[:50]}...")
+            raise
+        self.metrics.llm_queue_wait.labels(prepared.priority).observe(prepared.queue_seconds)
+        
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.admission.release(time.monotonic() - started)
+    
+    async def _generate(self, prepared: PreparedQuestion) -> str:
+        """Ответ LLM по собранному контексту"""
+        async with self._llm_slot(prepared):
+            started = time.perf_counter()
+            response = await self.qa_chain.ainvoke(
+                {"context": prepared.context.text, "question": prepared.question}
+            )
+            llm_seconds = time.perf_counter() - started
+        
+        # Извлечение текста из ответа
+        if hasattr(response, 'content'):
+            answer = response.content
+        else:
+            answer = str(response)
+        
+        self._remember(prepared, answer, llm_seconds, getattr(response, "usage_metadata", None))
+        return answer
+    
+    async def ask_stream(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        priority: str = "interactive",
+        deadline: Optional[float] = None,
+        answer_mode: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Ответ на вопрос потоком событий: (имя события, данные).
+        retrieval - поиск завершен, token - очередной фрагмент ответа, done - полный ответ.
+        Извлекающий ответ приходит одним событием token.
+        Одновременные одинаковые вопросы получают события одного потока, начиная с первого.
+        """
+        answer_mode = self.resolve_answer_mode(answer_mode)
+        key = self._flight_key("ask_stream", question, k, max_context_tokens, answer_mode, priority)
+        joined = key is not None and key in self._flights
+        if key is None:
+            events = self._ask_stream(question, k, max_context_tokens, priority, deadline, answer_mode)
+        else:
+            if joined:
+                self.metrics.coalesced.labels("ask_stream").inc()
+            events = self._flights.stream(
+                key, lambda: self._ask_stream(question, k, max_context_tokens, priority, deadline, answer_mode)
+            )
+        sent = set()
+        # Закрытие сразу при отключении клиента, а не при сборке мусора: общий поток отменяется без ожидающих
+        try:
+            async with aclosing(events):
+                async for name, data in events:
+                    sent.add(name)
+                    yield name, data
+        except AdmissionRejected as e:
+            if not self._foreign_deadline(e, joined, deadline):
+                raise
+            # Отказ по сроку первого запроса приходит до ответа LLM: поток продолжается заново
+            # со своим сроком, уже отправленное событие поиска не повторяется
+            events = self._ask_stream(question, k, max_context_tokens, priority, deadline, answer_mode)
+            async with aclosing(events):
+                async for name, data in events:
+                    if name not in sent:
+                        yield name, data
+    
+    async def _ask_stream(
+        self,
+        question: str,
+        k: Optional[int],
+        max_context_tokens: Optional[int],
+        priority: str,
+        deadline: Optional[float],
+        answer_mode: str
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """События ответа на вопрос: поиск, кеш ответов, извлечение фрагментов или поток LLM"""
+        prepared = await self._prepare(question, k, max_context_tokens, priority, deadline, answer_mode)
+        passages = prepared.context.passages if prepared.context else []
+        yield "retrieval", {
+            "documents": len(prepared.hits),
+            "passages": len(passages),
+            "context_tokens": prepared.context.tokens if prepared.context else 0,
+            "cached": prepared.cached_answer is not None,
+            "mode": prepared.retrieval_mode,
+            "retrieval_ms": round(prepared.retrieval_seconds * 1000, 1),
+            "sources": [
+                {"title": passage.metadata.get("title"), "url": passage.metadata.get("url")} for passage in passages
+            ]
         }
         
+        if prepared.cached_answer is not None:
+            yield "token", {"text": prepared.cached_answer}
+            yield "done", {"answer": prepared.cached_answer, "cached": True, "answer_mode": "llm"}
+            return
+        
+        answer = await self._extractive_first(prepared)
+        if answer is not None:
+            yield "token", {"text": answer.text}
+            yield "done", {"answer": answer.text, "cached": False, **answer.details()}
+            return
+        
+        parts = []
+        usage = None
         try:
-            # Проверка векторного хранилища
-            if self.vectorstore:
-                doc_count = self.vectorstore._collection.count()
-                health["vector_store_ready"] = doc_count > 0
-            
-            # Проверка LLM
-            if self.llm:
-                health["llm_ready"] = True
+            async with self._llm_slot(prepared):
+                started = time.perf_counter()
+                async for chunk in self.qa_chain.astream(
+                    {"context": prepared.context.text, "question": question}
+                ):
+                    # С stream_usage последний фрагмент без текста содержит число токенов
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if text:
+                        if not parts:
+                            self.metrics.llm_first_token.observe(time.perf_counter() - started)
+                        parts.append(text)
+                        yield "token", {"text": text}
+                llm_seconds = time.perf_counter() - started
+        except Exception as e:
+            # Начатый ответ LLM не подменяется фрагментами
+            if parts:
+                raise
+            fallback = await self._fallback(prepared, e)
+            yield "token", {"text": fallback.text}
+            yield "done", {"answer": fallback.text, "cached": False, **fallback.details()}
+            return
+        
+        answer = "".join(parts)
+        self._remember(prepared, answer, llm_seconds, usage)
+        yield "done", {"answer": answer, "cached": False, "answer_mode": "llm"}
+    
+    async def ask_batch(
+        self,
+        items: List[Tuple[str, Optional[int], Optional[int], Optional[str]]],
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ответы на список вопросов (текст, k, бюджет контекста, режим ответа) по мере готовности.
+        Вопросы кодируются одним вызовом модели, векторный поиск выполняется одним запросом
+        к коллекции, вызовы LLM идут параллельно: не больше concurrency в пакете
+        и не больше BATCH_LLM_CONCURRENCY на все пакеты сервиса.
+        Результат: {"index", "answer", "cached", "mode", "answer_mode", "timings"} (у извлекающего ответа -
+        и фрагменты) или {"index", "error", "error_type"}.
+        """
+        started = time.perf_counter()
+        vectorstore, lexical, index_version = self.vectorstore, self.lexical, self.index_version
+        questions = [
+            self._new_question(text, k, max_context_tokens, index_version) for text, k, max_context_tokens, _ in items
+        ]
+        for prepared, (_, _, _, answer_mode) in zip(questions, items):
+            # Пакет ждет интерактивные вопросы; его очередь уже ограничена BATCH_LLM_CONCURRENCY
+            prepared.priority, prepared.queue_bounded = "batch", False
+            self._set_answer_mode(prepared, self.resolve_answer_mode(answer_mode))
+        lexical_tasks = [self._start_lexical(vectorstore, lexical, prepared) for prepared in questions]
+        slots = asyncio.Semaphore(min(concurrency or self.batch_llm_concurrency, self.batch_llm_concurrency))
+        tasks: List["asyncio.Task"] = []
+        
+        try:
+            if lexical is None or self.retrieval_mode != "lexical":
+                try:
+                    await self._batch_vector_hits(questions, vectorstore, hybrid=lexical is not None)
+                except Exception as e:
+                    # Общий этап не выполнен: ошибка относится ко всем вопросам пакета
+                    logger.error(f"Ошибка пакетного поиска: {e}")
+                    self.metrics.errors.labels("ask_batch", error_type(e)).inc()
+                    for index in range(len(questions)):
+                        yield {"index": index, "error": str(e), "error_type": type(e).__name__}
+                    return
             
-            # Общий статус
-            if health["vector_store_ready"] and health["llm_ready"]:
-                health["status"] = "healthy"
+            tasks = [
+                asyncio.ensure_future(self._answer_batch_item(index, prepared, lexical_task, slots, started))
+                for index, (prepared, lexical_task) in enumerate(zip(questions, lexical_tasks))
+            ]
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks + [task for task in lexical_tasks if task is not None]:
+                if not task.done():
+                    task.cancel()
+    
+    async def _batch_vector_hits(self, questions: List[PreparedQuestion], vectorstore: "Chroma", hybrid: bool):
+        """Эмбеддинги вопросов одним вызовом модели, проверка кеша и векторный поиск одним запросом"""
+        vectors = await self.metrics.embed.timed(self.retrieval.embed_many([prepared.question for prepared in questions]))
+        pending = []
+        for prepared, vector in zip(questions, vectors):
+            prepared.vector = vector
+            if not self._check_cache(prepared):
+                pending.append(prepared)
+        if not pending:
+            return
+        
+        candidates = self.hybrid_candidates if hybrid else 1
+        results = await self.metrics.vector_search.timed(self.retrieval.search(
+            self._vector_search_many,
+            vectorstore,
+            [prepared.vector for prepared in pending],
+            max(prepared.k for prepared in pending) * candidates
+        ))
+        for prepared, hits in zip(pending, results):
+            prepared.hits = hits[:prepared.k * candidates]
+    
+    @staticmethod
+    def _vector_search_many(
+        vectorstore: "Chroma",
+        vectors: List[List[float]],
+        k: int
+    ) -> List[List[Tuple["Document", float]]]:
+        """Векторный поиск для нескольких вопросов одним запросом к коллекции (оценка - расстояние)"""
+        from langchain.schema import Document
+        
+        results = vectorstore._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ]
+            for texts, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"])
+        ]
+    
+    async def _answer_batch_item(
+        self,
+        index: int,
+        prepared: PreparedQuestion,
+        lexical_task: Optional["asyncio.Future"],
+        slots: asyncio.Semaphore,
+        batch_started: float
+    ) -> Dict[str, Any]:
+        """Слияние выдач, сборка контекста и ответ LLM для одного вопроса пакета"""
+        timings: Dict[str, float] = {}
+        try:
+            if prepared.cached_answer is None:
+                if lexical_task is not None and prepared.vector is None:
+                    prepared.retrieval_mode = "lexical"
+                    prepared.cacheable = False
+                    prepared.hits = (await lexical_task)[:prepared.k]
+                elif lexical_task is not None:
+                    prepared.retrieval_mode = "hybrid"
+                    prepared.hits = self._fuse([prepared.hits, await lexical_task], self.hybrid_rrf_k)[:prepared.k]
+                self._assemble(prepared)
+            timings["retrieval_ms"] = (time.perf_counter() - batch_started) * 1000
             
+            if prepared.cached_answer is not None:
+                answer = Answer(prepared.cached_answer, cached=True)
+            else:
+                answer = await self._extractive_first(prepared)
+            if answer is None:
+                try:
+                    waiting = time.perf_counter()
+                    async with slots, self._batch_llm_slots:
+                        generating = time.perf_counter()
+                        timings["llm_wait_ms"] = (generating - waiting) * 1000
+                        answer = Answer(await self._generate(prepared))
+                        # Ожидание в очереди к LLM (за интерактивными вопросами) относится к ожиданию, а не к генерации
+                        timings["llm_wait_ms"] += prepared.queue_seconds * 1000
+                        timings["llm_ms"] = (time.perf_counter() - generating - prepared.queue_seconds) * 1000
+                except Exception as e:
+                    answer = await self._fallback(prepared, e)
         except Exception as e:
-            logger.error(f"Ошибка при проверке здоровья: {e}")
+            logger.error(f"Ошибка ответа на вопрос пакета #{index}: {e}")
+            self.metrics.errors.labels("ask_batch", error_type(e)).inc()
+            return {"index": index, "error": str(e), "error_type": type(e).__name__}
         
-        return health
+        timings["total_ms"] = (time.perf_counter() - batch_started) * 1000
+        return {
+            "index": index,
+            "answer": answer.text,
+            "cached": answer.cached,
+            "mode": prepared.retrieval_mode,
+            **answer.details(),
+            "timings": {name: round(value, 1) for name, value in timings.items()}
+        }
+    
+    def _collect_metrics(self) -> List[CollectedMetric]:
+        """Метрики, которые считают компоненты сервиса, на момент экспорта"""
+        collected: List[CollectedMetric] = [
+            ("qa_ready", "gauge", "Сервис готов отвечать на вопросы", [({}, float(self.ready))]),
+            ("qa_index_documents", "gauge", "Документов в хранилище (по последней проверке)", [({}, self.doc_count)]),
+            ("qa_startup_stage_seconds", "gauge", "Длительность этапов инициализации",
+             [({"stage": name}, seconds) for name, seconds in self.startup_stages.items()])
+        ]
+        if self.startup_seconds is not None:
+            collected.append(
+                ("qa_startup_seconds", "gauge", "Время от запуска процесса до готовности", [({}, self.startup_seconds)])
+            )
+        if self.retrieval is not None:
+            collected += [
+                ("qa_embed_batches_total", "counter", "Пакетов эмбеддингов вопросов", [({}, self.retrieval.batches)]),
+                ("qa_embedded_questions_total", "counter", "Закодированных вопросов", [({}, self.retrieval.embedded)])
+            ]
+        collected += [
+            ("qa_llm_queue_depth", "gauge", "Вопросов в очереди к LLM по приоритету",
+             [({"lane": lane}, count) for lane, count in self.admission.queued.items()]),
+            ("qa_llm_active_calls", "gauge", "Выполняющихся вызовов LLM", [({}, self.admission.active)]),
+            ("qa_llm_expected_seconds", "gauge", "Оценка длительности вызова LLM (EWMA) для Retry-After",
+             [({}, self.admission.llm_seconds)])
+        ]
+        if self.llm is not None:
+            collected += self._collect_llm_metrics()
+        if self.coalesce_requests:
+            collected.append(
+                ("qa_coalesce_flights", "gauge", "Выполняющихся ответов, к которым могут присоединиться одинаковые вопросы",
+                 [({}, len(self._flights))])
+            )
+        if self.answer_cache is not None:
+            collected += [
+                ("qa_answer_cache_lookups_total", "counter", "Обращения к кешу ответов",
+                 [({"result": "hit"}, self.answer_cache.hits), ({"result": "miss"}, self.answer_cache.misses)]),
+                ("qa_answer_cache_entries", "gauge", "Ответов в кеше", [({}, len(self.answer_cache._entries))])
+            ]
+        return collected
+    
+    def _collect_llm_metrics(self) -> List[CollectedMetric]:
+        """Состояние бэкендов пула LLM, хеджи и переключения"""
+        backends = self.llm.stats()
+        latency = []
+        for backend in backends:
+            for kind in ("latency", "first_token"):
+                if backend[kind] is not None:
+                    latency.append(({"backend": backend["name"], "kind": kind}, backend[kind]))
+        return [
+            ("qa_llm_backend_healthy", "gauge", "Бэкенд LLM исправен (не исключен после ошибок подряд)",
+             [({"backend": backend["name"]}, float(backend["healthy"])) for backend in backends]),
+            ("qa_llm_backend_latency_seconds", "gauge", "EWMA задержки бэкенда: полный ответ и первый токен", latency),
+            ("qa_llm_backend_error_rate", "gauge", "EWMA доли ошибок бэкенда",
+             [({"backend": backend["name"]}, backend["error_rate"]) for backend in backends]),
+            ("qa_llm_backend_in_flight", "gauge", "Выполняющихся вызовов бэкенда",
+             [({"backend": backend["name"]}, backend["in_flight"]) for backend in backends]),
+            ("qa_llm_backend_calls_total", "counter", "Вызовы бэкенда по результату (cancelled - проигравший хедж)",
+             [({"backend": backend["name"], "result": result}, count)
+              for backend in backends for result, count in backend["calls"].items()]),
+            ("qa_llm_hedges_total", "counter", "Хеджированных вызовов LLM", [({}, self.llm.hedges)]),
+            ("qa_llm_hedge_wins_total", "counter", "Хеджей, ответивших раньше исходного вызова", [({}, self.llm.hedge_wins)]),
+            ("qa_llm_failovers_total", "counter", "Переключений на другой бэкенд после ошибки", [({}, self.llm.failovers)])
+        ]
+    
+    def health_check(self) -> Dict[str, Any]:
+        """Состояние сервиса по закешированным проверкам (без обращения к хранилищу)"""
+        if self.startup_error:
+            status = "unhealthy"
+        elif self.startup_seconds is None and not self.ready:
+            # Инициализация или прогрев модели еще идут
+            status = "starting"
+        else:
+            status = "healthy" if self.ready else "unhealthy"
+        
+        return {
+            "status": status,
+            "vector_store_ready": self.initialized and self.vector_store_error is None and self.doc_count > 0,
+            "llm_ready": self.llm is not None,
+            "index_version": self.index_version,
+            "documents": self.doc_count,
+            "embeddings_warm": self.retrieval is not None and self.retrieval.warm,
+            "startup_seconds": round(self.startup_seconds, 2) if self.startup_seconds is not None else None,
+            "startup_stages": {name: round(seconds, 2) for name, seconds in self.startup_stages.items()},
+            "error": self.startup_error or self.vector_store_error
+        }
 
 
 # Глобальный экземпляр сервиса
@@ -234,12 +1305,14 @@ qa_service = QAService()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом FastAPI приложения"""
-    # Инициализация при запуске
+    # Инициализация в фоне: uvicorn принимает соединения сразу, /health/ready отвечает 503 до готовности
     logger.info("Инициализация QA сервиса...")
-    qa_service.initialize()
+    startup = asyncio.create_task(qa_service.start())
     yield
     # Очистка при остановке
     logger.info("Остановка QA сервиса...")
+    startup.cancel()
+    await qa_service.stop()
 
 
 # Создание FastAPI приложения
@@ -274,23 +1347,214 @@ async def health():
     return HealthResponse(**health_status)
 
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: процесс и event loop отвечают; 503 - инициализация завершилась ошибкой, нужен перезапуск"""
+    if qa_service.startup_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": qa_service.startup_error})
+    return {"status": "alive", "uptime_seconds": round(time.perf_counter() - _STARTED_AT, 1)}
+
+
+@app.get("/health/ready", response_model=HealthResponse)
+async def health_ready():
+    """Readiness: 200, если сервис готов отвечать на вопросы, иначе 503"""
+    health_status = HealthResponse(**qa_service.health_check())
+    return JSONResponse(status_code=200 if qa_service.ready else 503, content=health_status.model_dump())
+
+
+def _require_ready(endpoint: str):
+    """503, пока сервис не готов (по закешированному состоянию, без обращения к хранилищу)"""
+    if not qa_service.ready:
+        qa_service.metrics.errors.labels(endpoint, "http_503").inc()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Сервис не готов: {qa_service.health_check()}"
+        )
+    if qa_service.doc_count == 0:
+        qa_service.metrics.errors.labels(endpoint, "http_503").inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Индекс пуст: запустите индексацию (python -m src.ingest_with_report)"
+        )
+
+
+def _admission_options(priority: Optional[str], timeout: Optional[float]) -> Tuple[str, Optional[float]]:
+    """
+    Приоритет и срок запроса (по time.monotonic()) из заголовков X-Request-Priority и X-Request-Timeout.
+    Заголовок может только сократить срок REQUEST_TIMEOUT; 0 в REQUEST_TIMEOUT - срок не ограничен.
+    """
+    priority = (priority or "interactive").lower()
+    if priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"X-Request-Priority: ожидается одно из {', '.join(LANES)}")
+    
+    timeouts = [value for value in (timeout, qa_service.request_timeout) if value and value > 0]
+    deadline = time.monotonic() + min(timeouts) if timeouts else None
+    return priority, deadline
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Секунд до срока запроса (None - срок не ограничен)"""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    """Быстрый отказ с Retry-After: очередь к LLM заполнена (429) или срок не будет выдержан (503)"""
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Событие Server-Sent Events с данными в JSON (переводы строк в ответе не ломают формат)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(
+    request: AskRequest,
+    x_request_priority: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None)
+):
+    """Ответ на вопрос потоком Server-Sent Events: retrieval, token..., done (или error)"""
+    _require_ready("ask_stream")
+    priority, deadline = _admission_options(x_request_priority, x_request_timeout)
+    answer_mode = qa_service.resolve_answer_mode(request.answer_mode)
+    try:
+        # Статус потока отправляется до вызова LLM: при заполненной очереди отказ сразу, до поиска.
+        # Извлекающему ответу очередь к LLM не нужна
+        if answer_mode != "extractive":
+            qa_service.admission.check(priority)
+    except AdmissionRejected as e:
+        qa_service.metrics.llm_rejected.labels(priority, e.reason).inc()
+        qa_service.metrics.errors.labels("ask_stream", "http_429").inc()
+        raise _rejected(e)
+    
+    async def events() -> AsyncIterator[str]:
+        with qa_service.metrics.track("ask_stream"):
+            stream = qa_service.ask_stream(
+                request.text, request.k, request.max_context_tokens, priority, deadline, answer_mode
+            )
+            try:
+                while True:
+                    try:
+                        # Срок проверяется на каждом событии: ожидание между yield не ограничивается
+                        event, data = await asyncio.wait_for(stream.__anext__(), _remaining(deadline))
+                    except StopAsyncIteration:
+                        break
+                    yield _sse_event(event, data)
+            except AdmissionRejected as e:
+                qa_service.metrics.errors.labels("ask_stream", error_type(e)).inc()
+                yield _sse_event("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+            except asyncio.TimeoutError:
+                logger.warning(f"Срок запроса истек: {request.text[:50]}...")
+                qa_service.metrics.errors.labels("ask_stream", "deadline").inc()
+                yield _sse_event("error", {"detail": "Срок запроса истек", "status": 504})
+            except Exception as e:
+                # Статус уже отправлен, ошибка передается событием
+                logger.error(f"Ошибка потоковой генерации ответа: {e}")
+                qa_service.metrics.errors.labels("ask_stream", error_type(e)).inc()
+                yield _sse_event("error", {"detail": str(e)})
+            finally:
+                await stream.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: AskBatchRequest):
+    """
+    Ответы на пакет вопросов потоком Server-Sent Events по мере готовности:
+    item (ответ или ошибка вопроса и замеры времени) на каждый вопрос, затем done.
+    """
+    _require_ready("ask_batch")
+    if len(request.questions) > qa_service.batch_max_questions:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Вопросов в пакете больше BATCH_MAX_QUESTIONS ({qa_service.batch_max_questions})"
+        )
+    
+    async def events() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        errors = 0
+        with qa_service.metrics.track("ask_batch"):
+            try:
+                async for result in qa_service.ask_batch(
+                    [
+                        (question.text, question.k, question.max_context_tokens, question.answer_mode)
+                        for question in request.questions
+                    ],
+                    request.concurrency
+                ):
+                    errors += "error" in result
+                    yield _sse_event("item", {"id": request.questions[result["index"]].id, **result})
+            except Exception as e:
+                logger.error(f"Ошибка обработки пакета вопросов: {e}")
+                qa_service.metrics.errors.labels("ask_batch", error_type(e)).inc()
+                yield _sse_event("error", {"detail": str(e)})
+                return
+        yield _sse_event("done", {
+            "questions": len(request.questions),
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(qa_service.metrics.registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Статистика семантического кеша ответов"""
+    if qa_service.answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **qa_service.answer_cache.stats()}
+
+
 @app.post("/ask", response_model=AskResponse)
-async def ask(request: AskRequest):
-    """Получить ответ на вопрос"""
+async def ask(
+    request: AskRequest,
+    x_request_priority: Optional[str] = Header(None),
+    x_request_timeout: Optional[float] = Header(None)
+):
+    """
+    Получить ответ на вопрос.
+    X-Request-Priority: interactive (по умолчанию) или batch; X-Request-Timeout - срок ответа, с.
+    С answer_mode=extractive (или auto при уверенном поиске) ответ - найденные фрагменты без LLM.
+    """
     try:
         # Проверка готовности сервиса
-        health_status = qa_service.health_check()
-        if health_status["status"] != "healthy":
-            raise HTTPException(
-                status_code=503,
-                detail=f"Сервис не готов: {health_status}"
-            )
+        _require_ready("ask")
+        priority, deadline = _admission_options(x_request_priority, x_request_timeout)
         
         # Получение ответа
-        answer = await qa_service.ask(request.text, request.k)
+        with qa_service.metrics.track("ask"):
+            answer = await asyncio.wait_for(
+                qa_service.ask(
+                    request.text, request.k, request.max_context_tokens, priority, deadline, request.answer_mode
+                ),
+                _remaining(deadline)
+            )
         
-        return AskResponse(answer=answer)
+        return AskResponse(answer=answer.text, **answer.details())
         
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except asyncio.TimeoutError:
+        logger.warning(f"Срок запроса истек: {request.text[:50]}...")
+        raise HTTPException(status_code=504, detail="Срок запроса истек")
     except Exception as e:
         logger.error(f"Ошибка обработки запроса: {e}")
         raise HTTPException(
@@ -306,7 +1570,7 @@ if __name__ == "__main__":
     port = int(os.getenv("API_PORT", "8000"))
     
     uvicorn.run(
-        "qa_service:app",
+        "src.qa_service:app",
         host=host,
         port=port,
         reload=True,
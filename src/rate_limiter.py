@@ -0,0 +1,109 @@
+"""
+Адаптивный rate limiter для запросов к Confluence.
+Token bucket, скорость которого растет при успешных ответах (аддитивно)
+и снижается при 429/503 (мультипликативно) с учетом заголовка Retry-After.
+"""
+
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбор заголовка Retry-After: число секунд или HTTP-дата"""
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AdaptiveRateLimiter:
+    """Потокобезопасный token bucket с адаптивной скоростью (AIMD)"""
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        burst: Optional[float] = None,
+        increase_step: float = 0.1,
+        decrease_factor: float = 0.5
+    ):
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError("Должно выполняться 0 < min_rate <= rate <= max_rate")
+
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self.throttled_count = 0
+
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Пополнение токенов за прошедшее время"""
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Блокирующее получение разрешения на один запрос"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def on_success(self):
+        """Успешный ответ: плавное увеличение скорости"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Ответ 429/503: снижение скорости и пауза на Retry-After"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttled_count += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._tokens = 0.0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+        logger.warning(
+            f"Confluence ограничивает частоту запросов, скорость снижена до {self.rate:.2f} req/s"
+            + (f", пауза {retry_after:.1f} с" if retry_after else "")
+        )
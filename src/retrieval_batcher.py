@@ -0,0 +1,137 @@
+"""
+Исполнитель поиска для QA-сервиса: эмбеддинги вопросов и поиск в векторном хранилище
+выполняются вне event loop.
+
+Вопросы, пришедшие одновременно, собираются в течение короткого окна и кодируются
+моделью одним пакетом (один вызов embed_documents вместо N вызовов embed_query),
+поиск по хранилищу выполняется в ограниченном пуле потоков. Event loop uvicorn
+при этом не блокируется и продолжает обслуживать остальные запросы, включая /health.
+"""
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalBatcher:
+    """Пакетное кодирование вопросов и пул потоков для поиска"""
+
+    def __init__(
+        self,
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        search_workers: int
+    ):
+        self.embed_documents = embed_documents
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.search_workers = max(1, search_workers)
+
+        # Модель кодирует пакеты по одному: параллельные вызовы только делят между собой ядра
+        self._embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-embed")
+        self._search_executor = ThreadPoolExecutor(max_workers=self.search_workers, thread_name_prefix="qa-search")
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.embedded = 0
+        self.max_batch_seen = 0
+
+    @property
+    def warm(self) -> bool:
+        """Модель уже закодировала хотя бы один пакет (первый вызов включает ее прогрев)"""
+        return self.batches > 0
+
+    def _ensure_started(self):
+        """Запуск цикла сбора пакетов в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def embed(self, text: str) -> List[float]:
+        """Эмбеддинг вопроса (в составе пакета одновременных вопросов)"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги списка вопросов одним вызовом модели (в очереди с пакетами одиночных вопросов)"""
+        vectors = await asyncio.get_running_loop().run_in_executor(self._embed_executor, self.embed_documents, texts)
+        self.batches += 1
+        self.embedded += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        return vectors
+
+    async def search(self, search: Callable, *args):
+        """Поиск в векторном хранилище в пуле потоков"""
+        return await asyncio.get_running_loop().run_in_executor(self._search_executor, search, *args)
+
+    async def _batch_loop(self):
+        """Сбор вопросов в пакеты: до max_batch_size вопросов или max_wait после первого"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    # Окно истекло: забираем то, что уже в очереди, без ожидания
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except asyncio.QueueEmpty:
+                        break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Отмененные запросы не кодируются
+            batch = [(text, future) for text, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self._embed_executor, self.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.embedded += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self) -> dict:
+        """Статистика пакетов"""
+        return {
+            "batches": self.batches,
+            "embedded": self.embedded,
+            "avg_batch_size": round(self.embedded / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen
+        }
+
+    async def close(self):
+        """Остановка цикла и пулов потоков"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._embed_executor.shutdown(wait=False, cancel_futures=True)
+        self._search_executor.shutdown(wait=False, cancel_futures=True)
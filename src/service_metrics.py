@@ -0,0 +1,336 @@
+"""
+Метрики QA-сервиса в текстовом формате Prometheus (GET /metrics).
+
+Без внешних зависимостей: счетчики, gauge и гистограммы с фиксированными корзинами.
+Наблюдение - поиск корзины и несколько сложений, поэтому инструментирование
+включено всегда. Значения обновляются из event loop, экспорт выполняется там же,
+поэтому блокировки не нужны. Метрики, которые уже считают другие компоненты
+(кеш ответов, пакеты эмбеддингов, состояние запуска), читаются при экспорте
+функциями-коллекторами и не стоят ничего на пути запроса.
+"""
+
+import math
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Корзины задержек этапов: от миллисекунды (поиск) до десятков секунд (LLM)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CHUNK_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 16, 20, 32)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1000, 1500, 2000, 3000, 4000, 8000)
+
+# (метки, значение) одного отсчета метрики коллектора
+Sample = Tuple[Dict[str, str], float]
+# (имя, тип, описание, отсчеты) метрики коллектора
+CollectedMetric = Tuple[str, str, str, List[Sample]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    async def timed(self, awaitable: Awaitable[T]) -> T:
+        """Ожидание с записью длительности (и при ошибке)"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    """Метрика с набором меток; дочерние значения создаются при первом обращении к сочетанию меток"""
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Значение для сочетания меток; на горячем пути его стоит получить заранее"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name}: ожидаются метки {self.label_names}, получено {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _lines(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._lines()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _lines(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(dict(zip(self.label_names, values)))} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _lines(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(dict(zip(self.label_names, values)))} {_format_value(child.value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _lines(self) -> Iterator[str]:
+        for values, child in self._children.items():
+            labels = dict(zip(self.label_names, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}"
+            yield f"{self.name}_count{_format_labels(labels)} {child.count}"
+
+
+class MetricsRegistry:
+    """Набор метрик и коллекторов, экспортируемых одним ответом /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[CollectedMetric]]] = []
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[CollectedMetric]]):
+        """Функция, возвращающая метрики на момент экспорта"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, description, samples in collector():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def error_type(error: BaseException) -> str:
+    """Метка типа ошибки: класс исключения, для HTTP-ошибок - код ответа"""
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        # Клиент отключился, не дождавшись ответа
+        return "cancelled"
+    status_code = getattr(error, "status_code", None)
+    if type(error).__name__ == "HTTPException" and status_code is not None:
+        return f"http_{status_code}"
+    return type(error).__name__
+
+
+class QAMetrics:
+    """Метрики пути запроса QA-сервиса: этапы, токены LLM, объем контекста, запросы и ошибки"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+
+        stages = self.registry.histogram(
+            "qa_stage_duration_seconds",
+            "Длительность этапов ответа на вопрос",
+            ("stage",)
+        )
+        # Значения для меток получаются один раз: на горячем пути нет поиска по словарю
+        self.embed = stages.labels("embed")
+        self.vector_search = stages.labels("vector_search")
+        self.lexical_search = stages.labels("lexical_search")
+        self.context = stages.labels("context")
+        self.extract = stages.labels("extract")
+        self.llm_first_token = stages.labels("llm_first_token")
+        self.llm_total = stages.labels("llm_total")
+
+        self.requests = self.registry.histogram(
+            "qa_request_duration_seconds",
+            "Длительность обработки запроса",
+            ("endpoint",)
+        )
+        self.in_flight = self.registry.gauge(
+            "qa_requests_in_flight",
+            "Запросы в обработке",
+            ("endpoint",)
+        )
+        self.errors = self.registry.counter(
+            "qa_errors_total",
+            "Ошибки обработки запросов по типу",
+            ("endpoint", "type")
+        )
+        self.extractive_answers = self.registry.counter(
+            "qa_extractive_answers_total",
+            "Ответы найденными фрагментами без LLM: запрошены, уверенный поиск (auto), LLM недоступна (fallback)",
+            ("reason",)
+        )
+        self.coalesced = self.registry.counter(
+            "qa_coalesced_requests_total",
+            "Запросы, получившие ответ уже выполнявшегося одинакового запроса",
+            ("endpoint",)
+        )
+
+        tokens = self.registry.counter(
+            "qa_llm_tokens_total",
+            "Токены LLM (по данным API, без них - оценка токенизатором)",
+            ("kind",)
+        )
+        self.prompt_tokens = tokens.labels("prompt")
+        self.completion_tokens = tokens.labels("completion")
+
+        self.llm_queue_wait = self.registry.histogram(
+            "qa_llm_queue_wait_seconds",
+            "Ожидание в очереди к LLM по приоритету",
+            ("lane",)
+        )
+        self.llm_rejected = self.registry.counter(
+            "qa_llm_rejected_total",
+            "Вопросы, не допущенные к LLM: очередь заполнена (queue_full) или срок не выдержан (deadline)",
+            ("lane", "reason")
+        )
+
+        self.retrieved_chunks = self.registry.histogram(
+            "qa_retrieved_chunks",
+            "Найденных чанков на вопрос по режиму поиска",
+            ("mode",),
+            CHUNK_BUCKETS
+        )
+        self.context_tokens = self.registry.histogram(
+            "qa_context_tokens",
+            "Токенов контекста, переданного LLM",
+            buckets=TOKEN_BUCKETS
+        ).labels()
+
+    @contextmanager
+    def track(self, endpoint: str):
+        """Учет запроса: в обработке, длительность и ошибки по типу"""
+        in_flight = self.in_flight.labels(endpoint)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.errors.labels(endpoint, error_type(e)).inc()
+            raise
+        finally:
+            in_flight.dec()
+            self.requests.labels(endpoint).observe(time.perf_counter() - started)
@@ -0,0 +1,117 @@
+"""
+Объединение одновременных одинаковых запросов (single flight).
+
+Первый запрос с данным ключом запускает работу отдельной задачей, запросы с тем же
+ключом, пришедшие до ее завершения, получают тот же результат вместо повторного
+поиска и вызова LLM. Ключ удаляется сразу по завершении работы: это не кеш,
+вопрос, заданный после ответа, обрабатывается заново (ответы на близкие вопросы
+хранит семантический кеш). Ошибку работы получают все ожидающие ее запросы.
+Работа не привязана к клиенту, который ее запустил: она отменяется, только когда
+отключились все ожидающие клиенты.
+
+Для потоковых ответов события сохраняются по мере получения: присоединившийся
+запрос сначала получает уже отправленные события, затем новые вместе с остальными.
+"""
+
+import asyncio
+import unicodedata
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_question(text: str) -> str:
+    """Вопрос для ключа объединения: NFC, без учета регистра и повторяющихся пробельных символов"""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+class _Flight:
+    """Выполняющаяся работа: задача, число ожидающих и (для потока) полученные события"""
+
+    __slots__ = ("task", "waiters", "events", "changed")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.events: List[Any] = []
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        """Пробуждение ожидающих новых событий (новое событие для следующего ожидания)"""
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Выполняющиеся работы по ключу; используется из одного event loop, блокировки не нужны"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Работа с этим ключом уже выполняется (запрос с ним присоединится к ней)"""
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """Результат работы; работа запускается, если с таким ключом она еще не выполняется"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, lambda _: work())
+        flight.waiters += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет работу для остальных
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(key, flight)
+
+    async def stream(self, key: Hashable, work: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """События потоковой работы с первого; работа запускается, если с таким ключом она еще не выполняется"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, lambda started: self._collect(started, work()))
+        flight.waiters += 1
+        try:
+            index = 0
+            while True:
+                while index < len(flight.events):
+                    yield flight.events[index]
+                    index += 1
+                if flight.task.done():
+                    # Ошибка работы передается после уже полученных событий
+                    flight.task.result()
+                    return
+                await flight.changed.wait()
+        finally:
+            self._leave(key, flight)
+
+    @staticmethod
+    async def _collect(flight: _Flight, events: AsyncIterator[Any]):
+        """Сбор событий потоковой работы для всех ожидающих"""
+        try:
+            async for event in events:
+                flight.events.append(event)
+                flight.notify()
+        finally:
+            flight.notify()
+
+    def _start(self, key: Hashable, work: Callable[[_Flight], Awaitable]) -> _Flight:
+        flight = _Flight()
+        flight.task = asyncio.ensure_future(work(flight))
+        self._flights[key] = flight
+        flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        return flight
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        # Ключ мог уже занять новый запрос, если эту работу отменили
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _leave(self, key: Hashable, flight: _Flight):
+        """Уход ожидающего; работа без ожидающих отменяется"""
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            self._forget(key, flight)
+            flight.task.cancel()
@@ -6,14 +6,16 @@ Slack-бот для ответов на вопросы по документац
 
 import os
 import re
+import json
 import logging
 import asyncio
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any, Tuple
 
 import aiohttp
 from dotenv import load_dotenv
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.errors import SlackApiError
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,6 +28,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class QAServiceBusy(Exception):
+    """QA-сервис отказал из-за перегрузки (429/503) или не уложился в срок запроса (504)"""
+    
+    def __init__(self, status: int, retry_after: Optional[str] = None):
+        super().__init__(f"HTTP {status}" + (f", Retry-After: {retry_after} с" if retry_after else ""))
+        self.status = status
+        self.retry_after = retry_after
+
+
 class ConfluenceQABot:
     """Slack-бот для работы с документацией Confluence"""
     
@@ -39,6 +50,14 @@ class ConfluenceQABot:
         
         # URL QA-сервиса
         self.qa_service_url = os.getenv("QA_SERVICE_URL", "http://localhost:8000")
+        # Срок ответа: передается сервису (X-Request-Timeout), HTTP-клиент ждет чуть дольше,
+        # чтобы получить от сервиса 504 вместо обрыва соединения
+        self.qa_timeout = float(os.getenv("QA_SERVICE_TIMEOUT", "60"))
+        
+        # Потоковый ответ: сообщение обновляется по мере генерации, не чаще раза в SLACK_UPDATE_INTERVAL секунд
+        # (chat.update ограничен Slack примерно одним вызовом в секунду на сообщение)
+        self.stream_answers = os.getenv("SLACK_STREAM_ANSWERS", "true").lower() == "true"
+        self.update_interval = float(os.getenv("SLACK_UPDATE_INTERVAL", "1.0"))
         
         # Инициализация Slack App
         self.app = AsyncApp(token=self.slack_bot_token)
@@ -70,8 +89,8 @@ class ConfluenceQABot:
                     thread_ts=message.get("ts")
                 )
                 
-                # Получение ответа от QA-сервиса
-                answer = await self._get_answer(question)
+                # Получение ответа от QA-сервиса (с промежуточными обновлениями сообщения)
+                answer = await self._answer_into_message(question, channel_id, thinking_message["ts"])
                 
                 # Форматирование ответа
                 if answer:
@@ -123,7 +142,7 @@ class ConfluenceQABot:
                         thread_ts=event.get("ts")
                     )
                     
-                    answer = await self._get_answer(question)
+                    answer = await self._answer_into_message(question, event["channel"], thinking_message["ts"])
                     
                     if answer:
                         response_text = self._format_response(question, answer)
@@ -169,21 +188,130 @@ class ConfluenceQABot:
                 thread_ts=message.get("ts")
             )
     
+    async def _answer_into_message(self, question: str, channel: str, ts: str) -> Optional[str]:
+        """
+        Получить ответ, показывая его в сообщении по мере генерации.
+        Если потоковый ответ недоступен, используется обычный запрос /ask.
+        """
+        if self.stream_answers:
+            try:
+                answer = await self._stream_into_message(question, channel, ts)
+            except (QAServiceBusy, asyncio.TimeoutError) as e:
+                # Повтор через /ask при перегрузке только добавит нагрузки и ожидания в треде
+                logger.warning(f"QA-сервис не ответил вовремя или перегружен: {e!r}")
+                return None
+            if answer is not None:
+                return answer
+            logger.warning("Потоковый ответ недоступен, используется /ask")
+            
+        return await self._get_answer(question)
+        
+    async def _stream_into_message(self, question: str, channel: str, ts: str) -> Optional[str]:
+        """Потоковый ответ с обновлением сообщения; None, если поток не удалось получить полностью"""
+        loop = asyncio.get_running_loop()
+        parts = []
+        next_update = 0.0
+        
+        try:
+            async for event, data in self._stream_answer(question):
+                if event == "retrieval" and not data.get("cached"):
+                    await self._update_progress(
+                        channel, ts, f"📚 Найдено фрагментов: {data.get('documents', 0)}, формирую ответ..."
+                    )
+                    
+                elif event == "token":
+                    parts.append(data.get("text", ""))
+                    # Первый фрагмент показывается сразу, следующие - не чаще update_interval
+                    now = loop.time()
+                    if now >= next_update:
+                        partial = self._format_response(question, "".join(parts) + " ▌")
+                        next_update = now + await self._update_progress(channel, ts, partial)
+                        
+                elif event == "done":
+                    return data.get("answer", "".join(parts))
+                    
+                elif event == "error":
+                    logger.error(f"Ошибка потоковой генерации ответа: {data.get('detail')}")
+                    if data.get("status") in (429, 503, 504):
+                        raise QAServiceBusy(data["status"], data.get("retry_after"))
+                    return None
+                    
+        except (QAServiceBusy, asyncio.TimeoutError):
+            raise
+        except aiohttp.ClientError as e:
+            logger.error(f"Ошибка подключения к QA-сервису: {e}")
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка потокового ответа: {e}")
+            
+        return None
+        
+    async def _update_progress(self, channel: str, ts: str, text: str) -> float:
+        """
+        Промежуточное обновление сообщения.
+        Возвращает паузу до следующего обновления: update_interval или Retry-After при ограничении частоты.
+        """
+        try:
+            await self.app.client.chat_update(channel=channel, ts=ts, text=text)
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                retry_after = float(e.response.headers.get("Retry-After", self.update_interval))
+                logger.warning(f"Slack ограничил частоту chat.update, пауза {retry_after} с")
+                return max(retry_after, self.update_interval)
+            # Промежуточное обновление не обязательно, итоговый ответ будет отправлен в любом случае
+            logger.warning(f"Не удалось обновить сообщение: {e.response.get('error')}")
+        return self.update_interval
+        
+    def _get_session(self) -> aiohttp.ClientSession:
+        """HTTP сессия для запросов к QA-сервису (создается при первом запросе)"""
+        if not self.http_session:
+            timeout = aiohttp.ClientTimeout(total=self.qa_timeout + 5, sock_connect=5)
+            self.http_session = aiohttp.ClientSession(timeout=timeout)
+        return self.http_session
+        
+    def _request_headers(self) -> Dict[str, str]:
+        """Приоритет и срок запроса для очереди к LLM в QA-сервисе"""
+        return {"X-Request-Priority": "interactive", "X-Request-Timeout": str(self.qa_timeout)}
+        
+    async def _stream_answer(self, question: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """События Server-Sent Events из /ask/stream: (имя события, данные)"""
+        url = f"{self.qa_service_url}/ask/stream"
+        async with self._get_session().post(url, json={"text": question}, headers=self._request_headers()) as response:
+            if response.status in (429, 503):
+                raise QAServiceBusy(response.status, response.headers.get("Retry-After"))
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"Ошибка QA-сервиса: {response.status} - {error_text}")
+                return
+                
+            event, data_lines = "message", []
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if not line:
+                    # Пустая строка завершает событие
+                    if data_lines:
+                        yield event, json.loads("\n".join(data_lines))
+                    event, data_lines = "message", []
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].lstrip())
+                    
     async def _get_answer(self, question: str) -> Optional[str]:
         """Получить ответ от QA-сервиса"""
         try:
-            # Создание HTTP сессии если её нет
-            if not self.http_session:
-                self.http_session = aiohttp.ClientSession()
-            
             # Запрос к QA-сервису
             url = f"{self.qa_service_url}/ask"
             payload = {"text": question}
             
-            async with self.http_session.post(url, json=payload) as response:
+            async with self._get_session().post(url, json=payload, headers=self._request_headers()) as response:
                 if response.status == 200:
                     data = await response.json()
                     return data.get("answer")
+                elif response.status in (429, 503, 504):
+                    logger.warning(
+                        f"QA-сервис перегружен: {response.status}, Retry-After: {response.headers.get('Retry-After')}"
+                    )
+                    return None
                 else:
                     error_text = await response.text()
                     logger.error(f"Ошибка QA-сервиса: {response.status} - {error_text}")
@@ -192,6 +320,9 @@ class ConfluenceQABot:
         except aiohttp.ClientError as e:
             logger.error(f"Ошибка подключения к QA-сервису: {e}")
             return None
+        except asyncio.TimeoutError:
+            logger.error(f"QA-сервис не ответил за {self.qa_timeout} с")
+            return None
         except Exception as e:
             logger.error(f"Неожиданная ошибка при запросе к QA-сервису: {e}")
             return None
@@ -246,11 +377,8 @@ class ConfluenceQABot:
     async def _check_qa_service(self):
         """Проверка доступности QA-сервиса"""
         try:
-            if not self.http_session:
-                self.http_session = aiohttp.ClientSession()
-            
             url = f"{self.qa_service_url}/health"
-            async with self.http_session.get(url) as response:
+            async with self._get_session().get(url) as response:
                 if response.status == 200:
                     data = await response.json()
                     if data.get("status") == "healthy":
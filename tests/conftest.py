@@ -0,0 +1,67 @@
+"""Общие настройки тестов: модули src и scripts импортируются из корня репозитория"""
+
+import os
+import sys
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class HashEmbeddings:
+    """Детерминированные эмбеддинги по хешу текста: индексация без загрузки модели"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:16]]
+
+
+@pytest.fixture
+def fake_confluence():
+    """Фейковый Confluence (scripts/fake_confluence.py) в потоке теста: пространство FAKE из 6 страниц"""
+    from scripts.fake_confluence import FakeSpace, make_handler
+
+    space = FakeSpace("FAKE", 6)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(space, 0, None, 1))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    space.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield space
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_ingester(fake_confluence, tmp_path, monkeypatch):
+    """Фабрика ConfluenceIngester над фейковым Confluence и каталогом теста"""
+    import src.ingest_with_report as ingest
+
+    monkeypatch.setattr(ingest, "create_embeddings", lambda *args, **kwargs: HashEmbeddings())
+    env = {
+        "CF_URL": fake_confluence.url,
+        "CF_USER": "user",
+        "CF_TOKEN": "token",
+        "CF_SPACE": "FAKE",
+        "CF_PAGES": "",
+        "CF_RATE_LIMIT": "1000",
+        "CF_RATE_LIMIT_MAX": "1000",
+        "VECTOR_STORE_PATH": str(tmp_path / "vector_store"),
+        "REPORT_DIR": str(tmp_path / "report"),
+        "INGEST_TELEMETRY": "false",
+        "INGEST_CHECKPOINT_INTERVAL": "1",
+    }
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    def make(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setenv(name, value)
+        return ingest.ConfluenceIngester()
+
+    return make
@@ -0,0 +1,80 @@
+"""Допуск вызовов LLM: быстрый отказ, приоритеты и сроки"""
+
+import time
+import asyncio
+
+import pytest
+
+from src.admission import AdmissionRejected, LLMAdmission
+
+
+def test_expired_deadline_rejected_with_free_slot():
+    async def scenario():
+        admission = LLMAdmission(limit=2, max_queue=2)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("interactive", deadline=time.monotonic() - 0.1)
+        assert (rejected.value.status_code, rejected.value.reason) == (503, "deadline")
+        assert admission.active == 0
+
+        assert await admission.acquire("interactive", deadline=time.monotonic() + 5) == 0.0
+        assert admission.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_full_rejected():
+    async def scenario():
+        admission = LLMAdmission(limit=1, max_queue=1)
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+
+        admission.release()
+        await waiter
+        admission.release()
+        assert admission.active == 0 and admission.depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_interactive_before_batch():
+    async def scenario():
+        admission = LLMAdmission(limit=1, max_queue=4)
+        await admission.acquire()
+        order = []
+
+        async def call(lane):
+            await admission.acquire(lane, bounded=False)
+            order.append(lane)
+            admission.release()
+
+        batch = asyncio.ensure_future(call("batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(call("interactive"))
+        await asyncio.sleep(0)
+        admission.release()
+        await asyncio.gather(batch, interactive)
+        assert order == ["interactive", "batch"]
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_deadline_expires_in_queue():
+    async def scenario():
+        admission = LLMAdmission(limit=1, max_queue=4, expected_llm_seconds=0.01)
+        await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(deadline=time.monotonic() + 0.05)
+        assert rejected.value.reason == "deadline"
+        assert admission.depth == 0
+
+        # Освобожденный слот не достается отказавшемуся
+        admission.release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+"""Семантический кеш ответов: близкие вопросы, привязка к версии индекса и к k"""
+
+from src.answer_cache import SemanticAnswerCache
+
+QUESTION = [1.0, 0.0, 0.0]
+NEAR_DUPLICATE = [0.99, 0.05, 0.0]
+OTHER_QUESTION = [0.0, 1.0, 0.0]
+
+
+def make_cache(**kwargs):
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=0, max_entries=10, **kwargs)
+    cache.load("A")
+    return cache
+
+
+def test_near_duplicate_hits_only_same_version_and_k():
+    cache = make_cache()
+    cache.put("Где health endpoint?", QUESTION, "GET /health", 5, "A", 2.0)
+
+    entry = cache.get(NEAR_DUPLICATE, 5, "A")
+    assert entry is not None and entry.answer == "GET /health"
+    assert cache.get(OTHER_QUESTION, 5, "A") is None
+    assert cache.get(QUESTION, 3, "A") is None
+
+    # Новая версия индекса: ответы прежней версии не отдаются и удаляются
+    assert cache.get(QUESTION, 5, "B") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.get(QUESTION, 5, "A") is None
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_answer_for_stale_version_is_not_stored():
+    cache = make_cache()
+    cache.get(QUESTION, 5, "B")
+    cache.put("Где health endpoint?", QUESTION, "GET /health", 5, "A", 2.0)
+    assert cache.stats()["entries"] == 0
+
+
+def test_persistent_cache_is_bound_to_version(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    cache = make_cache(path=path)
+    cache.put("Где health endpoint?", QUESTION, "GET /health", 5, "A", 2.0)
+
+    restarted = make_cache(path=path)
+    assert restarted.get(NEAR_DUPLICATE, 5, "A").answer == "GET /health"
+
+    reindexed = SemanticAnswerCache(threshold=0.95, ttl_seconds=0, max_entries=10, path=path)
+    reindexed.load("B")
+    assert reindexed.get(QUESTION, 5, "B") is None
+    assert make_cache(path=path).get(QUESTION, 5, "A") is None
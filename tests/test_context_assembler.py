@@ -0,0 +1,92 @@
+"""Сборка контекста: склейка соседних чанков, дубликаты и бюджет токенов"""
+
+import math
+
+import pytest
+from langchain_core.documents import Document
+
+from src.context_assembler import SEPARATOR, ContextAssembler, merge_overlap
+from src.qa_service import qa_service
+
+
+def count_tokens(text):
+    """Оценка токенов без словаря tiktoken (~3 символа на токен), как при недоступном токенизаторе"""
+    return math.ceil(len(text) / 3)
+
+
+@pytest.fixture
+def assembler():
+    assembler = ContextAssembler("gpt-4o-mini", chunk_overlap=20)
+    assembler._count_tokens = count_tokens
+    return assembler
+
+
+def hit(page_id, chunk_index, text, score, title="Страница"):
+    metadata = {"page_id": page_id, "chunk_index": chunk_index, "title": title, "url": f"https://wiki/{page_id}"}
+    return Document(page_content=text, metadata=metadata), score
+
+
+def test_merge_overlap_does_not_repeat_shared_text():
+    assert merge_overlap("первый чанк и общий хвост", "и общий хвост, второй чанк", 40) == (
+        "первый чанк и общий хвост, второй чанк"
+    )
+    # Совпадение короче _MIN_OVERLAP_CHARS не считается перекрытием
+    assert merge_overlap("конец abc", "abc начало", 40) == "конец abc\nabc начало"
+
+
+def test_adjacent_chunks_merge_without_overlap(assembler):
+    hits = [
+        hit("p1", 1, "и общий хвост, второй чанк", 0.2),
+        hit("p1", 0, "первый чанк и общий хвост", 0.3),
+        hit("p1", 3, "далекий чанк", 0.1),
+    ]
+    passages = assembler.merge(hits)
+    assert [(passage.first_index, passage.last_index) for passage in passages] == [(3, 3), (0, 1)]
+    assert passages[1].text == "первый чанк и общий хвост, второй чанк"
+    assert passages[1].chunks == [0, 1]
+    assert passages[1].score == 0.2
+
+
+def test_duplicate_texts_are_dropped(assembler):
+    hits = [hit("p1", 0, "одинаковый текст", 0.1), hit("p2", 5, "одинаковый текст", 0.2), hit("p3", 0, "другой", 0.3)]
+    passages = assembler.merge(hits)
+    assert [passage.page_id for passage in passages] == ["p1", "p3"]
+
+
+def test_small_budget_is_respected(assembler):
+    hits = [
+        hit("p1", 0, "а" * 90, 0.1),
+        hit("p2", 0, "б" * 300, 0.2),
+        hit("p3", 0, "короткий фрагмент", 0.3),
+    ]
+    context = assembler.assemble(hits, max_tokens=70)
+    assert context.tokens <= 70
+    assert count_tokens(context.text) <= 70
+    # Длинный второй фрагмент пропускается, более короткий третий еще помещается
+    assert [passage.page_id for passage in context.passages] == ["p1", "p3"]
+    assert context.dropped == 1
+    assert context.text.endswith(SEPARATOR + "[Страница: Страница] (https://wiki/p3)\nкороткий фрагмент")
+
+
+def test_top_passage_is_truncated_to_budget(assembler):
+    context = assembler.assemble([hit("p1", 0, "а" * 300, 0.1), hit("p2", 0, "б", 0.2)], max_tokens=40)
+    assert context.tokens <= 40
+    assert [passage.page_id for passage in context.passages] == ["p1"]
+    assert context.text.startswith("[Страница: Страница] (https://wiki/p1)\nааа")
+    assert count_tokens(context.text) == 40
+
+
+def test_zero_budget_keeps_everything(assembler):
+    hits = [hit(f"p{i}", 0, "текст " * 200 + str(i), i / 10) for i in range(5)]
+    context = assembler.assemble(hits, max_tokens=0)
+    assert len(context.passages) == 5
+    assert context.dropped == 0
+    assert context.text.count(SEPARATOR) == 4
+
+
+def test_request_k_is_bounded(monkeypatch):
+    monkeypatch.setattr(qa_service, "retriever_k", 5)
+    monkeypatch.setattr(qa_service, "retriever_max_k", 20)
+    assert qa_service._new_question("вопрос", None, None, None).k == 5
+    assert qa_service._new_question("вопрос", 8, None, None).k == 8
+    assert qa_service._new_question("вопрос", 100, None, None).k == 20
@@ -0,0 +1,52 @@
+"""Совпадение эмбеддингов ONNX с эталоном huggingface на корпусе scripts/fixtures/embedding_parity.json"""
+
+import os
+
+import numpy as np
+import pytest
+
+from scripts.validate_embeddings import compare, load_backend, load_corpus
+
+MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+K = 3
+
+
+def encode(spec, texts):
+    """Векторы корпуса; без модели (нет пакетов, файла ONNX или доступа к Hugging Face) тест пропускается"""
+    try:
+        embeddings = load_backend(spec, MODEL, os.getenv("EMBEDDING_ONNX_PATH", ""))
+    except Exception as e:
+        pytest.skip(f"Модель {spec} недоступна: {e}")
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def test_compare_metrics():
+    corpus = {
+        "doc_ids": ["a", "b"],
+        "documents": ["a", "b"],
+        "queries": ["про a"],
+        "relevant": [["a"]],
+    }
+    reference = np.array([[1.0, 0.0], [0.0, 1.0], [0.9, 0.1]])
+    candidate = np.array([[1.0, 0.0], [0.0, 1.0], [0.1, 0.9]])
+
+    metrics = compare(reference, candidate, corpus, k=1)
+    assert metrics["reference_recall"] == 1.0
+    assert metrics["candidate_recall"] == 0.0
+    assert metrics["top1"] == 0.0
+    assert metrics["min_cosine"] < 0.5
+
+
+def test_onnx_recall_matches_reference():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("sentence_transformers")
+
+    corpus = load_corpus()
+    texts = corpus["documents"] + corpus["queries"]
+    candidate = encode("onnx", texts)
+    reference = encode("huggingface", texts)
+    assert reference.shape == candidate.shape
+
+    metrics = compare(reference, candidate, corpus, K)
+    assert metrics["min_cosine"] >= 0.98
+    assert metrics["candidate_recall"] >= metrics["reference_recall"]
@@ -0,0 +1,171 @@
+"""Извлекающие ответы: предложения, подсветка, порог режима auto и ответ фрагментами без LLM"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.admission import AdmissionRejected
+from src.context_assembler import Passage
+from src.extractive import DEGRADED_NOTE, NOT_FOUND, ExtractiveAnswer, ExtractiveAnswerer, split_sentences
+from src.qa_service import app, qa_service
+
+QUESTION = "где health endpoint"
+
+
+def passage(text, title="Страница", url="https://wiki/page"):
+    return Passage(
+        page_id=title, first_index=0, last_index=0, text=text,
+        metadata={"title": title, "url": url}, score=1.0, chunks=1
+    )
+
+
+def sentences(text):
+    return [text[start:end] for start, end in split_sentences(text)]
+
+
+def test_split_sentences():
+    text = "  Сервис запущен. Health endpoint: /health/ready!\nВерсия 1.2 вышла.  \n\n«Цитата» в конце  "
+    assert sentences(text) == [
+        "Сервис запущен.", "Health endpoint: /health/ready!", "Версия 1.2 вышла.", "«Цитата» в конце"
+    ]
+    # Точка без следующего предложения с заглавной буквы (сокращение, версия) - не граница
+    assert sentences("См. раздел про api.v2 и т.д. дальше") == ["См. раздел про api.v2 и т.д. дальше"]
+    assert split_sentences("  \n ") == []
+
+
+def test_highlight_is_best_sentence():
+    text = "Сервис пишет логи в stdout. Health endpoint отвечает на /health/ready. Где метрики - см. ниже."
+    answer = ExtractiveAnswerer().answer(QUESTION, [passage(text)])
+
+    extracted = answer.passages[0]
+    assert extracted.highlight == "Health endpoint отвечает на /health/ready."
+    assert extracted.score == pytest.approx(2 / 3, abs=1e-3)
+    assert answer.confidence == extracted.score
+    assert answer.text == f"{text}\n— Страница (https://wiki/page)"
+
+
+def test_long_highlight_is_truncated():
+    text = "Health endpoint " + "слово " * 100
+    extracted = ExtractiveAnswerer().answer(QUESTION, [passage(text)]).passages[0]
+    assert len(extracted.highlight) <= 400 + len(" …")
+    assert extracted.highlight.startswith("Health endpoint")
+    assert extracted.highlight.endswith(" …")
+
+
+def test_passages_reordered_by_best_sentence():
+    first = passage("Общее описание сервиса.", title="Обзор")
+    second = passage("Где health endpoint: /health/ready.", title="Проверки")
+    third = passage("Health проверяется балансировщиком.", title="Балансировщик")
+    answer = ExtractiveAnswerer(max_passages=2).answer(QUESTION, [first, second, third])
+
+    assert [extracted.title for extracted in answer.passages] == ["Проверки", "Балансировщик"]
+    assert answer.confidence == 1.0
+
+
+def test_not_found_and_degraded_note():
+    assert ExtractiveAnswerer().answer(QUESTION, []).text == NOT_FOUND
+
+    degraded = ExtractiveAnswerer().answer(QUESTION, [passage("Health endpoint: /health/ready.")], degraded=True)
+    assert degraded.text.startswith(DEGRADED_NOTE + "\n\n")
+
+
+@pytest.fixture
+def extracting_service(monkeypatch):
+    """Сервис, где вопрос уже найден (фрагмент контекста) и извлекающий ответ имеет заданную уверенность"""
+    confidence = SimpleNamespace(value=1.0)
+
+    async def extract(prepared, degraded=False):
+        answer = ExtractiveAnswerer().answer(prepared.question, prepared.context.passages, None, degraded)
+        return ExtractiveAnswer(answer.text, confidence.value, answer.passages)
+
+    monkeypatch.setattr(qa_service, "_extract", extract)
+    monkeypatch.setattr(qa_service, "extractive_auto_confidence", 0.9)
+    monkeypatch.setattr(qa_service, "extractive_fallback", True)
+    return confidence
+
+
+def prepared_question(answer_mode):
+    prepared = qa_service._new_question(QUESTION, None, None, "v1")
+    qa_service._set_answer_mode(prepared, answer_mode)
+    prepared.context = SimpleNamespace(passages=[passage("Health endpoint: /health/ready.")])
+    return prepared
+
+
+@pytest.mark.parametrize("answer_mode, confidence, extractive", [
+    ("auto", 0.9, True),
+    ("auto", 0.95, True),
+    ("auto", 0.89, False),
+    ("extractive", 0.1, True),
+    ("llm", 1.0, False),
+])
+def test_auto_mode_threshold(extracting_service, answer_mode, confidence, extractive):
+    extracting_service.value = confidence
+    answer = asyncio.run(qa_service._extractive_first(prepared_question(answer_mode)))
+
+    if not extractive:
+        assert answer is None
+        return
+    assert answer.mode == "extractive"
+    assert answer.confidence == confidence
+    assert not answer.degraded
+    assert "/health/ready" in answer.text
+
+
+def failing_llm(monkeypatch, error):
+    """Поиск находит фрагмент, вызов LLM завершается ошибкой"""
+    async def prepare(question, k, max_context_tokens, priority, deadline, answer_mode):
+        return prepared_question(answer_mode)
+
+    async def generate(prepared):
+        raise error
+
+    monkeypatch.setattr(qa_service, "_prepare", prepare)
+    monkeypatch.setattr(qa_service, "_generate", generate)
+
+
+def test_llm_error_falls_back_to_extractive_answer(extracting_service, monkeypatch):
+    failing_llm(monkeypatch, ConnectionError("все бэкенды недоступны"))
+    answer = asyncio.run(qa_service._ask(QUESTION, None, None, "interactive", None, "llm"))
+
+    assert answer.mode == "extractive"
+    assert answer.degraded
+    assert answer.text.startswith(DEGRADED_NOTE)
+
+
+def test_fallback_disabled_or_rejected_raises(extracting_service, monkeypatch):
+    failing_llm(monkeypatch, ConnectionError("все бэкенды недоступны"))
+    monkeypatch.setattr(qa_service, "extractive_fallback", False)
+    with pytest.raises(ConnectionError):
+        asyncio.run(qa_service._ask(QUESTION, None, None, "interactive", None, "llm"))
+
+    # Отказ по перегрузке - не недоступность LLM: клиент получает 429/503, а не фрагменты
+    monkeypatch.setattr(qa_service, "extractive_fallback", True)
+    failing_llm(monkeypatch, AdmissionRejected("queue_full", 429, 1, "очередь заполнена"))
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(qa_service._ask(QUESTION, None, None, "interactive", None, "llm"))
+
+
+def test_ask_endpoint_answers_with_passages_when_llm_is_down(monkeypatch):
+    async def run_inline(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(qa_service, "initialized", True)
+    monkeypatch.setattr(qa_service, "vector_store_error", None)
+    monkeypatch.setattr(qa_service, "startup_error", None)
+    monkeypatch.setattr(qa_service, "llm", object())
+    monkeypatch.setattr(qa_service, "retrieval", SimpleNamespace(warm=True, search=run_inline))
+    monkeypatch.setattr(qa_service, "doc_count", 10)
+    monkeypatch.setattr(qa_service, "lexical", None)
+    monkeypatch.setattr(qa_service, "extractive_fallback", True)
+    failing_llm(monkeypatch, ConnectionError("все бэкенды недоступны"))
+
+    response = TestClient(app).post("/ask", json={"text": QUESTION, "answer_mode": "llm"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["answer"].startswith(DEGRADED_NOTE)
+    assert body["answer_mode"] == "extractive"
+    assert body["degraded"] is True
+    assert body["confidence"] == pytest.approx(2 / 3, abs=1e-3)
+    assert body["passages"][0]["highlight"] == "Health endpoint: /health/ready."
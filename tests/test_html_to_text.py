@@ -0,0 +1,45 @@
+"""Эквивалентность конвертеров HTML → текст: BeautifulSoup и однопроходный lxml"""
+
+import random
+
+import pytest
+
+from scripts.benchmark_html_to_text import CORPUS, generate_fuzz, generate_page
+from src.html_to_text import get_html_converter, soup_html_to_text, stream_html_to_text
+
+pytestmark = pytest.mark.filterwarnings("ignore::bs4.XMLParsedAsHTMLWarning")
+
+
+@pytest.mark.parametrize("html", CORPUS, ids=range(len(CORPUS)))
+def test_corpus_equivalent(html):
+    assert stream_html_to_text(html) == soup_html_to_text(html)
+
+
+def test_fuzz_equivalent():
+    rnd = random.Random(42)
+    documents = [generate_fuzz(rnd) for _ in range(2000)]
+    mismatches = [html for html in documents if stream_html_to_text(html) != soup_html_to_text(html)]
+    assert mismatches == []
+
+
+def test_synthetic_pages_equivalent():
+    rnd = random.Random(7)
+    for _ in range(3):
+        html = generate_page(rnd, 10)
+        assert stream_html_to_text(html) == soup_html_to_text(html)
+
+
+def test_code_and_diagram_macros():
+    html = (
+        '<p>до</p><ac:structured-macro ac:name="code"><ac:plain-text-body>print(1)</ac:plain-text-body>'
+        '</ac:structured-macro><ac:structured-macro ac:name="plantuml"><ac:plain-text-body>A -&gt; B'
+        "</ac:plain-text-body></ac:structured-macro><p>после</p>"
+    )
+    expected = "до\n```\nprint(1)\n```\n[Диаграмма plantuml]\nA -> B\nпосле"
+    assert stream_html_to_text(html) == expected
+    assert soup_html_to_text(html) == expected
+
+
+def test_get_html_converter():
+    assert get_html_converter("lxml") is stream_html_to_text
+    assert get_html_converter("bs4") is soup_html_to_text
@@ -0,0 +1,55 @@
+"""Сборка версии индекса: неизменяемые файлы разделяются с текущей версией, изменяемые копируются"""
+
+import os
+
+from src.index_versions import IndexVersions, current_version
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def published_version(root):
+    versions = IndexVersions(str(root))
+    build = versions.prepare_build()
+    write(os.path.join(build, "chroma.sqlite3"), b"sqlite" * 1000)
+    write(os.path.join(build, "segment", "data_level0.bin"), b"hnsw" * 1000)
+    write(os.path.join(build, "lexical", "chunks.sqlite3"), b"chunks")
+    write(os.path.join(build, "lexical", "g1", "postings_docs.npy"), b"postings" * 1000)
+    write(os.path.join(build, "checkpoint", "state.json"), b"{}")
+    versions.publish(build)
+    return versions, build
+
+
+def test_build_links_immutable_files_and_copies_mutable(tmp_path):
+    versions, published = published_version(tmp_path)
+    build = versions.prepare_build()
+    assert build != published
+    assert current_version(str(tmp_path)) == os.path.basename(published)
+
+    postings = os.path.join("lexical", "g1", "postings_docs.npy")
+    assert os.path.samefile(os.path.join(published, postings), os.path.join(build, postings))
+
+    for name in ("chroma.sqlite3", os.path.join("segment", "data_level0.bin"), os.path.join("lexical", "chunks.sqlite3")):
+        assert not os.path.samefile(os.path.join(published, name), os.path.join(build, name))
+        assert read(os.path.join(published, name)) == read(os.path.join(build, name))
+    assert not os.path.exists(os.path.join(build, "checkpoint"))
+
+
+def test_build_changes_do_not_touch_published_version(tmp_path):
+    versions, published = published_version(tmp_path)
+    build = versions.prepare_build()
+
+    with open(os.path.join(build, "chroma.sqlite3"), "r+b") as f:
+        f.write(b"changed")
+    os.remove(os.path.join(build, "lexical", "g1", "postings_docs.npy"))
+
+    assert read(os.path.join(published, "chroma.sqlite3")) == b"sqlite" * 1000
+    assert read(os.path.join(published, "lexical", "g1", "postings_docs.npy")) == b"postings" * 1000
@@ -0,0 +1,93 @@
+"""Контрольные точки индексации: --resume обрабатывает заново страницы с ошибками"""
+
+import json
+
+import pytest
+
+import src.ingest_with_report as ingest
+
+FAILING_PAGE = "100002"
+
+
+def interrupt_run(monkeypatch, failing_page=None):
+    """Прерывание запуска перед завершением (как падение процесса) и ошибка обработки одной страницы"""
+    parse_content = ingest.ConfluenceIngester._parse_content
+
+    def failing_parse(self, work):
+        if work.page.page_id == failing_page:
+            raise RuntimeError("временная ошибка")
+        return parse_content(self, work)
+
+    def crash(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(ingest.ConfluenceIngester, "_parse_content", failing_parse)
+    monkeypatch.setattr(ingest.ConfluenceIngester, "_save_discovery_state", crash)
+
+
+def record_parsed(monkeypatch):
+    """Страницы, контент которых обрабатывается в запуске"""
+    parsed = []
+    parse_content = ingest.ConfluenceIngester._parse_content
+
+    def recording_parse(self, work):
+        parsed.append(work.page.page_id)
+        return parse_content(self, work)
+
+    monkeypatch.setattr(ingest.ConfluenceIngester, "_parse_content", recording_parse)
+    return parsed
+
+
+def checkpoint_results(ingester):
+    with open(ingester.checkpoint.results_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_failed_page_is_not_checkpointed(make_ingester, monkeypatch):
+    interrupted = make_ingester()
+    with monkeypatch.context() as patch:
+        interrupt_run(patch, FAILING_PAGE)
+        with pytest.raises(KeyboardInterrupt):
+            interrupted.run()
+
+    committed = {result["page_id"]: result for result in checkpoint_results(interrupted)}
+    assert len(committed) == 5
+    assert FAILING_PAGE not in committed
+    assert all(result["status"] == "success" for result in committed.values())
+
+    parsed = record_parsed(monkeypatch)
+    resumed = make_ingester()
+    resumed.run(resume=True)
+    assert set(resumed.restored_results) == set(committed)
+    assert parsed == [FAILING_PAGE]
+    assert resumed.manifest.get(FAILING_PAGE) is not None
+    assert resumed.vectorstore.get(where={"page_id": FAILING_PAGE}, include=[])["ids"]
+
+
+def test_resume_retries_errors_from_old_checkpoint(make_ingester, monkeypatch):
+    interrupted = make_ingester()
+    with monkeypatch.context() as patch:
+        interrupt_run(patch, FAILING_PAGE)
+        with pytest.raises(KeyboardInterrupt):
+            interrupted.run()
+
+    # Контрольная точка прежней версии фиксировала и результаты с ошибкой
+    results = checkpoint_results(interrupted)
+    results.append({
+        "page_id": FAILING_PAGE, "title": "", "url": "", "status": "skipped",
+        "error_type": "ProcessingError", "error_message": "временная ошибка", "chunks_count": None
+    })
+    with open(interrupted.checkpoint.results_path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+    with open(interrupted.checkpoint.state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    state["completed"] = len(results)
+    with open(interrupted.checkpoint.state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+    parsed = record_parsed(monkeypatch)
+    resumed = make_ingester()
+    resumed.run(resume=True)
+    assert FAILING_PAGE not in resumed.restored_results
+    assert len(resumed.restored_results) == 5
+    assert parsed == [FAILING_PAGE]
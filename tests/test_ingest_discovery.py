@@ -0,0 +1,65 @@
+"""Поиск страниц для индексации: полный обход, CQL-поиск изменений и плановая сверка"""
+
+import src.ingest_with_report as ingest
+
+
+def listed_pages(ingester):
+    """Страницы, которые запуск получит для обработки"""
+    return [page.page_id for page in ingester.iter_pages()]
+
+
+def test_delta_run_lists_only_changed_pages(make_ingester, fake_confluence):
+    first = make_ingester()
+    assert len(listed_pages(first)) == 6
+    assert first.full_listing
+    first.run()
+
+    fake_confluence.update("100003", {"body": {"storage": {"value": "<p>Новый текст</p>"}}})
+    created = fake_confluence.create("Новая страница", "<p>Текст новой страницы</p>")
+
+    second = make_ingester()
+    assert listed_pages(second) == ["100003", created["id"]]
+    assert not second.full_listing
+    assert second.listing_complete
+
+
+def test_failed_run_does_not_advance_timestamp(make_ingester, fake_confluence, monkeypatch):
+    make_ingester().run()
+    fake_confluence.update("100001", {"body": {"storage": {"value": "<p>Новый текст</p>"}}})
+
+    parse_content = ingest.ConfluenceIngester._parse_content
+
+    def failing_parse(self, work):
+        if work.page.page_id == "100001":
+            raise RuntimeError("временная ошибка")
+        return parse_content(self, work)
+
+    failed = make_ingester()
+    last_run_started_at = failed.manifest.meta["last_run_started_at"]
+    with monkeypatch.context() as patch:
+        patch.setattr(ingest.ConfluenceIngester, "_parse_content", failing_parse)
+        failed.run()
+    assert failed.manifest.meta["last_run_started_at"] == last_run_started_at
+
+    # Следующий запуск повторяет то же окно и получает страницу с ошибкой снова
+    retry = make_ingester()
+    assert retry.manifest.meta["last_run_started_at"] == last_run_started_at
+    assert listed_pages(retry) == ["100001"]
+
+
+def test_forced_reconcile_removes_deleted_page(make_ingester, fake_confluence):
+    make_ingester().run()
+    fake_confluence.delete("100004")
+
+    # Поиск изменений удаленную страницу не видит, она остается в индексе
+    delta = make_ingester()
+    delta.run()
+    assert not delta.full_listing
+    assert delta.manifest.get("100004") is not None
+
+    reconcile = make_ingester(INGEST_FULL_RECONCILE_HOURS="0")
+    reconcile.run()
+    assert reconcile.full_listing
+    assert reconcile.manifest.get("100004") is None
+    assert not reconcile.vectorstore.get(where={"page_id": "100004"}, include=[])["ids"]
+    assert reconcile.manifest.get("100005") is not None
@@ -0,0 +1,85 @@
+"""Лексический индекс BM25: компиляция поколений, инкрементальное удаление и слияние выдач RRF"""
+
+import os
+
+from langchain_core.documents import Document
+
+from src.lexical_index import LEXICAL_DIR, LexicalIndex, LexicalIndexWriter, tokenize
+from src.qa_service import QAService
+
+CHUNKS = {
+    "orders-0": ("orders", "Эндпоинт /api/v2/orders возвращает список заказов клиента."),
+    "orders-1": ("orders", "Заказы можно фильтровать по статусу и дате создания."),
+    "users-0": ("users", "Эндпоинт /api/v1/users возвращает список пользователей."),
+    "health-0": ("health", "Проверка состояния сервиса: GET /health отвечает статусом ok."),
+}
+
+
+def build_index(path):
+    writer = LexicalIndexWriter(str(path))
+    chunk_ids = list(CHUNKS)
+    writer.upsert(chunk_ids, [CHUNKS[chunk_id][0] for chunk_id in chunk_ids], [CHUNKS[chunk_id][1] for chunk_id in chunk_ids])
+    assert writer.compile() == 1
+    return writer
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("GET /api/v2/orders") == ["get", "api/v2/orders", "api", "v2", "orders"]
+
+
+def test_exact_identifier_ranks_first(tmp_path):
+    build_index(tmp_path).close()
+    index = LexicalIndex.open(str(tmp_path))
+
+    results = index.search("что возвращает /api/v2/orders", k=3)
+    assert results[0][0] == "orders-0"
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert len(results) <= 3
+    # Слово запроса есть у нескольких чанков: оценки накапливаются по всем словам
+    assert {chunk_id for chunk_id, _ in index.search("эндпоинт возвращает список", k=10)} == {"orders-0", "users-0"}
+    assert index.search("несуществующее", k=3) == []
+    index.close()
+
+
+def test_removed_page_is_dropped_while_old_generation_keeps_serving(tmp_path):
+    writer = build_index(tmp_path)
+    old = LexicalIndex.open(str(tmp_path))
+
+    writer.remove_page("orders", keep_ids=["orders-1"])
+    assert writer.compile() == 2
+    writer.close()
+
+    lexical_dir = os.path.join(str(tmp_path), LEXICAL_DIR)
+    assert sorted(name for name in os.listdir(lexical_dir) if name.startswith("g")) == ["g2"]
+
+    new = LexicalIndex.open(str(tmp_path))
+    assert new.doc_count == 3
+    assert "orders-0" not in [chunk_id for chunk_id, _ in new.search("/api/v2/orders", k=5)]
+    assert new.search("фильтровать заказы", k=1)[0][0] == "orders-1"
+
+    # Открытое поколение 1 удалено с диска, но читатель продолжает работать по своим файлам
+    assert old.search("/api/v2/orders", k=1)[0][0] == "orders-0"
+    old.close()
+    new.close()
+
+
+def test_unchanged_index_is_not_recompiled(tmp_path):
+    writer = build_index(tmp_path)
+    assert writer.compile() == 1
+    writer.close()
+
+
+def hit(page_id, chunk_index, text):
+    return Document(page_content=text, metadata={"page_id": page_id, "chunk_index": chunk_index}), 0.0
+
+
+def test_fuse_ranks_chunk_found_by_both_rankers_first():
+    both = hit("orders", 0, "Эндпоинт /api/v2/orders")
+    vector_only = hit("users", 0, "Пользователи")
+    lexical_only = hit("health", 0, "GET /health")
+    vector = [vector_only, both]
+    lexical = [lexical_only, both]
+
+    fused = QAService._fuse([vector, lexical], rrf_k=60)
+    assert [doc.metadata["page_id"] for doc, _ in fused] == ["orders", "users", "health"]
+    assert [rank for _, rank in fused] == [0.0, 1.0, 2.0]
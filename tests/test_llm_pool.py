@@ -0,0 +1,182 @@
+"""Пул LLM-бэкендов: хеджирование, переключение при ошибках и учет вызовов на фейковых моделях"""
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.runnables import Runnable
+
+from src.llm_pool import LLMBackend, LLMPool
+
+
+class StatusError(Exception):
+    """Ошибка API с HTTP-статусом, как у клиентов провайдеров"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeModel(Runnable):
+    """Модель с заданной задержкой ответа (первого фрагмента) и ошибкой"""
+
+    def __init__(self, name, delay=0.0, error=None, chunk_delay=0.0, chunks=3):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.calls = 0
+        self.cancelled = 0
+        self.closed = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        raise NotImplementedError
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+    async def astream(self, input, config=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            for i in range(self.chunks):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield f"{self.name}{i}"
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.closed += 1
+
+
+def make_pool(*models, warm_seconds=None, kind="latency", **kwargs):
+    """Пул над моделями; warm_seconds - замеры задержки бэкендов (порядок выбора и порог хеджа)"""
+    backends = [LLMBackend(model.name, model) for model in models]
+    for backend, seconds in zip(backends, warm_seconds or []):
+        for _ in range(20):
+            getattr(backend, kind).observe(seconds)
+    return LLMPool(backends, hedge_min_samples=20, **kwargs)
+
+
+def assert_idle(pool):
+    assert [backend.in_flight for backend in pool.backends] == [0] * len(pool.backends)
+
+
+def test_hedge_fires_after_percentile_and_cancels_loser():
+    slow, fast = FakeModel("slow", delay=1.0), FakeModel("fast", delay=0.01)
+    pool = make_pool(slow, fast, warm_seconds=[0.05, 0.1])
+
+    async def scenario():
+        started = time.monotonic()
+        result = await pool.ainvoke("вопрос")
+        # Проигравший вызов отменен к возврату ответа, а не при следующем шаге цикла событий
+        assert_idle(pool)
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "fast"
+    assert 0.05 <= elapsed < 0.5
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    assert slow.cancelled == 1
+    assert pool.backends[0].calls == {"ok": 0, "error": 0, "cancelled": 1}
+
+
+def test_no_hedge_when_answer_is_within_percentile():
+    first, second = FakeModel("first", delay=0.01), FakeModel("second")
+    pool = make_pool(first, second, warm_seconds=[0.2, 0.3])
+
+    assert asyncio.run(pool.ainvoke("вопрос")) == "first"
+    assert pool.hedges == 0
+    assert second.calls == 0
+    assert_idle(pool)
+
+
+def test_failover_on_retryable_error():
+    failing, healthy = FakeModel("failing", error=StatusError(503)), FakeModel("healthy")
+    pool = make_pool(failing, healthy, hedge_percentile=0)
+
+    assert asyncio.run(pool.ainvoke("вопрос")) == "healthy"
+    assert pool.failovers == 1
+    assert pool.backends[0].calls["error"] == 1
+    assert pool.backends[1].calls["ok"] == 1
+    assert_idle(pool)
+
+
+def test_not_retryable_error_is_raised():
+    failing, healthy = FakeModel("failing", error=StatusError(400)), FakeModel("healthy")
+    pool = make_pool(failing, healthy, hedge_percentile=0)
+
+    with pytest.raises(StatusError):
+        asyncio.run(pool.ainvoke("вопрос"))
+    assert healthy.calls == 0
+    assert pool.failovers == 0
+    assert_idle(pool)
+
+
+def test_backend_is_excluded_after_consecutive_errors():
+    failing, healthy = FakeModel("failing", error=StatusError(500)), FakeModel("healthy")
+    pool = make_pool(failing, healthy, hedge_percentile=0, failure_threshold=2)
+
+    for _ in range(2):
+        assert asyncio.run(pool.ainvoke("вопрос")) == "healthy"
+    assert not pool.backends[0].healthy
+    assert asyncio.run(pool.ainvoke("вопрос")) == "healthy"
+    assert failing.calls == 2
+
+
+def test_stream_hedges_only_until_first_token():
+    # Первый токен slow не приходит вовремя; fast отвечает, но дальше фрагменты идут медленнее порога хеджа
+    slow = FakeModel("slow", delay=1.0)
+    fast = FakeModel("fast", delay=0.01, chunk_delay=0.1)
+    spare = FakeModel("spare")
+    pool = make_pool(slow, fast, spare, warm_seconds=[0.05, 0.1, 0.2], kind="first_token")
+
+    async def scenario():
+        return [chunk async for chunk in pool.astream("вопрос")]
+
+    assert asyncio.run(scenario()) == ["fast0", "fast1", "fast2"]
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    assert spare.calls == 0
+    assert slow.cancelled == 1 and slow.closed == 1
+    assert fast.closed == 1
+    assert pool.backends[1].calls["ok"] == 1
+    assert_idle(pool)
+
+
+def test_stream_failover_before_first_token():
+    failing, healthy = FakeModel("failing", error=StatusError(502)), FakeModel("healthy")
+    pool = make_pool(failing, healthy, hedge_percentile=0)
+
+    async def scenario():
+        return [chunk async for chunk in pool.astream("вопрос")]
+
+    assert asyncio.run(scenario()) == ["healthy0", "healthy1", "healthy2"]
+    assert pool.failovers == 1
+    assert_idle(pool)
+
+
+def test_stream_client_disconnect_releases_backend():
+    model = FakeModel("model", chunk_delay=0.01)
+    pool = make_pool(model, hedge_percentile=0)
+
+    async def scenario():
+        stream = pool.astream("вопрос")
+        assert await stream.__anext__() == "model0"
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert pool.backends[0].calls["cancelled"] == 1
+    assert model.closed == 1
+    assert_idle(pool)
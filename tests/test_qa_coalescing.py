@@ -0,0 +1,101 @@
+"""Объединение одинаковых вопросов: приоритеты не смешиваются, чужой срок не приводит к отказу"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.admission import AdmissionRejected
+from src.qa_service import Answer, qa_service
+
+
+def rejects_short_deadline(calls):
+    """Ответ через 50 мс; срок короче секунды отклоняется, как при оценке ожидания в очереди к LLM"""
+
+    def check(priority, deadline):
+        calls.append((priority, deadline))
+        if deadline is not None and deadline - time.monotonic() < 1:
+            raise AdmissionRejected("deadline", 503, 1, "Срок запроса истечет в очереди к LLM")
+
+    return check
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Вызовы работы ответа (приоритет, срок) вместо поиска и LLM"""
+    calls = []
+    check = rejects_short_deadline(calls)
+
+    async def fake_ask(question, k, max_context_tokens, priority, deadline, answer_mode):
+        await asyncio.sleep(0.05)
+        check(priority, deadline)
+        return Answer(f"ответ {priority}")
+
+    async def fake_ask_stream(question, k, max_context_tokens, priority, deadline, answer_mode):
+        yield "retrieval", {"documents": 1}
+        await asyncio.sleep(0.05)
+        check(priority, deadline)
+        yield "token", {"text": "ответ"}
+        yield "done", {"answer": "ответ"}
+
+    monkeypatch.setattr(qa_service, "coalesce_requests", True)
+    monkeypatch.setattr(qa_service, "_ask", fake_ask)
+    monkeypatch.setattr(qa_service, "_ask_stream", fake_ask_stream)
+    return calls
+
+
+async def ask_after(delay, priority="interactive", deadline=None):
+    await asyncio.sleep(delay)
+    return await qa_service.ask("Где health endpoint?", priority=priority, deadline=deadline, answer_mode="llm")
+
+
+async def stream_after(delay, deadline=None):
+    await asyncio.sleep(delay)
+    events = qa_service.ask_stream("Где health endpoint?", deadline=deadline, answer_mode="llm")
+    return [name async for name, _ in events]
+
+
+def test_same_priority_is_coalesced(calls):
+    async def scenario():
+        return await asyncio.gather(ask_after(0), ask_after(0.01))
+
+    answers = asyncio.run(scenario())
+    assert [answer.text for answer in answers] == ["ответ interactive"] * 2
+    assert len(calls) == 1
+
+
+def test_priority_lanes_are_not_merged(calls):
+    async def scenario():
+        return await asyncio.gather(ask_after(0, "batch"), ask_after(0.01, "interactive"))
+
+    batch, interactive = asyncio.run(scenario())
+    assert (batch.text, interactive.text) == ("ответ batch", "ответ interactive")
+    assert sorted(priority for priority, _ in calls) == ["batch", "interactive"]
+
+
+def test_leader_deadline_rejection_is_not_shared(calls):
+    async def scenario():
+        short = time.monotonic() + 0.5
+        return await asyncio.gather(
+            ask_after(0, deadline=short), ask_after(0.01), ask_after(0.01, deadline=short),
+            return_exceptions=True
+        )
+
+    leader, unbounded, same_deadline = asyncio.run(scenario())
+    assert isinstance(leader, AdmissionRejected)
+    assert unbounded.text == "ответ interactive"
+    # Присоединившийся с тем же коротким сроком получает собственный отказ
+    assert isinstance(same_deadline, AdmissionRejected)
+    assert len(calls) == 3
+
+
+def test_stream_joiner_restarts_without_repeating_retrieval(calls):
+    async def scenario():
+        return await asyncio.gather(
+            stream_after(0, deadline=time.monotonic() + 0.5), stream_after(0.01), return_exceptions=True
+        )
+
+    leader, joiner = asyncio.run(scenario())
+    assert isinstance(leader, AdmissionRejected)
+    assert joiner == ["retrieval", "token", "done"]
+    assert [deadline for _, deadline in calls][1] is None
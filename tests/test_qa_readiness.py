@@ -0,0 +1,42 @@
+"""Готовность QA-сервиса: пустой индекс не отменяет готовность, вопросы получают 503"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.qa_service import app, qa_service
+
+
+@pytest.fixture
+def warm_service(monkeypatch):
+    """Проинициализированный сервис с прогретой моделью, без фоновой инициализации (lifespan)"""
+    monkeypatch.setattr(qa_service, "initialized", True)
+    monkeypatch.setattr(qa_service, "vector_store_error", None)
+    monkeypatch.setattr(qa_service, "startup_error", None)
+    monkeypatch.setattr(qa_service, "llm", object())
+    monkeypatch.setattr(qa_service, "retrieval", SimpleNamespace(warm=True))
+    return qa_service
+
+
+def test_empty_index_is_ready_but_ask_is_rejected(warm_service, monkeypatch):
+    monkeypatch.setattr(warm_service, "doc_count", 0)
+    client = TestClient(app)
+
+    ready = client.get("/health/ready")
+    assert ready.status_code == 200
+    assert ready.json()["documents"] == 0
+    assert ready.json()["vector_store_ready"] is False
+
+    response = client.post("/ask", json={"text": "где health endpoint"})
+    assert response.status_code == 503
+    assert "Индекс пуст" in response.json()["detail"]
+
+
+def test_not_ready_until_initialized(warm_service, monkeypatch):
+    monkeypatch.setattr(warm_service, "llm", None)
+    monkeypatch.setattr(warm_service, "doc_count", 10)
+    client = TestClient(app)
+
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health/live").status_code == 200